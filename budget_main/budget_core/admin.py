@@ -1,3 +1,291 @@
+# budget_core/admin.py
+
+from decimal import Decimal
+
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+from budget_core.archive import account_type_totals, live_balances
+from budget_core.category_tree import validate_parent
+from budget_core.models import Account, Budget, Category, Tag, Transaction
+from budget_core.sharding import current_shard, get_shard_aliases, shard_for_user, use_shard
+
+# Unfiltered changelists of tables above this many rows show the planner's
+# row estimate instead of running COUNT(*) over the whole table.
+ESTIMATED_COUNT_THRESHOLD = getattr(settings, "ADMIN_ESTIMATED_COUNT_THRESHOLD", 100_000)
+
+
+# ─── Pagination ───────────────────────────────────────────────────────────────
+def estimated_row_count(model, using):
+    """
+    Table size from the database statistics (no scan), or None when the
+    backend keeps none (SQLite without ANALYZE).
+    """
+    table = model._meta.db_table
+    connection = connections[using]
+    queries = {
+        "mysql": (
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+        ),
+        "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+        "sqlite": "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+    }
+    sql = queries.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:  # e.g. sqlite_stat1 missing
+        return None
+    if not row or row[0] is None:
+        return None
+    # sqlite_stat1.stat is "<rows> <rows per key> ..."
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Exact counts for filtered lists (the filters below are indexed) and for
+    small tables; the statistics estimate for an unfiltered large table.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not qs.query.where:
+            estimate = estimated_row_count(qs.model, qs.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+# ─── Shards ───────────────────────────────────────────────────────────────────
+def admin_shard(request):
+    """
+    Shard the admin reads for this request: the `shard` filter, else the
+    shard of the `user_id` filter, else the staff user's own shard (pinned
+    by UserShardMiddleware). Change / delete views read the changelist's
+    filters from `_changelist_filters`, so an object opens on the shard it
+    was listed from. None without shards.
+    """
+    aliases = get_shard_aliases()
+    if len(aliases) == 1:
+        return None
+    params = request.GET
+    if "_changelist_filters" in params:
+        params = QueryDict(params["_changelist_filters"])
+    alias = params.get(ShardFilter.parameter_name)
+    if alias in aliases:
+        return alias
+    user_id = params.get(UserIdFilter.parameter_name, "")
+    if user_id.isdigit() and get_user_model().objects.filter(pk=user_id).exists():
+        return shard_for_user(int(user_id))
+    return current_shard() or aliases[0]
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    Pick the shard to browse (shown with two or more shards). The queries
+    themselves are pinned by LargeTableAdmin.
+    """
+
+    title = "shard"
+    parameter_name = "shard"
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in get_shard_aliases()]
+
+    def has_output(self):
+        return len(get_shard_aliases()) > 1
+
+    def queryset(self, request, queryset):
+        return queryset
+
+    def choices(self, changelist):
+        for alias, title in self.lookup_choices:
+            yield {
+                "selected": alias == changelist.root_queryset.db,
+                "query_string": changelist.get_query_string({self.parameter_name: alias}),
+                "display": title,
+            }
+
+
+# ─── Filters ──────────────────────────────────────────────────────────────────
+class IdFilter(admin.SimpleListFilter):
+    """
+    Filter on a foreign key by typing its id: one indexed lookup, where the
+    stock related filter would list every user / account / category.
+    """
+
+    template = "admin/budget_core/id_filter.html"
+    field = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        if not value.isdigit():
+            return queryset.none()
+        return queryset.filter(**{self.field: int(value)})
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            "display": "All",
+            "hidden": [
+                (key, value)
+                for key, value in changelist.get_filters_params().items()
+                if key != self.parameter_name
+                for value in (value if isinstance(value, list) else [value])
+            ],
+        }
+
+
+class UserIdFilter(IdFilter):
+    title = "user id"
+    parameter_name = "user_id"
+    field = "user_id"
+
+
+class AccountIdFilter(IdFilter):
+    title = "account id"
+    parameter_name = "account_id"
+    field = "account_id"
+
+
+class CategoryIdFilter(IdFilter):
+    title = "category id"
+    parameter_name = "category_id"
+    field = "category_id"
+
+
+# ─── Model admins ─────────────────────────────────────────────────────────────
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for per-user tables that grow without bound:
+    estimated count, no second full COUNT(*), no facet counts, raw id widgets.
+    Every view runs (and renders) pinned to admin_shard(); saves and deletes
+    follow the object's user (UserShardRouter).
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    list_per_page = 50
+
+    def get_list_filter(self, request):
+        return (*super().get_list_filter(request), ShardFilter)
+
+    def _on_shard(self, view, request, *args, **kwargs):
+        with use_shard(admin_shard(request)):
+            response = view(request, *args, **kwargs)
+            # TemplateResponses render after the view returned: render on the shard
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+
+    def changelist_view(self, request, extra_context=None):
+        return self._on_shard(super().changelist_view, request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        return self._on_shard(super().changeform_view, request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        return self._on_shard(super().delete_view, request, object_id, extra_context)
+
+    def history_view(self, request, object_id, extra_context=None):
+        return self._on_shard(super().history_view, request, object_id, extra_context)
+
+
+class AccountChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # Live balance of the page's accounts: one grouped query (plus one
+        # over the archived summaries), not one per row
+        accounts = list(self.result_list)
+        live_balances(None, accounts, account_type_totals(None, [a.pk for a in accounts]))
+
+
+@admin.register(Account)
+class AccountAdmin(LargeTableAdmin):
+    list_display = ("name", "user", "balance", "live_balance")
+    list_select_related = ("user",)
+    list_filter = (UserIdFilter,)
+    search_fields = ("name",)
+    raw_id_fields = ("user",)
+
+    def get_changelist(self, request, **kwargs):
+        return AccountChangeList
+
+    @admin.display(description="Live balance")
+    def live_balance(self, obj):
+        balance = getattr(obj, "live_balance", None)
+        return None if balance is None else balance.quantize(Decimal("0.01"))
+
+
+class CategoryAdminForm(forms.ModelForm):
+    def clean(self):
+        cleaned = super().clean()
+        # Same tree rules as the category pages (type, no cycles)
+        category = Category(pk=self.instance.pk, user=cleaned.get("user"), type=cleaned.get("type"))
+        try:
+            validate_parent(category, cleaned.get("parent"))
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return cleaned
+
+
+@admin.register(Category)
+class CategoryAdmin(LargeTableAdmin):
+    form = CategoryAdminForm
+    list_display = ("name", "type", "parent", "user")
+    list_select_related = ("user", "parent")
+    list_filter = ("type", UserIdFilter)
+    search_fields = ("name",)
+    raw_id_fields = ("user", "parent")
+
+
+@admin.register(Transaction)
+class TransactionAdmin(LargeTableAdmin):
+    list_display = ("date", "type", "amount", "category", "account", "user", "note")
+    list_select_related = ("user", "account", "category")
+    list_filter = ("type", UserIdFilter, AccountIdFilter, CategoryIdFilter)
+    date_hierarchy = "date"
+    search_fields = ("=id",)
+    raw_id_fields = ("user", "account", "category")
+
+
+@admin.register(Budget)
+class BudgetAdmin(LargeTableAdmin):
+    list_display = ("month", "category", "amount", "user")
+    list_select_related = ("user", "category")
+    list_filter = (UserIdFilter, CategoryIdFilter)
+    date_hierarchy = "month"
+    raw_id_fields = ("user", "category")
+
 
-# Register your models here.
+@admin.register(Tag)
+class TagAdmin(LargeTableAdmin):
+    list_display = ("name", "user")
+    list_select_related = ("user",)
+    list_filter = (UserIdFilter,)
+    search_fields = ("name",)
+    raw_id_fields = ("user",)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BudgetCoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'budget_core'
+
+    def ready(self):
+        from budget_core import assets, signals  # noqa: F401
@@ -0,0 +1,179 @@
+# budget_core/archive.py
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import ExtractYear
+
+from budget_core import sharding
+from budget_core.cache_versions import bump_user
+from budget_core.models import ArchivedTransaction, StatementLine, Transaction, TransactionMonthSummary
+from budget_dashboard.models import SpendingAnomaly
+
+# Transactions dated before the 1st of (this month - ARCHIVE_MONTHS) are cold.
+# Keep it larger than the analytics window (12 months max).
+ARCHIVE_MONTHS = getattr(settings, "TRANSACTION_ARCHIVE_MONTHS", 24)
+
+ARCHIVE_FIELDS = ("id", "user_id", "account_id", "category_id", "type", "amount", "date", "note", "created_at")
+
+
+def archive_cutoff(today=None, months=ARCHIVE_MONTHS):
+    """
+    First day of the oldest month that stays hot (whole months are archived,
+    so a month summary is never half hot / half cold).
+    """
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# ─── Archiving ────────────────────────────────────────────────────────────────
+def archive_user(user_id, cutoff, batch_size=2000):
+    """
+    Move the user's transactions dated before `cutoff` to the archive table
+    in batches: copy rows, add them to the month summaries, delete the hot
+    rows. Each batch is one transaction on the user's shard, so a crash
+    never leaves rows both hot and archived. Returns the number moved.
+    """
+    moved = 0
+    while True:
+        with sharding.atomic(user_id):
+            rows = list(
+                Transaction.objects.select_for_update()
+                .filter(user_id=user_id, date__lt=cutoff)
+                .order_by("id")
+                .values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+
+            ArchivedTransaction.objects.bulk_create(ArchivedTransaction(**row) for row in rows)
+            _add_to_summaries(user_id, rows)
+
+            ids = [row["id"] for row in rows]
+            hot = Transaction.objects.filter(pk__in=ids)
+            # Flags of archived rows go too (the archive has no anomaly link)
+            SpendingAnomaly.objects.filter(transaction_id__in=ids).delete()
+            # The statement line link can't follow the row into the archive
+            StatementLine.objects.filter(transaction_id__in=ids).update(transaction=None, match="")
+            # Raw delete: the per-row post_delete handlers (forecaster, change log)
+            # must not treat archiving as the user deleting history
+            hot._raw_delete(hot.db)
+            moved += len(rows)
+
+    if moved:
+        # The analytics snapshot keeps archived rows as they were (same id)
+        bump_user(user_id)
+    return moved
+
+
+def _add_to_summaries(user_id, rows):
+    totals = defaultdict(lambda: [Decimal("0"), 0])
+    for row in rows:
+        key = (row["account_id"], row["category_id"], row["type"], row["date"].replace(day=1))
+        totals[key][0] += row["amount"]
+        totals[key][1] += 1
+
+    months = {key[3] for key in totals}
+    existing = {
+        (s.account_id, s.category_id, s.type, s.month): s
+        for s in TransactionMonthSummary.objects.select_for_update().filter(user_id=user_id, month__in=months)
+    }
+
+    created, updated = [], []
+    for key, (total, count) in totals.items():
+        summary = existing.get(key)
+        if summary is None:
+            account_id, category_id, tx_type, month = key
+            created.append(TransactionMonthSummary(
+                user_id=user_id, account_id=account_id, category_id=category_id,
+                type=tx_type, month=month, total=total, count=count,
+            ))
+        else:
+            summary.total += total
+            summary.count += count
+            updated.append(summary)
+
+    TransactionMonthSummary.objects.bulk_create(created)
+    TransactionMonthSummary.objects.bulk_update(updated, ["total", "count"])
+
+
+# ─── Reads across hot + archived data ────────────────────────────────────────
+def account_type_totals(user, account_ids=None):
+    """
+    {(account_id, type): all-time total}, hot rows + archived summaries
+    (only of `account_ids` when given; user=None spans users, e.g. the admin).
+    """
+    totals = defaultdict(Decimal)
+    for model, field in ((Transaction, "amount"), (TransactionMonthSummary, "total")):
+        rows = model.objects.all() if user is None else model.objects.filter(user=user)
+        if account_ids is not None:
+            rows = rows.filter(account_id__in=account_ids)
+        rows = rows.values("account_id", "type").annotate(total=Sum(field))
+        for row in rows:
+            totals[(row["account_id"], row["type"])] += row["total"] or 0
+    return totals
+
+
+def live_balances(user, accounts, totals=None):
+    """
+    Set `live_balance` on each account: opening + income - every other type
+    (same rule the views always used), all time.
+    """
+    if totals is None:
+        totals = account_type_totals(user)
+    flows = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    for (account_id, tx_type), total in totals.items():
+        flows[account_id][0 if tx_type == "income" else 1] += total
+    for a in accounts:
+        in_sum, out_sum = flows.get(a.id, (Decimal("0"), Decimal("0")))
+        a.live_balance = Decimal(a.balance or 0) + in_sum - out_sum
+    return accounts
+
+
+def in_out_totals(user, totals=None):
+    """
+    (income, everything else) all-time totals over hot + archived data.
+    """
+    if totals is None:
+        totals = account_type_totals(user)
+    in_total = out_total = Decimal("0")
+    for (account_id, tx_type), total in totals.items():
+        if tx_type == "income":
+            in_total += total
+        else:
+            out_total += total
+    return in_total, out_total
+
+
+def transaction_years(user):
+    """
+    Years with any transaction (hot or archived), newest first.
+    """
+    hot = {d.year for d in Transaction.objects.filter(user=user).dates("date", "year")}
+    cold = set(
+        TransactionMonthSummary.objects.filter(user=user)
+        .annotate(year=ExtractYear("month"))
+        .values_list("year", flat=True)
+        .order_by()
+        .distinct()
+    )
+    return sorted(hot | cold, reverse=True)
+
+
+class MergedRows:
+    """
+    Lazy newest-first union of hot and archived rows of one month (a month
+    can hold both when a back-dated transaction lands after archiving).
+    """
+
+    def __init__(self, *querysets):
+        self.querysets = querysets
+
+    def __iter__(self):
+        rows = [row for qs in self.querysets for row in qs]
+        rows.sort(key=lambda t: (t.date, t.id), reverse=True)
+        return iter(rows)
@@ -0,0 +1,34 @@
+# budget_core/assets.py
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core import checks
+
+# Front-end build outputs (`npm run build`, git-ignored) loaded by layout.html
+BUILT_ASSETS = ("css/app.css", "js/chart.umd.min.js")
+
+
+def assets_dir():
+    return Path(settings.BASE_DIR) / "static"
+
+
+def missing_assets():
+    return [name for name in BUILT_ASSETS if not (assets_dir() / name).is_file()]
+
+
+@checks.register(checks.Tags.staticfiles)
+def check_built_assets(app_configs, **kwargs):
+    """
+    Warn when the front-end build has not run: pages render unstyled and
+    without charts, and with ManifestStaticFilesStorage every page fails
+    after collectstatic (no manifest entry for the missing files).
+    """
+    return [
+        checks.Warning(
+            f"static/{name} is missing (front-end build output).",
+            hint="Run `python manage.py build_assets` (needs Node 18+), then collectstatic.",
+            id="budget_core.W001",
+        )
+        for name in missing_assets()
+    ]
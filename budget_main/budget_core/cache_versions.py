@@ -0,0 +1,107 @@
+# budget_core/cache_versions.py
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from budget_core.sharding import shard_for_user
+
+# Data versions for cached template fragments (see {% cache %} in
+# transaction_list.html, account_list.html and dashboard.html).
+#
+# A version is an opaque token, replaced (never incremented) on change, so a
+# version evicted from the cache comes back as a new token instead of
+# resurrecting an old fragment. Tokens are replaced once the write commits
+# on the user's shard: replaced earlier, a render running meanwhile could
+# read the old rows and cache them under the new token.
+#
+#   user    : everything of the user (category renamed / deleted ...)
+#   month   : transactions dated in that month ("YYYY-MM")
+#   account : the account row and its transactions (live balance)
+
+
+def _user_key(user_id):
+    return f"fragment-version:{user_id}"
+
+
+def _month_key(user_id, month):
+    return f"fragment-version:{user_id}:month:{month}"
+
+
+def _account_key(user_id, account_id):
+    return f"fragment-version:{user_id}:account:{account_id}"
+
+
+def _new_token():
+    return str(time.time_ns())
+
+
+def _versions(keys):
+    """
+    Tokens for `keys` with one get_many; missing ones are created.
+    """
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            token = _new_token()
+            found[key] = token if cache.add(key, token, None) else cache.get(key, token)
+    return found
+
+
+def _bump(user_id, keys):
+    def replace():
+        token = _new_token()
+        cache.set_many({key: token for key in keys}, None)
+
+    transaction.on_commit(replace, using=shard_for_user(user_id))
+
+
+def month_key(d):
+    return d.strftime("%Y-%m")
+
+
+def month_versions(user_id, months):
+    """
+    {month: version} for the given "YYYY-MM" keys (user version included).
+    """
+    keys = {m: _month_key(user_id, m) for m in months}
+    found = _versions([_user_key(user_id), *keys.values()])
+    base = found[_user_key(user_id)]
+    return {m: f"{base}.{found[k]}" for m, k in keys.items()}
+
+
+def account_versions(user_id, account_ids):
+    """
+    {account_id: version} (user version included).
+    """
+    keys = {a: _account_key(user_id, a) for a in account_ids}
+    found = _versions([_user_key(user_id), *keys.values()])
+    base = found[_user_key(user_id)]
+    return {a: f"{base}.{found[k]}" for a, k in keys.items()}
+
+
+def bump_months(user_id, months):
+    _bump(user_id, [_month_key(user_id, m) for m in set(months)])
+
+
+def bump_accounts(user_id, account_ids):
+    _bump(user_id, [_account_key(user_id, a) for a in set(account_ids)])
+
+
+def bump_user(user_id):
+    _bump(user_id, [_user_key(user_id)])
+
+
+def bump_for_transactions(transactions):
+    """
+    Invalidate the month groups and account cards touched by a batch of
+    transactions (bulk writes bypass the model signals).
+    """
+    months, accounts = {}, {}
+    for t in transactions:
+        months.setdefault(t.user_id, set()).add(month_key(t.date))
+        accounts.setdefault(t.user_id, set()).add(t.account_id)
+    for user_id in months:
+        bump_months(user_id, months[user_id])
+        bump_accounts(user_id, accounts[user_id])
@@ -0,0 +1,184 @@
+# budget_core/category_tree.py
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from budget_core import sharding
+from budget_core.models import Category, CategoryClosure, Transaction, TransactionMonthSummary
+
+# Categories form a tree per user and type (Category.parent). CategoryClosure
+# holds every (ancestor, descendant, depth) pair, the category itself at
+# depth 0, so "a category and everything under it" is one indexed join
+# instead of a walk up or down the parent pointers:
+#
+#   transactions of a subtree:  category__ancestor_links__ancestor_id = <id>
+#   ancestors of a category:    CategoryClosure(descendant=<id>)
+#
+# Rows are written when a category is created and rewritten when it moves
+# (signals in budget_core/signals.py); `manage.py rebuild_category_tree`
+# rebuilds them from the parent pointers.
+
+SEPARATOR = " › "
+
+
+# ─── Maintenance ──────────────────────────────────────────────────────────────
+def validate_parent(category, parent):
+    """
+    Raise ValueError if `category` can't sit under `parent` (None = top
+    level): other user, other type, or a cycle. `category` may be unsaved.
+    """
+    if category.pk and category.children.exclude(type=category.type).exists():
+        raise ValueError("Its subcategories have another type: move them first.")
+    if parent is None:
+        return
+    if parent.user_id != category.user_id:
+        raise ValueError("Parent category not found.")
+    if parent.type != category.type:
+        raise ValueError("A subcategory must have the same type as its parent.")
+    if category.pk and (
+        parent.pk == category.pk
+        or CategoryClosure.objects.filter(ancestor_id=category.pk, descendant_id=parent.pk).exists()
+    ):
+        raise ValueError("A category can't be moved under itself or one of its subcategories.")
+
+
+def insert_node(category):
+    """
+    Closure rows of a new category: itself plus one per ancestor of its
+    parent (one read, one insert).
+    """
+    links = [CategoryClosure(user_id=category.user_id, ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+    if category.parent_id:
+        links += [
+            CategoryClosure(user_id=category.user_id, ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(descendant_id=category.parent_id)
+            .values_list("ancestor_id", "depth")
+        ]
+    CategoryClosure.objects.bulk_create(links)
+
+
+def move_node(category):
+    """
+    Re-link the subtree of `category` (already saved with its new parent):
+    drop the links from its old ancestors, add the cross product of the new
+    parent's ancestors and the subtree. Links inside the subtree stay.
+    Returns the ids of the old and new ancestors, whose subtree totals changed.
+    """
+    with sharding.atomic(category.user_id):
+        subtree = dict(
+            CategoryClosure.objects.filter(ancestor_id=category.pk).values_list("descendant_id", "depth")
+        )
+        old_ancestors = set(
+            CategoryClosure.objects.filter(descendant_id=category.pk)
+            .exclude(ancestor_id=category.pk)
+            .values_list("ancestor_id", flat=True)
+        )
+        CategoryClosure.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+
+        new_ancestors = []
+        if category.parent_id:
+            new_ancestors = list(
+                CategoryClosure.objects.filter(descendant_id=category.parent_id).values_list("ancestor_id", "depth")
+            )
+        CategoryClosure.objects.bulk_create(
+            CategoryClosure(
+                user_id=category.user_id, ancestor_id=ancestor_id, descendant_id=descendant_id,
+                depth=ancestor_depth + depth + 1,
+            )
+            for ancestor_id, ancestor_depth in new_ancestors
+            for descendant_id, depth in subtree.items()
+        )
+    return old_ancestors | {ancestor_id for ancestor_id, _ in new_ancestors}
+
+
+def rebuild_user(user_id):
+    """
+    Rewrite all closure rows of a user from the parent pointers (backfill
+    and repair). Returns the number of rows written.
+    """
+    parents = dict(Category.objects.filter(user_id=user_id).values_list("pk", "parent_id"))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(CategoryClosure(
+                user_id=user_id, ancestor_id=ancestor_id, descendant_id=category_id, depth=depth,
+            ))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    with sharding.atomic(user_id):
+        CategoryClosure.objects.filter(user_id=user_id).delete()
+        CategoryClosure.objects.bulk_create(links, batch_size=1000)
+    return len(links)
+
+
+# ─── Reads ────────────────────────────────────────────────────────────────────
+def ancestor_map(category_ids):
+    """
+    {category_id: [ids of the category and all its ancestors]} in one query.
+    """
+    ancestors = defaultdict(list)
+    for descendant_id, ancestor_id in CategoryClosure.objects.filter(
+        descendant_id__in=category_ids,
+    ).values_list("descendant_id", "ancestor_id"):
+        ancestors[descendant_id].append(ancestor_id)
+    return ancestors
+
+
+def subtree_totals(start, end, tx_type="expense", user_id=None, ancestor_ids=None):
+    """
+    {category_id: total of `tx_type` dated start..end in the category and
+    all its subcategories}, for the categories in `ancestor_ids` or, when
+    None, the user's top-level categories.
+
+    One grouped join (rows x closure) over the hot rows plus one over the
+    archived month summaries (months whose 1st falls in the range).
+    """
+    scope = {}
+    if user_id is not None:
+        scope["user_id"] = user_id
+    if ancestor_ids is None:
+        ancestor_ids = Category.objects.filter(parent__isnull=True, **scope).values("pk")  # subquery
+    scope["category__ancestor_links__ancestor_id__in"] = ancestor_ids
+
+    totals = defaultdict(Decimal)
+    sources = (
+        (Transaction, "amount", {"date__range": [start, end]}),
+        (TransactionMonthSummary, "total", {"month__range": [start, end]}),
+    )
+    for model, field, filters in sources:
+        rows = (
+            model.objects.filter(type=tx_type, **scope, **filters)
+            .values_list("category__ancestor_links__ancestor_id")
+            .annotate(total=Sum(field))
+            .order_by()
+        )
+        for ancestor_id, total in rows:
+            totals[ancestor_id] += total or Decimal("0")
+    return totals
+
+
+def tree_order(categories):
+    """
+    The categories depth-first (siblings by name), each with `depth` and
+    `path` ("Food › Groceries") set. Works on any list holding whole
+    subtrees, from the parent pointers alone (no query).
+    """
+    children = defaultdict(list)
+    ids = {c.pk for c in categories}
+    for c in sorted(categories, key=lambda c: (c.type, c.name.lower())):
+        children[c.parent_id if c.parent_id in ids else None].append(c)
+
+    ordered = []
+
+    def walk(parent_id, depth, prefix):
+        for c in children.get(parent_id, ()):
+            c.depth = depth
+            c.path = prefix + c.name
+            ordered.append(c)
+            walk(c.pk, depth + 1, c.path + SEPARATOR)
+
+    walk(None, 0, "")
+    return ordered
@@ -0,0 +1,129 @@
+# budget_core/changelog.py
+
+from budget_core import sharding
+from budget_core.models import (
+    Account,
+    ArchivedTransaction,
+    Budget,
+    Category,
+    ChangeCursor,
+    ChangeLogEntry,
+    Transaction,
+)
+
+# Synced models: feed name -> (model, fields sent to clients)
+SYNC_MODELS = {
+    "account": (Account, ("id", "name", "balance")),
+    "category": (Category, ("id", "name", "type", "parent_id")),
+    "transaction": (
+        Transaction,
+        ("id", "account_id", "category_id", "type", "amount", "date", "note", "created_at"),
+    ),
+    "budget": (Budget, ("id", "category_id", "month", "amount")),
+}
+MODEL_NAMES = {model: name for name, (model, fields) in SYNC_MODELS.items()}
+
+MAX_PAGE_SIZE = 1000
+
+
+def _lock_cursor(user_id):
+    """
+    The user's cursor row, locked until the surrounding transaction ends so
+    sequence numbers are handed out (and committed) in order. A user's first
+    change seeds the log with everything they already own.
+    """
+    cursor, created = ChangeCursor.objects.select_for_update().get_or_create(user_id=user_id)
+    if created:
+        _seed(cursor)
+    return cursor
+
+
+def _seed(cursor):
+    entries = []
+    for name, (model, fields) in SYNC_MODELS.items():
+        sources = [model]
+        if model is Transaction:
+            sources.append(ArchivedTransaction)  # cold rows are still history
+        for source in sources:
+            for pk in source.objects.filter(user_id=cursor.user_id).order_by("pk").values_list("pk", flat=True):
+                cursor.seq += 1
+                entries.append(ChangeLogEntry(
+                    user_id=cursor.user_id, seq=cursor.seq, model=name, object_id=pk, op="upsert",
+                ))
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=1000)
+    cursor.save(update_fields=["seq"])
+
+
+def record_changes(user_id, name, object_ids, op):
+    """
+    Log `op` ("upsert" / "delete") for objects of one synced model. Older
+    entries of the same objects are dropped, so the log holds one entry per
+    object and a client that was away only downloads the final state.
+    """
+    object_ids = list(dict.fromkeys(object_ids))
+    if not object_ids:
+        return
+    with sharding.atomic(user_id):  # the lock must be held on the user's shard
+        cursor = _lock_cursor(user_id)
+        ChangeLogEntry.objects.filter(user_id=user_id, model=name, object_id__in=object_ids).delete()
+        entries = []
+        for object_id in object_ids:
+            cursor.seq += 1
+            entries.append(ChangeLogEntry(
+                user_id=user_id, seq=cursor.seq, model=name, object_id=object_id, op=op,
+            ))
+        ChangeLogEntry.objects.bulk_create(entries)
+        cursor.save(update_fields=["seq"])
+
+
+def record_change(instance, op):
+    record_changes(instance.user_id, MODEL_NAMES[type(instance)], [instance.pk], op)
+
+
+# ─── Reading the feed ─────────────────────────────────────────────────────────
+def changes_since(user, after=0, limit=500):
+    """
+    One page of the user's changes with seq > `after`, oldest first.
+
+    Upserts carry the current state of the object (fetched with one query
+    per model), deletes only the id. Returns a dict: cursor (pass it back as
+    `after` for the next page), has_more, changes.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if not ChangeCursor.objects.filter(user=user).exists():
+        with sharding.atomic(user.pk):
+            _lock_cursor(user.pk)  # seeds the log on a first sync
+    entries = list(
+        ChangeLogEntry.objects.filter(user=user, seq__gt=after).order_by("seq")[: limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    wanted = {}
+    for e in entries:
+        if e.op == "upsert":
+            wanted.setdefault(e.model, set()).add(e.object_id)
+
+    rows = {}
+    for name, ids in wanted.items():
+        model, fields = SYNC_MODELS[name]
+        sources = [model] + ([ArchivedTransaction] if model is Transaction else [])
+        for source in sources:
+            for row in source.objects.filter(user=user, pk__in=ids).order_by().values(*fields):
+                rows[(name, row["id"])] = row
+
+    changes = []
+    for e in entries:
+        change = {"seq": e.seq, "model": e.model, "id": e.object_id, "op": e.op}
+        if e.op == "upsert":
+            data = rows.get((e.model, e.object_id))
+            if data is None:
+                continue  # deleted since; its delete entry follows
+            change["data"] = data
+        changes.append(change)
+
+    return {
+        "cursor": entries[-1].seq if entries else after,
+        "has_more": has_more,
+        "changes": changes,
+    }
@@ -0,0 +1,15 @@
+# budget_core/db/backends/mysql/base.py
+#
+# ENGINE = "budget_core.db.backends.mysql"
+# Same as django.db.backends.mysql, but connections come from a ConnectionPool.
+
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+
+from budget_core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, MySQLDatabaseWrapper):
+    def ping_connection(self, raw):
+        # mysqlclient: raises OperationalError if the server went away
+        raw.ping()
+        return True
@@ -0,0 +1,13 @@
+# budget_core/db/backends/sqlite3/base.py
+#
+# ENGINE = "budget_core.db.backends.sqlite3"
+# SQLite shim of the pooled MySQL backend, used to exercise pool behaviour
+# locally without a MySQL server.
+
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+from budget_core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, SQLiteDatabaseWrapper):
+    pass
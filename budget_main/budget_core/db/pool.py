@@ -0,0 +1,291 @@
+# budget_core/db/pool.py
+
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+DEFAULT_POOL_OPTIONS = {
+    "MIN_SIZE": 0,           # connections opened up front
+    "MAX_SIZE": 10,          # hard cap (idle + in use)
+    "MAX_LIFETIME": 1800,    # seconds before a connection is recycled
+    "TIMEOUT": 10,           # seconds to wait for a free connection
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class _PooledConnection:
+    __slots__ = ("raw", "created_at")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of raw DB-API connections for one database alias.
+
+    - connect():  factory returning a new raw connection
+    - ping(raw):  liveness check, raises (or returns False) for a dead connection
+    Connections older than MAX_LIFETIME are closed and replaced on checkout.
+    """
+
+    def __init__(self, alias, connect, ping, options=None):
+        opts = {**DEFAULT_POOL_OPTIONS, **(options or {})}
+        self.alias = alias
+        self.min_size = int(opts["MIN_SIZE"])
+        self.max_size = max(1, int(opts["MAX_SIZE"]))
+        self.max_lifetime = float(opts["MAX_LIFETIME"])
+        self.timeout = float(opts["TIMEOUT"])
+
+        self._connect = connect
+        self._ping = ping
+        self._idle = deque()
+        self._in_use = {}  # id(raw) -> _PooledConnection
+        self._pending = 0  # slots reserved for a connect / ping in progress
+        self._cond = threading.Condition()
+
+        self.stats = {
+            "checkouts": 0,
+            "checkins": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "closed": 0,
+            "recycled": 0,
+            "failed_pings": 0,
+        }
+
+    # ── internals ────────────────────────────────────────────────────────────
+    # Connects, pings, rollbacks and closes run without the lock held: a slot
+    # is reserved first (`_pending`), so one slow database call never stalls
+    # the other threads checking connections out or in.
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._pending
+
+    def _count(self, key):
+        with self._cond:
+            self.stats[key] += 1
+
+    def _open(self):
+        pooled = _PooledConnection(self._connect())
+        self._count("created")
+        return pooled
+
+    def _discard(self, pooled):
+        self._count("closed")
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, pooled):
+        if time.monotonic() - pooled.created_at > self.max_lifetime:
+            self._count("recycled")
+            return False
+        try:
+            alive = self._ping(pooled.raw)
+        except Exception:
+            alive = False
+        if alive is False:
+            self._count("failed_pings")
+            return False
+        return True
+
+    def _release(self):
+        # A reserved slot that ended without a connection
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify()
+
+    def _hand_out(self, pooled, waited_from):
+        with self._cond:
+            self._pending -= 1
+            self._in_use[id(pooled.raw)] = pooled
+            self.stats["checkouts"] += 1
+            if waited_from is not None:
+                waited = time.monotonic() - waited_from
+                self.stats["wait_seconds_total"] += waited
+                self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        return pooled.raw
+
+    def fill(self):
+        """
+        Open connections until MIN_SIZE idle ones exist.
+        """
+        while True:
+            with self._cond:
+                if self._size() >= self.min_size:
+                    return
+                self._pending += 1
+            try:
+                pooled = self._open()
+            except Exception:
+                self._release()
+                raise
+            with self._cond:
+                self._pending -= 1
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def checkout(self):
+        deadline = None
+        waited_from = None
+
+        while True:
+            with self._cond:
+                pooled = self._idle.popleft() if self._idle else None
+                if pooled is None and self._size() >= self.max_size:
+                    # Pool exhausted: wait for a checkin
+                    if waited_from is None:
+                        waited_from = time.monotonic()
+                        deadline = waited_from + self.timeout
+                        self.stats["waits"] += 1
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        if not self._idle and self._size() >= self.max_size:
+                            self.stats["timeouts"] += 1
+                            raise PoolTimeout(
+                                f"No free connection in pool '{self.alias}' after {self.timeout:.1f}s "
+                                f"(max_size={self.max_size})."
+                            )
+                    continue
+                self._pending += 1
+
+            if pooled is not None:
+                if self._is_usable(pooled):
+                    return self._hand_out(pooled, waited_from)
+                # Stale: close it and try the next idle one (or a new one)
+                self._discard(pooled)
+                self._release()
+                continue
+
+            try:
+                pooled = self._open()
+            except Exception:
+                self._release()
+                raise
+            return self._hand_out(pooled, waited_from)
+
+    def checkin(self, raw, discard=False):
+        with self._cond:
+            pooled = self._in_use.get(id(raw))
+        if pooled is None:
+            # Not ours (e.g. pool was reset) – just close it
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return
+
+        # Still counted as in use while it is rolled back / closed
+        if not discard:
+            try:
+                raw.rollback()  # never hand out a connection mid-transaction
+            except Exception:
+                discard = True
+        discard = discard or time.monotonic() - pooled.created_at > self.max_lifetime
+        if discard:
+            self._discard(pooled)
+
+        with self._cond:
+            self._in_use.pop(id(raw), None)
+            self.stats["checkins"] += 1
+            if not discard:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                **self.stats,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "pending": self._pending,
+                "size": self._size(),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+
+# ── Registry (one pool per alias per process) ────────────────────────────────
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, connect, ping, options=None):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = ConnectionPool(alias, connect, ping, options)
+            _pools[alias] = pool
+    return pool
+
+
+def pool_stats():
+    """
+    Stats of every pool in this process, keyed by database alias.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {p.alias: p.snapshot() for p in pools}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mix into a Django DatabaseWrapper so connect()/close() check connections
+    out of / back into a per-alias ConnectionPool instead of opening a new
+    TCP + auth handshake every request. Options come from DATABASES[alias]["POOL"].
+    """
+
+    def ping_connection(self, raw):
+        cursor = raw.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        finally:
+            cursor.close()
+        return True
+
+    def get_pool(self, conn_params=None):
+        connect = None
+        if conn_params is not None:
+            new_connection = super().get_new_connection
+
+            def connect():
+                return new_connection(conn_params)
+
+        pool = get_pool(self.alias, connect, self.ping_connection, self.settings_dict.get("POOL"))
+        if pool._connect is None:
+            pool._connect = connect
+        return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        pool.fill()
+        return pool.checkout()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # A connection closed inside atomic() stays referenced by Django,
+        # so it can't go back to the pool.
+        discard = self.in_atomic_block or self.errors_occurred or self.needs_rollback
+        with self.wrap_database_errors:
+            self.get_pool().checkin(self.connection, discard=discard)
@@ -0,0 +1,186 @@
+# budget_core/events.py
+
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from budget_core.sharding import shard_for_user
+
+# In-process pub/sub for server-sent events (one queue per open page).
+# Events are published after the DB commit; a page that reconnects catches
+# up from the database with the last event id it saw, so the broker itself
+# never has to be durable.
+#
+# The broker only reaches pages served by the publishing process. Events
+# stored in the database (budget alerts) are also polled every POLL_SECONDS
+# by each open stream, so they reach pages on other worker processes too;
+# dashboard deltas are not stored and stay per process.
+#
+# Two kinds of subscriber share the broker: a plain queue drained by a worker
+# thread (WSGI), and an asyncio queue drained on the event loop (ASGI), where
+# an idle page costs a coroutine instead of a thread.
+
+MAX_QUEUED = 100        # per subscriber; a stuck page drops events instead of growing
+KEEPALIVE_SECONDS = 15  # comment frame so proxies keep the connection open
+STREAM_SECONDS = 300    # then the browser reconnects (with Last-Event-ID)
+POLL_SECONDS = getattr(settings, "EVENTS_POLL_SECONDS", 15)  # 0 = no polling (single process)
+
+_subscribers = {}  # user_id -> set of queues
+_lock = threading.Lock()
+
+
+class _LoopQueue:
+    """
+    asyncio queue fed from any thread (publishers run in sync code).
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=MAX_QUEUED)
+
+    def put_nowait(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+
+def subscribe(user_id, q=None):
+    if q is None:
+        q = queue.Queue(maxsize=MAX_QUEUED)
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(q)
+    return q
+
+
+def unsubscribe(user_id, q):
+    with _lock:
+        queues = _subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(q)
+            if not queues:
+                del _subscribers[user_id]
+
+
+def subscriber_count(user_id=None):
+    with _lock:
+        if user_id is not None:
+            return len(_subscribers.get(user_id, ()))
+        return sum(len(queues) for queues in _subscribers.values())
+
+
+def _deliver(user_id, event):
+    with _lock:
+        queues = list(_subscribers.get(user_id, ()))
+    for q in queues:
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            pass
+        except RuntimeError:
+            pass  # event loop of a closed ASGI stream
+
+
+def publish(user_id, name, data, event_id=None):
+    """
+    Queue an event for every open page of the user once the current
+    transaction on the user's shard commits (immediately outside one).
+    """
+    event = (name, data, event_id)
+    transaction.on_commit(lambda: _deliver(user_id, event), using=shard_for_user(user_id))
+
+
+def format_event(name, data, event_id=None):
+    """
+    One SSE frame: `id:` (optional), `event:` and a JSON `data:` line.
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {name}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _poll_wait(poll):
+    return POLL_SECONDS if poll and POLL_SECONDS else KEEPALIVE_SECONDS
+
+
+def event_stream(user_id, catch_up=None, poll=None):
+    """
+    SSE generator for one page: subscribes first, then yields the frames
+    of `catch_up()` (missed events read from the DB, as (name, data, id)),
+    then live events and keep-alives until STREAM_SECONDS have passed.
+    `poll(seen)` returns the stored events with id > seen (published by
+    other processes); it runs whenever the queue stays idle POLL_SECONDS.
+    """
+    q = subscribe(user_id)
+    try:
+        yield "retry: 5000\n\n"
+        seen = 0
+        for name, data, event_id in (catch_up() if catch_up else ()):
+            seen = max(seen, event_id or 0)
+            yield format_event(name, data, event_id)
+
+        deadline = time.monotonic() + STREAM_SECONDS
+        last_frame = time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                events = [q.get(timeout=_poll_wait(poll))]
+            except queue.Empty:
+                events = poll(seen) if poll and POLL_SECONDS else []
+            for name, data, event_id in events:
+                if event_id is not None and event_id <= seen:
+                    continue  # already sent by the catch-up / a poll
+                seen = max(seen, event_id or 0)
+                last_frame = time.monotonic()
+                yield format_event(name, data, event_id)
+            if time.monotonic() - last_frame >= KEEPALIVE_SECONDS:
+                last_frame = time.monotonic()
+                yield ": keepalive\n\n"
+    finally:
+        unsubscribe(user_id, q)
+
+
+async def aevent_stream(user_id, catch_up=None, poll=None):
+    """
+    Async twin of event_stream() for ASGI: waits on the event loop, so
+    thousands of idle pages fit in one worker. `catch_up` and `poll` run
+    in a thread.
+    """
+    q = subscribe(user_id, _LoopQueue(asyncio.get_running_loop()))
+    try:
+        yield "retry: 5000\n\n"
+        seen = 0
+        frames = await sync_to_async(lambda: list(catch_up()))() if catch_up else []
+        for name, data, event_id in frames:
+            seen = max(seen, event_id or 0)
+            yield format_event(name, data, event_id)
+
+        deadline = time.monotonic() + STREAM_SECONDS
+        last_frame = time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                events = [await asyncio.wait_for(q.queue.get(), _poll_wait(poll))]
+            except asyncio.TimeoutError:
+                events = await sync_to_async(lambda: list(poll(seen)))() if poll and POLL_SECONDS else []
+            for name, data, event_id in events:
+                if event_id is not None and event_id <= seen:
+                    continue
+                seen = max(seen, event_id or 0)
+                last_frame = time.monotonic()
+                yield format_event(name, data, event_id)
+            if time.monotonic() - last_frame >= KEEPALIVE_SECONDS:
+                last_frame = time.monotonic()
+                yield ": keepalive\n\n"
+    finally:
+        unsubscribe(user_id, q)
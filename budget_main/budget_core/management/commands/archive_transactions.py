@@ -0,0 +1,68 @@
+# budget_core/management/commands/archive_transactions.py
+
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from budget_core.archive import ARCHIVE_MONTHS, archive_cutoff, archive_user
+from budget_core.models import Transaction
+from budget_core.sharding import use_shard_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Move transactions older than the archive horizon (whole months) into "
+        "money_transaction_archive and fold them into per-(account, category, month) "
+        "summaries. Balances, totals and the year filter keep reading both."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int, default=ARCHIVE_MONTHS,
+            help=f"Keep this many months hot (default {ARCHIVE_MONTHS}, TRANSACTION_ARCHIVE_MONTHS).",
+        )
+        parser.add_argument("--before", help="Explicit cutoff date YYYY-MM-DD (rounded down to the 1st).")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Allow a --before cutoff inside the hot window (later than --months allows).",
+        )
+        parser.add_argument("--user", action="append", default=[], help="Username (repeatable); default all users")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        if opts["months"] < 12:
+            raise CommandError("--months must be at least 12 (the analytics window).")
+        cutoff = archive_cutoff(months=opts["months"])
+        if opts["before"]:
+            try:
+                before = date.fromisoformat(opts["before"]).replace(day=1)
+            except ValueError:
+                raise CommandError("--before must be YYYY-MM-DD.")
+            if before > cutoff and not opts["force"]:
+                raise CommandError(
+                    f"--before {before} would archive months that stay hot (the {opts['months']}-month "
+                    f"horizon ends at {cutoff}). Use an earlier date, or --force."
+                )
+            cutoff = before
+
+        User = get_user_model()
+        users = User.objects.order_by("pk")
+        if opts["user"]:
+            users = users.filter(username__in=opts["user"])
+
+        self.stdout.write(f"Archiving transactions dated before {cutoff}")
+        total = 0
+        for user in users.iterator():
+            with use_shard_for(user.pk):
+                if opts["dry_run"]:
+                    moved = Transaction.objects.filter(user=user, date__lt=cutoff).count()
+                else:
+                    moved = archive_user(user.pk, cutoff, batch_size=opts["batch_size"])
+            if moved:
+                self.stdout.write(f"  {user.username}: {moved} transaction(s)")
+            total += moved
+
+        verb = "would be archived" if opts["dry_run"] else "archived"
+        self.stdout.write(self.style.SUCCESS(f"{total} transaction(s) {verb}."))
@@ -0,0 +1,44 @@
+# budget_core/management/commands/build_assets.py
+
+import shutil
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from budget_core.assets import BUILT_ASSETS, missing_assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the front-end assets with npm (purged Tailwind CSS and the "
+        "Chart.js bundle, see package.json) into static/. Needs Node 18+; run "
+        "after a fresh checkout and after template / version changes, before "
+        "collectstatic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--if-missing", action="store_true", help="Only build when an output file is missing")
+
+    def handle(self, *args, **opts):
+        if opts["if_missing"] and not missing_assets():
+            self.stdout.write("Front-end assets already built.")
+            return
+
+        npm = shutil.which("npm")
+        if npm is None:
+            raise CommandError("npm not found: install Node.js 18+ to build the front-end assets.")
+
+        # `npm ci` needs a lockfile; the first install writes one
+        base = Path(settings.BASE_DIR)
+        install = "ci" if (base / "package-lock.json").exists() else "install"
+        for step in ([npm, install, "--no-audit", "--no-fund"], [npm, "run", "build"]):
+            self.stdout.write(" ".join(step[1:]))
+            if subprocess.run(step, cwd=base).returncode:
+                raise CommandError(f"`npm {' '.join(step[1:])}` failed.")
+
+        missing = missing_assets()
+        if missing:
+            raise CommandError(f"Build finished without {', '.join('static/' + m for m in missing)}.")
+        self.stdout.write(self.style.SUCCESS(f"Built {', '.join('static/' + m for m in BUILT_ASSETS)}."))
@@ -0,0 +1,154 @@
+# budget_core/management/commands/move_user_shard.py
+
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from budget_core.models import Account, ArchivedTransaction, Budget, Category, Transaction, TransactionMonthSummary
+from budget_core.routers import sharded_models
+from budget_core.sharding import get_shard_aliases, set_user_shard, shard_for_user, use_shard_for
+
+# Per-model checksum used to verify a copy (count is always checked)
+CHECKSUM_FIELDS = {
+    Account: "balance",
+    ArchivedTransaction: "amount",
+    Budget: "amount",
+    Transaction: "amount",
+    TransactionMonthSummary: "total",
+}
+
+
+def _timestamp_fields(model):
+    return [
+        f for f in model._meta.concrete_fields
+        if getattr(f, "auto_now", False) or getattr(f, "auto_now_add", False)
+    ]
+
+
+@contextmanager
+def _keeping_timestamps(model):
+    """
+    Copy created_at / updated_at / archived_at as they are: bulk_create()
+    would stamp auto_now(_add) fields with the time of the move. Safe here
+    because the command runs alone, with the user's writes stopped.
+    """
+    fields = [(f, f.auto_now, f.auto_now_add) for f in _timestamp_fields(model)]
+    for f, _, _ in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in fields:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Move one user's accounts, categories, budgets, transactions and analytics "
+        "state to another shard: bulk copy, verify counts/sums on both sides, switch "
+        "the shard map, then delete the source rows. Stop writes for the user while it runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="User id or username")
+        parser.add_argument("target", help="Target shard alias")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--keep-source",
+            action="store_true",
+            help="Leave the copied rows on the source shard (clean up later).",
+        )
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        target = opts["target"]
+        batch_size = opts["batch_size"]
+
+        if target not in get_shard_aliases():
+            raise CommandError(f"Unknown shard '{target}'. Known: {', '.join(get_shard_aliases())}")
+
+        lookup = {"pk": int(opts["user"])} if opts["user"].isdigit() else {"username": opts["user"]}
+        try:
+            user = User.objects.using("default").get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"User '{opts['user']}' not found.")
+
+        source = shard_for_user(user.pk)
+        if source == target:
+            raise CommandError(f"User {user.pk} already lives on '{target}'.")
+
+        self.stdout.write(f"Moving user {user.pk} ({user.username}): {source} -> {target}")
+
+        # 1) Make sure the user row exists on the target (FK target for everything)
+        if not User.objects.using(target).filter(pk=user.pk).exists():
+            user.save(using=target, force_insert=True)
+
+        # 2) Bulk copy + verify inside one transaction on the target
+        #    (parents before children, deleted in the reverse order)
+        models = sharded_models()
+        try:
+            # Pinned so nothing unhinted falls through to 'default'
+            with use_shard_for(user.pk), transaction.atomic(using=target):
+                for model in models:
+                    if model.objects.using(target).filter(user_id=user.pk).exists():
+                        raise CommandError(
+                            f"Target '{target}' already has {model.__name__} rows for this user."
+                        )
+
+                    copied = 0
+                    batch = []
+                    source_rows = model.objects.using(source).filter(user_id=user.pk).order_by("pk")
+                    if model is Category:
+                        # Parents before their subcategories (fewest ancestors first)
+                        source_rows = source_rows.annotate(levels=Count("ancestor_links")).order_by("levels", "pk")
+                    with _keeping_timestamps(model):
+                        for obj in source_rows.iterator(chunk_size=batch_size):
+                            obj._state.db = target
+                            batch.append(obj)
+                            if len(batch) >= batch_size:
+                                model.objects.using(target).bulk_create(batch)
+                                copied += len(batch)
+                                batch = []
+                        if batch:
+                            model.objects.using(target).bulk_create(batch)
+                            copied += len(batch)
+
+                    self._verify(model, user.pk, source, target)
+                    self.stdout.write(f"  {model.__name__}: {copied} row(s) copied and verified")
+        except CommandError:
+            raise
+        except Exception as e:
+            raise CommandError(f"Copy failed, target rolled back: {e}")
+
+        # 3) Switch reads/writes to the new shard
+        set_user_shard(user.pk, target)
+
+        # 4) Remove the source copy. Raw deletes (children first, no signals):
+        #    the post_delete receivers would otherwise "undo" each row in the
+        #    forecast / budget counters, which now live on the target.
+        if not opts["keep_source"]:
+            with transaction.atomic(using=source):
+                for model in reversed(models):
+                    rows = model.objects.using(source).filter(user_id=user.pk)
+                    if model is Category:
+                        # Subcategories protect their parents: flatten the tree first
+                        rows.update(parent=None)
+                    rows._raw_delete(using=source)
+
+        self.stdout.write(self.style.SUCCESS(f"User {user.pk} now lives on '{target}'."))
+
+    def _verify(self, model, user_id, source, target):
+        aggregates = {"n": Count("pk")}
+        field = CHECKSUM_FIELDS.get(model)
+        if field:
+            aggregates["total"] = Sum(field)
+        for f in _timestamp_fields(model):
+            aggregates[f"latest_{f.name}"] = Max(f.name)  # not re-stamped by the copy
+
+        src = model.objects.using(source).filter(user_id=user_id).aggregate(**aggregates)
+        dst = model.objects.using(target).filter(user_id=user_id).aggregate(**aggregates)
+        if src != dst:
+            raise CommandError(f"Verification failed for {model.__name__}: source={src} target={dst}")
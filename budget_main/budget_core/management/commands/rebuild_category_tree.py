@@ -0,0 +1,31 @@
+# budget_core/management/commands/rebuild_category_tree.py
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from budget_core.category_tree import rebuild_user
+from budget_core.sharding import use_shard_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the category closure table (money_category_closure) from the "
+        "categories' parent pointers. Run once after adding the table, or after "
+        "loading categories with loaddata / raw SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", default=[], help="Username (repeatable); default all users")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        users = User.objects.order_by("pk")
+        if opts["user"]:
+            users = users.filter(username__in=opts["user"])
+
+        total = 0
+        for user in users.iterator():
+            with use_shard_for(user.pk):
+                total += rebuild_user(user.pk)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} closure row(s) written."))
@@ -0,0 +1,79 @@
+# budget_core/middleware.py
+
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+
+from budget_core.sharding import current_shard, use_shard, use_shard_for
+
+# ManifestStaticFilesStorage names: app.<12 hex>.css
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")
+
+
+class UserShardMiddleware:
+    """
+    Pin all budget_core queries of an authenticated request to the user's shard.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, "user", None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+
+        with use_shard_for(user_id):
+            response = self.get_response(request)
+            if response.streaming:
+                # The body is iterated after this returns: pin it again per chunk
+                response.streaming_content = _pinned(response, current_shard())
+            return response
+
+
+def _pinned(response, alias):
+    if response.is_async:
+        return _apinned_chunks(response.streaming_content, alias)
+    return _pinned_chunks(response.streaming_content, alias)
+
+
+def _pinned_chunks(content, alias):
+    iterator = iter(content)
+    while True:
+        with use_shard(alias):
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def _apinned_chunks(content, alias):
+    iterator = aiter(content)
+    while True:
+        with use_shard(alias):
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield chunk
+
+
+class StaticCacheControlMiddleware:
+    """
+    Far-future, immutable Cache-Control for fingerprinted static files when
+    Django serves them (runserver, SERVE_STATIC); unhashed names get a short
+    max-age so a rebuilt bundle is picked up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.status_code == 200 and request.path.startswith(settings.STATIC_URL):
+            if HASHED_NAME.search(request.path):
+                patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE, immutable=True)
+            else:
+                patch_cache_control(response, public=True, max_age=300)
+        return response
@@ -9,6 +9,8 @@ class Category(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=64)
     type = models.CharField(max_length=7, choices=TYPE_CHOICES)
+    # Subcategory of (same type); ancestors are kept in CategoryClosure
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.PROTECT, related_name='children')
 
     class Meta:
         unique_together = ('user', 'name', 'type')
@@ -18,6 +20,22 @@ class Category(models.Model):
     def __str__(self):
         return f"{self.name} ({self.type})"
 
+class CategoryClosure(models.Model):
+    # One row per (ancestor, descendant) pair of the category tree, the
+    # category itself included at depth 0. Maintained by
+    # budget_core.category_tree on insert and move.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        db_table = "money_category_closure"
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
 class Account(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=64)
@@ -45,10 +63,95 @@ class Transaction(models.Model):
     class Meta:
         ordering = ['-date', '-id']
         db_table = "money_transaction" 
+        indexes = [
+            # Statement reconciliation looks candidates up by exact amount
+            models.Index(fields=['account', 'amount', 'date'], name='money_tx_account_amount'),
+            # Admin changelist: default ordering and date hierarchy without a full scan
+            models.Index(fields=['date', 'id'], name='money_tx_date'),
+        ]
 
     def __str__(self):
         return f"{self.type} {self.amount} - {self.category}"
 
+class ArchivedTransaction(models.Model):
+    # Cold copy of a Transaction older than the archive horizon (same id).
+    # Read-only; written by `manage.py archive_transactions`.
+    TYPE_CHOICES = Category.TYPE_CHOICES
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.PROTECT)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    type = models.CharField(max_length=7, choices=TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    date = models.DateField()
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        ordering = ['-date', '-id']
+        db_table = "money_transaction_archive"
+        indexes = [models.Index(fields=['user', 'date'])]
+
+    def __str__(self):
+        return f"{self.type} {self.amount} - {self.category} (archived)"
+
+class TransactionMonthSummary(models.Model):
+    # Per (account, category, type, month) totals of the archived transactions,
+    # used for balances / all-time totals without touching the archive rows.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.PROTECT)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    type = models.CharField(max_length=7, choices=Category.TYPE_CHOICES)
+    month = models.DateField(help_text='1st of the month')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'account', 'category', 'type', 'month')
+        ordering = ['-month']
+        db_table = "money_transaction_month_summary"
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.type} {self.total} ({self.count})"
+
+class Tag(models.Model):
+    # Free-form label ("trip-2026", "reimbursable"); any number per transaction
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=32)
+
+    class Meta:
+        unique_together = ('user', 'name')
+        ordering = ['name']
+        db_table = "money_tag"
+
+    def __str__(self):
+        return self.name
+
+class TransactionTag(models.Model):
+    # No DB constraint on the transaction: archiving moves the row to
+    # money_transaction_archive under the same id and its tags stay valid.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='links')
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.CASCADE, db_constraint=False, related_name='tag_links',
+    )
+    # Same column, joined to the archive (no column of its own)
+    archived = models.ForeignObject(
+        ArchivedTransaction, on_delete=models.DO_NOTHING, from_fields=['transaction'], to_fields=['id'],
+        related_name='+',
+    )
+
+    class Meta:
+        # (tag, transaction): tag filters read transaction ids from the index alone
+        unique_together = ('tag', 'transaction')
+        db_table = "money_transaction_tag"
+
+    def __str__(self):
+        return f"{self.tag_id} -> {self.transaction_id}"
+
 class Budget(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
@@ -62,3 +165,114 @@ class Budget(models.Model):
 
     def __str__(self):
         return f"{self.category.name} - {self.month:%Y-%m}"
+
+class CategoryRule(models.Model):
+    KIND_CHOICES = (
+        ('keyword', 'Note contains keyword'),
+        ('regex', 'Note matches regex'),
+        ('amount', 'Amount in range'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    pattern = models.CharField(max_length=255, blank=True)
+    min_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    priority = models.PositiveIntegerField(default=100, help_text='Lower wins when several rules match')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['priority', 'id']
+        db_table = "money_category_rule"
+
+    def __str__(self):
+        if self.kind == 'amount':
+            return f"amount {self.min_amount or '-'}..{self.max_amount or '-'} -> {self.category.name}"
+        return f"{self.kind} '{self.pattern}' -> {self.category.name}"
+
+class Statement(models.Model):
+    # Bank statement imported to reconcile an account (see budget_management/reconcile_service.py)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='statements')
+    name = models.CharField(max_length=255, blank=True)
+    start = models.DateField()
+    end = models.DateField()
+    tolerance_days = models.PositiveSmallIntegerField(default=3)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        db_table = "money_statement"
+
+    def __str__(self):
+        return f"{self.account.name} {self.start:%Y-%m-%d}..{self.end:%Y-%m-%d}"
+
+class StatementLine(models.Model):
+    # One statement row; `transaction` is set once it is reconciled
+    MATCH_CHOICES = (
+        ('exact', 'Same amount and date'),
+        ('fuzzy', 'Same amount, date within tolerance'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    statement = models.ForeignKey(Statement, on_delete=models.CASCADE, related_name='lines')
+    date = models.DateField()
+    description = models.CharField(max_length=255, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, help_text='Signed: credits positive, debits negative')
+    transaction = models.OneToOneField(
+        Transaction, null=True, blank=True, on_delete=models.SET_NULL, related_name='statement_line'
+    )
+    match = models.CharField(max_length=5, choices=MATCH_CHOICES, blank=True)
+
+    class Meta:
+        ordering = ['date', 'id']
+        db_table = "money_statement_line"
+
+    def __str__(self):
+        return f"{self.date:%Y-%m-%d} {self.amount} {self.description}"
+
+class ChangeLogEntry(models.Model):
+    # Per-user change feed for sync clients (see budget_core/changelog.py).
+    # Only the latest entry of an object is kept; `seq` is per-user monotonic.
+    OP_CHOICES = (
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    seq = models.BigIntegerField()
+    model = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'seq')
+        ordering = ['seq']
+        indexes = [models.Index(fields=['user', 'model', 'object_id'])]
+        db_table = "money_change_log"
+
+    def __str__(self):
+        return f"#{self.seq} {self.op} {self.model} {self.object_id}"
+
+class ChangeCursor(models.Model):
+    # Last `seq` handed out for the user (row-locked while logging a change)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='change_cursor')
+    seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "money_change_cursor"
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.seq}"
+
+class UserShard(models.Model):
+    # Shard map: which database alias holds this user's money data.
+    # Always stored on the 'default' database (see budget_core.routers).
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shard')
+    alias = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "money_user_shard"
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.alias}"
@@ -0,0 +1,93 @@
+# budget_core/routers.py
+
+from django.contrib.auth import get_user_model
+
+from budget_core.sharding import (
+    DIRECTORY_DB,
+    current_shard,
+    get_shard_aliases,
+    shard_for_user,
+)
+
+SHARDED_APP_LABELS = {"budget_core", "budget_dashboard"}
+
+# Models of sharded apps that still live on the directory DB
+DIRECTORY_MODELS = {"usershard"}
+
+
+def sharded_models():
+    """
+    Per-user models that live on the shards, parents before children
+    (definition order, budget_core first).
+    """
+    from django.apps import apps
+
+    return [
+        model
+        for label in ("budget_core", "budget_dashboard")
+        for model in apps.get_app_config(label).get_models()
+        if _is_sharded(model)
+    ]
+
+
+def _is_sharded(model):
+    return (
+        model._meta.app_label in SHARDED_APP_LABELS
+        and model._meta.model_name not in DIRECTORY_MODELS
+    )
+
+
+class UserShardRouter:
+    """
+    Sends every read/write of a user's accounts, categories, transactions
+    and budgets (plus the per-user analytics state in budget_dashboard) to
+    that user's shard.
+
+    The shard is taken from (in order):
+      1. the `instance` hint (a User, or any object with a user_id)
+      2. the shard set for the current request by UserShardMiddleware
+    Everything else (auth, sessions, admin, the shard map) stays on 'default'.
+
+    auth_user is migrated on every shard so the user FK keeps working; the
+    rebalancing command copies the user row before moving any data.
+    """
+
+    def _db_for(self, model, **hints):
+        if not _is_sharded(model):
+            if model._meta.model_name in DIRECTORY_MODELS:
+                return DIRECTORY_DB
+            return None
+
+        instance = hints.get("instance")
+        if instance is not None:
+            if isinstance(instance, get_user_model()):
+                return shard_for_user(instance.pk)
+            user_id = getattr(instance, "user_id", None)
+            if user_id:
+                return shard_for_user(user_id)
+            if instance._state.db:
+                return instance._state.db
+
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # User rows are mirrored on every shard, so user FKs are always fine
+        User = get_user_model()
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        if obj1._state.db and obj2._state.db:
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label in SHARDED_APP_LABELS:
+            if model_name in DIRECTORY_MODELS:
+                return db == DIRECTORY_DB
+            return db in get_shard_aliases()
+        return None
@@ -0,0 +1,120 @@
+# budget_core/sharding.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DIRECTORY_DB = "default"
+SHARD_CACHE_TTL = 60 * 60
+
+# Shard alias of the user being served by the current request / task
+_current_shard = ContextVar("current_shard", default=None)
+
+
+def get_shard_aliases():
+    """
+    All database aliases that hold per-user money data.
+    Falls back to ['default'] when no shards are configured.
+    """
+    return list(getattr(settings, "DATABASE_SHARDS", None) or [DIRECTORY_DB])
+
+
+def _cache_key(user_id):
+    return f"user-shard:{user_id}"
+
+
+def default_shard_for(user_id):
+    """
+    Placement for users that are not in the shard map yet.
+    """
+    aliases = get_shard_aliases()
+    return aliases[int(user_id) % len(aliases)]
+
+
+def shard_for_user(user_id):
+    """
+    Resolve user_id -> database alias.
+
+    Lookup order: cache -> UserShard row on the directory DB -> default
+    placement (which is then written to the map so it never moves silently
+    when shards are added).
+    """
+    aliases = get_shard_aliases()
+    if len(aliases) == 1:
+        return aliases[0]
+
+    key = _cache_key(user_id)
+    alias = cache.get(key)
+    if alias:
+        return alias
+
+    from budget_core.models import UserShard
+
+    alias = (
+        UserShard.objects.using(DIRECTORY_DB)
+        .filter(user_id=user_id)
+        .values_list("alias", flat=True)
+        .first()
+    )
+    if alias is None:
+        alias = default_shard_for(user_id)
+        UserShard.objects.using(DIRECTORY_DB).get_or_create(
+            user_id=user_id, defaults={"alias": alias}
+        )
+
+    cache.set(key, alias, SHARD_CACHE_TTL)
+    return alias
+
+
+def set_user_shard(user_id, alias):
+    """
+    Point a user at a new shard (used by the rebalancing command).
+    """
+    from budget_core.models import UserShard
+
+    if alias not in get_shard_aliases():
+        raise ValueError(f"Unknown shard alias: {alias}")
+
+    UserShard.objects.using(DIRECTORY_DB).update_or_create(
+        user_id=user_id, defaults={"alias": alias}
+    )
+    cache.set(_cache_key(user_id), alias, SHARD_CACHE_TTL)
+
+
+def current_shard():
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(alias):
+    """
+    Route all unhinted budget_core queries inside the block to `alias`
+    (None = no pin).
+    """
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+@contextmanager
+def use_shard_for(user_id):
+    """
+    Route all unhinted budget_core queries inside the block to user_id's shard.
+    Used by the middleware and by scripts / commands working on one user.
+    """
+    with use_shard(shard_for_user(user_id) if user_id else None) as alias:
+        yield alias
+
+
+def atomic(user_id, savepoint=True):
+    """
+    transaction.atomic() on user_id's shard. A bare transaction.atomic()
+    opens on 'default', so the user's queries (and select_for_update())
+    would run outside it, in autocommit on the shard's connection.
+    """
+    return transaction.atomic(using=shard_for_user(user_id), savepoint=savepoint)
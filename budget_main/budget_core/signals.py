@@ -0,0 +1,167 @@
+# budget_core/signals.py
+
+import copy
+
+from django.contrib.auth import get_user_model
+from django.db.models.base import ModelState
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from budget_core.cache_versions import (
+    bump_accounts,
+    bump_for_transactions,
+    bump_months,
+    bump_user,
+    month_key,
+)
+from budget_core.category_tree import insert_node, move_node
+from budget_core.changelog import record_change, record_changes
+from budget_core.models import Account, Budget, Category, Transaction
+from budget_core.sharding import DIRECTORY_DB, shard_for_user
+
+
+# Bulk writes (bulk_create / queryset updates) skip the per-row model signals;
+# code doing them sends these instead so derived state stays in sync.
+#   transactions_created: sender=Transaction, user_id, transactions (saved rows)
+#   transactions_updated: sender=Transaction, user_id, rows, changes
+#   transactions_deleted: sender=Transaction, user_id, rows
+# `rows` are dicts (id, type, date, account_id, category_id, amount) read
+# before the write, `changes` the {field: value} applied to all of them.
+transactions_created = Signal()
+transactions_updated = Signal()
+transactions_deleted = Signal()
+
+# A category moved in the tree: the subtree totals of `category_ids` (its old
+# and new ancestors) changed.
+#   categories_moved: sender=Category, user_id, category_ids
+categories_moved = Signal()
+
+
+@receiver(post_save, sender=get_user_model())
+def mirror_user_to_shard(sender, instance, using, raw=False, **kwargs):
+    """
+    Keep a copy of the auth_user row on the user's shard so the user FK on
+    accounts/categories/transactions/budgets can be enforced there.
+    """
+    if raw or using != DIRECTORY_DB:
+        return
+
+    alias = shard_for_user(instance.pk)
+    if alias == DIRECTORY_DB:
+        return
+
+    mirror = copy.copy(instance)
+    mirror._state = ModelState()
+    mirror.save(using=alias)
+
+
+# ── Pre-edit row (read once per save) ───────────────────────────────────────
+@receiver(pre_save, sender=Transaction)
+def remember_old_row(sender, instance, **kwargs):
+    # The stored row before an edit (None on create), shared by every
+    # post_save receiver: an edit can move a row to another month, account,
+    # category, type or amount. Same dict shape as the bulk signals' `rows`.
+    instance._old_row = None
+    if instance.pk:
+        instance._old_row = (
+            Transaction.objects.filter(pk=instance.pk)
+            .values("id", "type", "date", "account_id", "category_id", "amount")
+            .first()
+        )
+
+
+# ── Fragment cache versions ──────────────────────────────────────────────────
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transaction_fragments_changed(sender, instance, **kwargs):
+    # An edit can move a row to another month / account: invalidate both sides
+    months = {month_key(instance.date)}
+    accounts = {instance.account_id}
+    old = getattr(instance, "_old_row", None)
+    if old is not None:
+        months.add(month_key(old["date"]))
+        accounts.add(old["account_id"])
+    bump_months(instance.user_id, months)
+    bump_accounts(instance.user_id, accounts)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def account_fragments_changed(sender, instance, **kwargs):
+    # Account names are shown in every month group too
+    bump_user(instance.user_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_fragments_changed(sender, instance, **kwargs):
+    bump_user(instance.user_id)
+
+
+# ── Category tree (closure rows) ─────────────────────────────────────────────
+@receiver(pre_save, sender=Category)
+def remember_parent(sender, instance, **kwargs):
+    instance._tree_old_parent = None
+    if instance.pk:
+        instance._tree_old_parent = (
+            Category.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Category)
+def maintain_category_tree(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # loaddata / copies: rebuild_category_tree
+    if created:
+        insert_node(instance)
+    elif instance.parent_id != getattr(instance, "_tree_old_parent", instance.parent_id):
+        categories_moved.send(sender=Category, user_id=instance.user_id, category_ids=move_node(instance))
+
+
+# ── Sync change log ──────────────────────────────────────────────────────────
+def _log_change(instance, using, op, origin=None):
+    # Skip rows deleted along with their user and copies on a shard the user
+    # no longer lives on (move_user_shard cleaning up the source)
+    if isinstance(origin, get_user_model()) or using != shard_for_user(instance.user_id):
+        return
+    record_change(instance, op)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Transaction)
+@receiver(post_save, sender=Budget)
+def log_upsert(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        _log_change(instance, using, "upsert")
+
+
+@receiver(post_delete, sender=Account)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Budget)
+def log_delete(sender, instance, using, origin=None, **kwargs):
+    _log_change(instance, using, "delete", origin)
+
+
+@receiver(transactions_created)
+def log_bulk_created(sender, user_id, transactions, **kwargs):
+    bump_for_transactions(transactions)
+    record_changes(user_id, "transaction", [t.pk for t in transactions], "upsert")
+
+
+@receiver(transactions_updated)
+def log_bulk_updated(sender, user_id, rows, changes, **kwargs):
+    accounts = {r["account_id"] for r in rows}
+    if "account_id" in changes:
+        accounts.add(changes["account_id"])
+    bump_months(user_id, {month_key(r["date"]) for r in rows})
+    bump_accounts(user_id, accounts)
+    record_changes(user_id, "transaction", [r["id"] for r in rows], "upsert")
+
+
+@receiver(transactions_deleted)
+def log_bulk_deleted(sender, user_id, rows, **kwargs):
+    bump_months(user_id, {month_key(r["date"]) for r in rows})
+    bump_accounts(user_id, {r["account_id"] for r in rows})
+    record_changes(user_id, "transaction", [r["id"] for r in rows], "delete")
@@ -0,0 +1,149 @@
+# budget_core/tags.py
+
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from budget_core.cache_versions import bump_months, month_key
+from budget_core.changelog import record_changes
+from budget_core.models import Tag, Transaction, TransactionTag
+
+# Free-form tags on transactions (money_tag / money_transaction_tag). A link
+# stores the transaction id only, so it keeps matching after the row moves
+# to the archive, and every tag filter is a semi-join on the
+# (tag, transaction) index:
+#
+#   any of A, B:  id IN (SELECT transaction_id ... WHERE tag_id IN (A, B))
+#   all of A, B:  id IN (... tag_id = A) AND id IN (... tag_id = B)
+MAX_TAGS = getattr(settings, "MAX_TAGS_PER_TRANSACTION", 10)
+MATCHES = ("all", "any")
+
+NAME_LENGTH = Tag._meta.get_field("name").max_length
+
+
+def parse_tags(text):
+    """
+    Tag names from "Trip 2026, #reimbursable": lower-case, inner spaces
+    as "-", duplicates dropped, in order. Raises ValueError when there are
+    too many or one is too long.
+    """
+    names = []
+    for part in re.split(r"[,#\n]", text or ""):
+        name = "-".join(part.lower().split())
+        if name and name not in names:
+            names.append(name)
+    if len(names) > MAX_TAGS:
+        raise ValueError(f"At most {MAX_TAGS} tags per transaction.")
+    too_long = [n for n in names if len(n) > NAME_LENGTH]
+    if too_long:
+        raise ValueError(f"Tags are at most {NAME_LENGTH} characters ('{too_long[0]}').")
+    return names
+
+
+# ─── Writes ───────────────────────────────────────────────────────────────────
+def get_or_create_tags(user_id, names):
+    """
+    {name: Tag} for `names`, creating the missing ones (one read, plus one
+    insert and one read back when some are new).
+    """
+    tags = {t.name: t for t in Tag.objects.filter(user_id=user_id, name__in=names)}
+    missing = [name for name in names if name not in tags]
+    if missing:
+        Tag.objects.bulk_create([Tag(user_id=user_id, name=name) for name in missing], ignore_conflicts=True)
+        tags.update((t.name, t) for t in Tag.objects.filter(user_id=user_id, name__in=missing))
+    return tags
+
+
+def set_tags(transaction, names):
+    """
+    Make `names` the tags of one transaction (links added / removed as
+    needed).
+    """
+    tags = get_or_create_tags(transaction.user_id, names)
+    wanted = {tags[name].pk for name in names}
+    current = set(TransactionTag.objects.filter(transaction_id=transaction.pk).values_list("tag_id", flat=True))
+    if wanted == current:
+        return
+    TransactionTag.objects.filter(transaction_id=transaction.pk, tag_id__in=current - wanted).delete()
+    TransactionTag.objects.bulk_create(
+        TransactionTag(user_id=transaction.user_id, tag_id=tag_id, transaction_id=transaction.pk)
+        for tag_id in wanted - current
+    )
+    bump_months(transaction.user_id, {month_key(transaction.date)})
+    record_changes(transaction.user_id, "transaction", [transaction.pk], "upsert")  # snapshot tags
+
+
+def add_tags(user, ids, names):
+    """
+    Add tags to many of the user's transactions (bulk action): one insert,
+    existing links kept. Returns the number of transactions tagged.
+    """
+    rows = list(Transaction.objects.filter(user=user, pk__in=ids).values_list("pk", "date"))
+    tags = get_or_create_tags(user.pk, names)
+    TransactionTag.objects.bulk_create(
+        (
+            TransactionTag(user_id=user.pk, tag_id=tag.pk, transaction_id=pk)
+            for pk, _ in rows
+            for tag in tags.values()
+        ),
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    bump_months(user.pk, {month_key(d) for _, d in rows})
+    record_changes(user.pk, "transaction", [pk for pk, _ in rows], "upsert")  # snapshot tags
+    return len(rows)
+
+
+# ─── Reads ────────────────────────────────────────────────────────────────────
+def tag_filter(user_id, names, match="all"):
+    """
+    Q on `pk` keeping the transactions (hot or archived: same ids) that
+    carry all / any of the tag `names`. The names are resolved with one
+    small query; each tag then becomes an index-only semi-join.
+    """
+    if match not in MATCHES:
+        raise ValueError(f"Unknown match '{match}'. Use one of: {', '.join(MATCHES)}.")
+    tag_ids = list(Tag.objects.filter(user_id=user_id, name__in=names).values_list("pk", flat=True))
+    if not tag_ids or (match == "all" and len(tag_ids) < len(set(names))):
+        return Q(pk__in=[])  # an unknown tag: nothing can match
+
+    links = TransactionTag.objects.filter
+    if match == "any":
+        return Q(pk__in=links(tag_id__in=tag_ids).values("transaction_id"))
+    condition = Q()
+    for tag_id in tag_ids:
+        condition &= Q(pk__in=links(tag_id=tag_id).values("transaction_id"))
+    return condition
+
+
+def tags_by_transaction(ids):
+    """
+    {transaction_id: [tag names]} for hot or archived ids, in one query.
+    """
+    names = defaultdict(list)
+    for transaction_id, name in (
+        TransactionTag.objects.filter(transaction_id__in=ids)
+        .order_by("tag__name")
+        .values_list("transaction_id", "tag__name")
+    ):
+        names[transaction_id].append(name)
+    return names
+
+
+class TaggedRows:
+    """
+    Lazy wrapper of a month group's rows: on iteration, sets `tag_names` on
+    each row from one query for the whole group.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        rows = list(self.rows)
+        names = tags_by_transaction([t.pk for t in rows])
+        for t in rows:
+            t.tag_names = names.get(t.pk, [])
+        return iter(rows)
@@ -1,3 +1,530 @@
-from django.test import TestCase
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from budget_core import sharding
+from budget_core.archive import archive_cutoff, archive_user
+from budget_core.assets import check_built_assets
+from budget_core.category_tree import ancestor_map, rebuild_user, subtree_totals, validate_parent
+from budget_core.changelog import record_changes
+from budget_core.tags import parse_tags, set_tags, tag_filter
+from budget_core.db.pool import ConnectionPool, PoolTimeout
+from budget_core.middleware import UserShardMiddleware
+from budget_core.models import (
+    Account,
+    ArchivedTransaction,
+    Budget,
+    Category,
+    CategoryClosure,
+    ChangeCursor,
+    Transaction,
+    TransactionMonthSummary,
+    UserShard,
+)
+from budget_core.routers import UserShardRouter, sharded_models
+from budget_dashboard.models import BudgetSpend, ForecastState
+
+
+def make_user(username="alice"):
+    return User.objects.create_user(username=username, password="p")
+
+
+# ─── Sharding ─────────────────────────────────────────────────────────────────
+class ShardRoutingTests(TestCase):
+    # Routing decisions only: the aliases need not exist as databases
+    databases = "__all__"  # with DB_SHARDS set, new users are mirrored there
+
+    def setUp(self):
+        self.user = make_user()
+        UserShard.objects.all().delete()  # placed on the real shards, if any
+        cache.clear()
+        self.enterContext(override_settings(DATABASE_SHARDS=["shard_a", "shard_b"]))
+        self.router = UserShardRouter()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_default_placement_is_recorded(self):
+        alias = sharding.shard_for_user(self.user.pk)
+        self.assertEqual(alias, ["shard_a", "shard_b"][self.user.pk % 2])
+        self.assertEqual(UserShard.objects.get(user_id=self.user.pk).alias, alias)
+
+    def test_shard_map_wins_over_default_placement(self):
+        other = "shard_b" if sharding.default_shard_for(self.user.pk) == "shard_a" else "shard_a"
+        sharding.set_user_shard(self.user.pk, other)
+        cache.clear()
+        self.assertEqual(sharding.shard_for_user(self.user.pk), other)
+
+    def test_router_follows_pin_and_instance_hint(self):
+        alias = sharding.shard_for_user(self.user.pk)
+        self.assertIsNone(self.router.db_for_read(Transaction))
+        with sharding.use_shard_for(self.user.pk):
+            self.assertEqual(self.router.db_for_read(Transaction), alias)
+            self.assertEqual(self.router.db_for_write(Category), alias)
+            self.assertIsNone(self.router.db_for_read(User))  # auth stays on default
+        account = Account(user=self.user, name="Cash")
+        self.assertEqual(self.router.db_for_write(Account, instance=account), alias)
+        self.assertEqual(self.router.db_for_read(UserShard), sharding.DIRECTORY_DB)
+
+    def test_allow_migrate(self):
+        self.assertTrue(self.router.allow_migrate("shard_a", "budget_core", "transaction"))
+        self.assertFalse(self.router.allow_migrate("default", "budget_core", "transaction"))
+        self.assertTrue(self.router.allow_migrate("default", "budget_core", "usershard"))
+        self.assertFalse(self.router.allow_migrate("shard_a", "budget_core", "usershard"))
+        self.assertIsNone(self.router.allow_migrate("shard_a", "auth", "user"))
+
+    def test_atomic_opens_on_the_users_shard(self):
+        self.assertEqual(sharding.atomic(self.user.pk).using, sharding.shard_for_user(self.user.pk))
+
+    def test_streaming_body_keeps_the_pin(self):
+        def body():
+            yield sharding.current_shard() or "-"
+            yield sharding.current_shard() or "-"
+
+        request = RequestFactory().get("/")
+        request.user = self.user
+        response = UserShardMiddleware(lambda r: StreamingHttpResponse(body()))(request)
+        self.assertIsNone(sharding.current_shard())  # released once the view returned
+        alias = sharding.shard_for_user(self.user.pk)
+        self.assertEqual(list(response.streaming_content), [alias.encode()] * 2)
+        self.assertIsNone(sharding.current_shard())
+
+    def test_anonymous_request_is_not_pinned(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        response = UserShardMiddleware(lambda r: StreamingHttpResponse(iter([sharding.current_shard() or "-"])))(request)
+        self.assertEqual(b"".join(response.streaming_content), b"-")
+
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, "needs DB_SHARDS with two or more aliases")
+class ShardedWriteTests(TestCase):
+    # Runs against real shard databases, e.g. DB_SHARDS=shard_a,shard_b
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rows_and_atomic_block_on_the_users_shard(self):
+        user = make_user()
+        alias = sharding.shard_for_user(user.pk)
+        with sharding.use_shard_for(user.pk):
+            with sharding.atomic(user.pk):
+                self.assertTrue(connections[alias].in_atomic_block)
+                account = Account.objects.create(user=user, name="Cash")
+                category = Category.objects.create(user=user, name="Food", type="expense")
+                Transaction.objects.create(
+                    user=user, account=account, category=category, type="expense",
+                    amount=Decimal("12.50"), date=date(2026, 1, 5),
+                )
+        self.assertEqual(Transaction.objects.using(alias).filter(user=user).count(), 1)
+        for other in settings.DATABASE_SHARDS:
+            if other != alias:
+                self.assertFalse(Transaction.objects.using(other).filter(user_id=user.pk).exists())
+
+    def test_change_log_cursor_is_locked_inside_a_shard_transaction(self):
+        user = make_user()
+        alias = sharding.shard_for_user(user.pk)
+        outer = len(connections[alias].savepoint_ids)  # the test case's own atomic block
+        depths = []
+
+        def saved(sender, instance, using, **kwargs):
+            depths.append((using, len(connections[using].savepoint_ids)))
+
+        post_save.connect(saved, sender=ChangeCursor)
+        self.addCleanup(post_save.disconnect, saved, sender=ChangeCursor)
+        with sharding.use_shard_for(user.pk):
+            record_changes(user.pk, "account", [1], "upsert")
+        self.assertTrue(depths)  # created, seeded, advanced
+        for using, depth in depths:
+            self.assertEqual(using, alias)
+            self.assertGreater(depth, outer)
+
+    def test_category_move_relinks_inside_a_shard_transaction(self):
+        user = make_user()
+        alias = sharding.shard_for_user(user.pk)
+        outer = len(connections[alias].savepoint_ids)
+        depths = []
+
+        def deleted(sender, instance, using, **kwargs):
+            # Real savepoints above the test's block (the delete's own block has none)
+            depths.append((using, len([sid for sid in connections[using].savepoint_ids[outer:] if sid])))
+
+        post_delete.connect(deleted, sender=CategoryClosure)
+        self.addCleanup(post_delete.disconnect, deleted, sender=CategoryClosure)
+        with sharding.use_shard_for(user.pk):
+            food = Category.objects.create(user=user, name="Food", type="expense")
+            home = Category.objects.create(user=user, name="Home", type="expense")
+            snacks = Category.objects.create(user=user, name="Snacks", type="expense", parent=food)
+            snacks.parent = home
+            snacks.save()
+        self.assertEqual(depths, [(alias, 1)])  # the old Food -> Snacks link, in move_node's block
+
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, "needs DB_SHARDS with two or more aliases")
+class MoveUserShardTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = make_user()
+        self.source = sharding.shard_for_user(self.user.pk)
+        self.target = next(a for a in settings.DATABASE_SHARDS if a != self.source)
+        with sharding.use_shard_for(self.user.pk):
+            account = Account.objects.create(user=self.user, name="Cash", balance=Decimal("100"))
+            food = Category.objects.create(user=self.user, name="Food", type="expense")
+            snacks = Category.objects.create(user=self.user, name="Snacks", type="expense", parent=food)
+            salary = Category.objects.create(user=self.user, name="Salary", type="income")
+            Budget.objects.create(user=self.user, category=food, month=date.today().replace(day=1), amount=Decimal("100"))
+            for amount, category, tx_type in (("30.00", snacks, "expense"), ("50.00", salary, "income")):
+                Transaction.objects.create(
+                    user=self.user, account=account, category=category, type=tx_type,
+                    amount=Decimal(amount), date=date.today(),
+                )
+            Transaction.objects.update(created_at=datetime(2025, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc))
+
+    def rows(self, alias):
+        return {model.__name__: model.objects.using(alias).filter(user_id=self.user.pk).count() for model in sharded_models()}
+
+    def state(self, alias):
+        return {
+            "forecast": sorted(ForecastState.objects.using(alias).filter(user_id=self.user.pk).values_list("series", "n", "yty")),
+            "spent": list(BudgetSpend.objects.using(alias).filter(user_id=self.user.pk).values_list("spent", flat=True)),
+            "created": sorted(Transaction.objects.using(alias).filter(user_id=self.user.pk).values_list("created_at", flat=True)),
+        }
+
+    def test_rows_and_counters_move_unchanged(self):
+        rows, state = self.rows(self.source), self.state(self.source)
+        self.assertEqual(state["spent"], [Decimal("30.00")])
+        self.assertTrue(state["forecast"])
+
+        call_command("move_user_shard", str(self.user.pk), self.target, stdout=StringIO())
+
+        self.assertEqual(sharding.shard_for_user(self.user.pk), self.target)
+        self.assertEqual(self.rows(self.target), rows)
+        self.assertEqual(self.state(self.target), state)  # no delete receivers ran against the copy
+        self.assertEqual(set(self.rows(self.source).values()), {0})
+
+
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, "needs DB_SHARDS with two or more aliases")
+@override_settings(STORAGES={
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class AdminShardTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.staff = User.objects.create_superuser("admin", password="p")
+        self.client.force_login(self.staff)
+        self.other = next(a for a in settings.DATABASE_SHARDS if a != sharding.shard_for_user(self.staff.pk))
+        self.user = make_user()
+        sharding.set_user_shard(self.user.pk, self.other)
+        with sharding.use_shard_for(self.user.pk):
+            self.account = Account.objects.create(user=self.user, name="Elsewhere", balance=Decimal("5"))
+        self.changelist = reverse("admin:budget_core_account_changelist")
+
+    def test_changelist_reads_the_chosen_shard(self):
+        self.assertNotContains(self.client.get(self.changelist), "Elsewhere")
+        self.assertContains(self.client.get(self.changelist, {"shard": self.other}), "Elsewhere")
+        self.assertContains(self.client.get(self.changelist, {"user_id": self.user.pk}), "Elsewhere")
+
+    def test_change_view_opens_the_object_on_its_shard(self):
+        change = reverse("admin:budget_core_account_change", args=[self.account.pk])
+        response = self.client.get(change, {"_changelist_filters": f"shard={self.other}"})
+        self.assertContains(response, "Elsewhere")
+
+        response = self.client.post(
+            f"{change}?_changelist_filters=shard%3D{self.other}",
+            {"user": self.user.pk, "name": "Renamed", "balance": "5.00"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Account.objects.using(self.other).get(pk=self.account.pk).name, "Renamed")
+
+
+# ─── Category tree ────────────────────────────────────────────────────────────
+class CategoryTreeTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = make_user()
+        self.enterContext(sharding.use_shard_for(self.user.pk))
+        self.account = Account.objects.create(user=self.user, name="Cash")
+        self.food = self.category("Food")
+        self.groceries = self.category("Groceries", self.food)
+        self.fruit = self.category("Fruit", self.groceries)
+        self.home = self.category("Home")
+
+    def category(self, name, parent=None):
+        return Category.objects.create(user=self.user, name=name, type="expense", parent=parent)
+
+    def move(self, category, parent):
+        category.parent = parent
+        category.save()
+
+    def links(self):
+        return set(CategoryClosure.objects.filter(user=self.user).values_list("ancestor_id", "descendant_id", "depth"))
+
+    def assert_links_match_a_rebuild(self):
+        moved = self.links()
+        rebuild_user(self.user.pk)
+        self.assertEqual(moved, self.links())
+
+    def test_moving_a_subtree_relinks_all_its_descendants(self):
+        self.move(self.groceries, self.home)
+        self.assertEqual(set(ancestor_map([self.fruit.pk])[self.fruit.pk]), {self.fruit.pk, self.groceries.pk, self.home.pk})
+        self.assert_links_match_a_rebuild()
+
+        self.move(self.groceries, None)  # to the top level
+        self.assertEqual(set(ancestor_map([self.fruit.pk])[self.fruit.pk]), {self.fruit.pk, self.groceries.pk})
+        self.assert_links_match_a_rebuild()
+
+    def test_subtree_totals_follow_a_move(self):
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=self.fruit, type="expense",
+            amount=Decimal("7.00"), date=date(2026, 3, 2),
+        )
+        span = (date(2026, 3, 1), date(2026, 3, 31))
+        self.assertEqual(subtree_totals(*span, user_id=self.user.pk), {self.food.pk: Decimal("7.00")})
+        self.move(self.groceries, self.home)
+        self.assertEqual(subtree_totals(*span, user_id=self.user.pk), {self.home.pk: Decimal("7.00")})
+
+    def test_a_category_cannot_move_under_its_own_subtree(self):
+        with self.assertRaises(ValueError):
+            validate_parent(self.food, self.fruit)
+        validate_parent(self.fruit, self.home)
+
+
+# ─── Tags ─────────────────────────────────────────────────────────────────────
+class TagFilterTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = make_user()
+        self.enterContext(sharding.use_shard_for(self.user.pk))
+        account = Account.objects.create(user=self.user, name="Cash")
+        food = Category.objects.create(user=self.user, name="Food", type="expense")
+        self.rows = {}
+        for name, tags in (("both", ["trip", "work"]), ("trip", ["trip"]), ("work", ["work"]), ("none", [])):
+            tx = Transaction.objects.create(
+                user=self.user, account=account, category=food, type="expense",
+                amount=Decimal("1.00"), date=date(2025, 1, 10), note=name,
+            )
+            set_tags(tx, tags)
+            self.rows[name] = tx.pk
+
+    def matching(self, names, match, model=Transaction):
+        ids = set(model.objects.filter(tag_filter(self.user.pk, names, match), user=self.user).values_list("pk", flat=True))
+        return {name for name, pk in self.rows.items() if pk in ids}
+
+    def test_all_and_any(self):
+        self.assertEqual(self.matching(["trip", "work"], "all"), {"both"})
+        self.assertEqual(self.matching(["trip", "work"], "any"), {"both", "trip", "work"})
+        self.assertEqual(self.matching(["trip"], "all"), {"both", "trip"})
+
+    def test_unknown_tags(self):
+        self.assertEqual(self.matching(["trip", "nope"], "all"), set())
+        self.assertEqual(self.matching(["trip", "nope"], "any"), {"both", "trip"})
+        self.assertEqual(self.matching(["nope"], "any"), set())
+        with self.assertRaises(ValueError):
+            tag_filter(self.user.pk, ["trip"], "some")
+
+    def test_all_is_one_semi_join_per_tag(self):
+        sql = str(Transaction.objects.filter(tag_filter(self.user.pk, ["trip", "work"], "all")).query)
+        self.assertEqual(sql.count("money_transaction_tag"), 2)
+        sql = str(Transaction.objects.filter(tag_filter(self.user.pk, ["trip", "work"], "any")).query)
+        self.assertEqual(sql.count("money_transaction_tag"), 1)
+
+    def test_archived_rows_keep_their_tags(self):
+        archive_user(self.user.pk, date(2025, 2, 1))
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+        self.assertEqual(self.matching(["trip", "work"], "all", ArchivedTransaction), {"both"})
+        self.assertEqual(self.matching(["work"], "any", ArchivedTransaction), {"both", "work"})
+
+    def test_parse_tags(self):
+        self.assertEqual(parse_tags("Trip 2026, #reimbursable,trip 2026"), ["trip-2026", "reimbursable"])
+        with self.assertRaises(ValueError):
+            parse_tags(",".join(f"t{i}" for i in range(20)))
+
+
+# ─── Archiving ────────────────────────────────────────────────────────────────
+class ArchiveTests(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.enterContext(sharding.use_shard_for(self.user.pk))
+        account = Account.objects.create(user=self.user, name="Cash")
+        category = Category.objects.create(user=self.user, name="Food", type="expense")
+        cutoff = archive_cutoff()
+        for d, amount in ((cutoff - timedelta(days=40), "5.00"), (cutoff - timedelta(days=1), "7.00"), (cutoff, "9.00")):
+            Transaction.objects.create(
+                user=self.user, account=account, category=category, type="expense",
+                amount=Decimal(amount), date=d,
+            )
+
+    def test_old_months_move_with_their_summaries(self):
+        self.assertEqual(archive_user(self.user.pk, archive_cutoff(), batch_size=1), 2)
+        self.assertEqual(list(Transaction.objects.filter(user=self.user).values_list("amount", flat=True)),
+                         [Decimal("9.00")])
+        self.assertEqual(ArchivedTransaction.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            sum(s.total for s in TransactionMonthSummary.objects.filter(user=self.user)), Decimal("12.00"),
+        )
+
+    def test_before_inside_the_hot_window_needs_force(self):
+        inside = (archive_cutoff() + timedelta(days=40)).isoformat()
+        with self.assertRaises(CommandError):
+            call_command("archive_transactions", before=inside, stdout=StringIO())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+
+        out = StringIO()
+        call_command("archive_transactions", before=inside, force=True, dry_run=True, stdout=out)
+        self.assertIn("3 transaction(s) would be archived", out.getvalue())
+
+
+# ─── Connection pool ──────────────────────────────────────────────────────────
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+        self.alive = True
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, connect=FakeConnection, **options):
+        return ConnectionPool("test", connect, lambda raw: raw.alive, {"TIMEOUT": 0.2, **options})
+
+    def test_idle_connection_is_reused_after_rollback(self):
+        pool = self.make_pool()
+        raw = pool.checkout()
+        pool.checkin(raw)
+        self.assertEqual(raw.rollbacks, 1)
+        self.assertIs(pool.checkout(), raw)
+        self.assertEqual(pool.snapshot()["created"], 1)
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(MAX_SIZE=1, TIMEOUT=0.05)
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        stats = pool.snapshot()
+        self.assertEqual((stats["waits"], stats["timeouts"], stats["size"]), (1, 1, 1))
+
+    def test_waiter_gets_the_checked_in_connection(self):
+        pool = self.make_pool(MAX_SIZE=1, TIMEOUT=5)
+        raw = pool.checkout()
+        threading.Timer(0.05, pool.checkin, [raw]).start()
+        self.assertIs(pool.checkout(), raw)
+        self.assertGreater(pool.snapshot()["wait_seconds_max"], 0)
+
+    def test_dead_connection_is_replaced(self):
+        pool = self.make_pool()
+        raw = pool.checkout()
+        pool.checkin(raw)
+        raw.alive = False
+        fresh = pool.checkout()
+        self.assertIsNot(fresh, raw)
+        self.assertTrue(raw.closed)
+        stats = pool.snapshot()
+        self.assertEqual((stats["failed_pings"], stats["created"], stats["size"]), (1, 2, 1))
+
+    def test_old_connection_is_recycled(self):
+        pool = self.make_pool(MAX_LIFETIME=0)
+        raw = pool.checkout()
+        pool.checkin(raw)
+        self.assertTrue(raw.closed)  # too old to go back to the idle list
+        self.assertIsNot(pool.checkout(), raw)
+
+    def test_failed_rollback_discards_the_connection(self):
+        pool = self.make_pool()
+        raw = pool.checkout()
+        raw.rollback = lambda: 1 / 0
+        pool.checkin(raw)
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool.snapshot()["size"], 0)
+
+    def test_failed_connect_gives_the_slot_back(self):
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError("refused")
+            return FakeConnection()
+
+        pool = self.make_pool(connect, MAX_SIZE=1)
+        with self.assertRaises(OSError):
+            pool.checkout()
+        self.assertEqual(pool.snapshot()["size"], 0)
+        self.assertIsInstance(pool.checkout(), FakeConnection)
+
+    def test_slow_connect_does_not_block_checkin(self):
+        slow = threading.Event()
+        release = threading.Event()
+
+        def connect():
+            if slow.is_set():
+                release.wait(5)
+            return FakeConnection()
+
+        pool = self.make_pool(connect, MAX_SIZE=2)
+        raw = pool.checkout()
+        slow.set()
+        opener = threading.Thread(target=pool.checkout)
+        opener.start()
+        time.sleep(0.05)  # the second checkout is now inside connect()
+
+        started = time.monotonic()
+        pool.checkin(raw)
+        self.assertIs(pool.checkout(), raw)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(pool.snapshot()["pending"], 1)
+
+        release.set()
+        opener.join(5)
+        self.assertEqual(pool.snapshot()["in_use"], 2)
+
+
+# ─── Front-end build outputs ──────────────────────────────────────────────────
+class BuiltAssetsCheckTests(SimpleTestCase):
+    def test_missing_outputs_are_reported_until_built(self):
+        base = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        with override_settings(BASE_DIR=base):
+            self.assertEqual(
+                [w.msg for w in check_built_assets(None)],
+                ["static/css/app.css is missing (front-end build output).",
+                 "static/js/chart.umd.min.js is missing (front-end build output)."],
+            )
+            for name in ("css/app.css", "js/chart.umd.min.js"):
+                (base / "static" / name).parent.mkdir(parents=True, exist_ok=True)
+                (base / "static" / name).write_text("/* built */")
+            self.assertEqual(check_built_assets(None), [])
@@ -3,14 +3,41 @@
 from datetime import date, timedelta
 from decimal import Decimal
 
-from django.db.models import Sum, Count
-
-import pandas as pd
+import numpy as np
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error
 from math import sqrt
 
-from budget_core.models import Transaction, Account
+from budget_dashboard.forecast_service import forecasts
+from budget_dashboard.snapshot_service import EXPENSE, INCOME, TYPE_NAMES, from_day, load_snapshot, to_day
+
+
+def batch_forecast(totals, horizon=30):
+    """
+    Batch path: LinearRegression on day_index -> daily total (80/20 split
+    for RMSE once there are 10+ days). Returns (future values, rmse).
+    """
+    n = len(totals)
+    day_index = np.arange(n, dtype=float).reshape(-1, 1)
+
+    if n < 10:
+        split_idx = n
+    else:
+        split_idx = int(n * 0.8)
+
+    model = LinearRegression()
+    model.fit(day_index[:split_idx], totals[:split_idx])
+
+    rmse = None
+    if split_idx < n:
+        y_pred = model.predict(day_index[split_idx:])
+        mse = mean_squared_error(totals[split_idx:], y_pred)
+        rmse = float(sqrt(mse))
+
+    # Predict next `horizon` days
+    X_future = np.arange(n, n + horizon, dtype=float).reshape(-1, 1)
+    future_pred = np.maximum(model.predict(X_future), 0.0)  # no negatives
+    return future_pred, rmse
 
 
 def build_advanced_analytics(user, months=6):
@@ -26,77 +53,78 @@ def build_advanced_analytics(user, months=6):
       - current_balance, predicted_30d_expense, predicted_30d_income
       - net_30, expected_balance_30, rec_budget, saved_if_reduce_10
       - cat_labels, cat_values, top_categories
+      - tag_rows (expense per tag)
       - type_labels, type_counts
+
+    Everything is reduced from the columnar snapshot, so a warm call costs
+    two queries: the snapshot's change-log check and the forecast states
+    missing from the cache (none when both are cached).
     """
     today = date.today()
     start_date = today - timedelta(days=30 * int(months))
 
-    base_qs = Transaction.objects.filter(
-        user=user,
-        date__gte=start_date,
-        date__lte=today,
+    # One fetch: the columnar snapshot (incremental delta query), sliced to the window
+    window = load_snapshot(user).window(start_date, today)
+
+    # One grouped pass over the window: (type, category, day) -> sum / count.
+    # Every series and total below is a reduction of these (few) groups.
+    if len(window):
+        first_day = int(window.day[0])
+        day_span = int(window.day[-1]) - first_day + 1
+        cat_span = int(window.category.max()) + 1
+    else:
+        first_day, day_span, cat_span = 0, 1, 1
+
+    keys = (
+        ((window.type.astype(np.int64) + 1) * cat_span + window.category) * day_span
+        + (window.day - first_day)
     )
+    group_keys, inverse = np.unique(keys, return_inverse=True)
+    group_cents = np.bincount(inverse, weights=window.cents, minlength=len(group_keys))
+    group_counts = np.bincount(inverse, minlength=len(group_keys))
 
-    exp_qs = (
-        base_qs.filter(type="expense")
-        .values("date")
-        .annotate(total=Sum("amount"))
-        .order_by("date")
-    )
-    inc_qs = (
-        base_qs.filter(type="income")
-        .values("date")
-        .annotate(total=Sum("amount"))
-        .order_by("date")
-    )
+    group_day = group_keys % day_span + first_day
+    group_cat = (group_keys // day_span) % cat_span
+    group_type = group_keys // day_span // cat_span - 1
 
-    def build_time_series(qs):
+    def daily_totals(type_code):
         """
-        Given a queryset grouped by date with 'date' and 'total',
-        train a LinearRegression on day_index -> total,
-        return historical series, 30-day forecast, and RMSE.
+        Sum amounts per day for one transaction type.
+        Returns (day numbers, totals in RM) sorted by day.
         """
-        if not qs:
+        sel = group_type == type_code
+        days, day_inverse = np.unique(group_day[sel], return_inverse=True)
+        totals = np.bincount(day_inverse, weights=group_cents[sel], minlength=len(days)) / 100.0
+        return days, totals
+
+    online_forecasts = forecasts(user.pk, ["expense", "income"], today)
+
+    def build_time_series(days, totals, series):
+        """
+        Given per-day totals, return historical series, 30-day forecast, and RMSE.
+
+        The forecast and RMSE are read from the online forecaster state
+        (trend + day-of-week, updated on every write). Users without state
+        yet fall back to the batch path: LinearRegression on day_index -> total.
+        """
+        n = len(days)
+        if n == 0:
             return None
 
-        df = pd.DataFrame(list(qs))
-        df["date"] = pd.to_datetime(df["date"])
-        df["total"] = df["total"].astype(float)
-        df = df.sort_values("date")
-        df["day_index"] = range(len(df))
-
-        n = len(df)
-        if n < 10:
-            train_df = df.copy()
-            test_df = None
-        else:
-            split_idx = int(n * 0.8)
-            train_df = df.iloc[:split_idx].copy()
-            test_df = df.iloc[split_idx:].copy()
-
-        X_train = train_df[["day_index"]].values
-        y_train = train_df["total"].values
-
-        model = LinearRegression()
-        model.fit(X_train, y_train)
-
-        rmse = None
-        if test_df is not None and len(test_df) > 0:
-            X_test = test_df[["day_index"]].values
-            y_test = test_df["total"].values
-            y_pred = model.predict(X_test)
-            mse = mean_squared_error(y_test, y_pred)
-            rmse = float(sqrt(mse))
-
-        # Predict next 30 days
-        last_index = int(df["day_index"].max())
-        future_indices = list(range(last_index + 1, last_index + 31))
-        X_future = pd.DataFrame({"day_index": future_indices})[["day_index"]].values
-        future_pred = model.predict(X_future)
-        future_pred = [max(0.0, float(v)) for v in future_pred]  # no negatives
-
-        hist_labels = [d.strftime("%Y-%m-%d") for d in df["date"]]
-        hist_values = [float(v) for v in df["total"]]
+        hist_labels = [from_day(d).strftime("%Y-%m-%d") for d in days]
+        hist_values = totals.tolist()
+
+        online = online_forecasts[series]
+        if online is not None:
+            return {
+                "hist_labels": hist_labels,
+                "hist_values": hist_values,
+                "future_labels": online["future_labels"],
+                "future_values": online["future_values"],
+                "rmse": online["rmse"],
+            }
+
+        future_pred, rmse = batch_forecast(totals)
 
         future_dates = [today + timedelta(days=i) for i in range(1, 31)]
         future_labels = [d.strftime("%Y-%m-%d") for d in future_dates]
@@ -105,28 +133,35 @@ def build_advanced_analytics(user, months=6):
             "hist_labels": hist_labels,
             "hist_values": hist_values,
             "future_labels": future_labels,
-            "future_values": future_pred,
+            "future_values": future_pred.tolist(),
             "rmse": rmse,
         }
 
-    expense_series = build_time_series(exp_qs) if exp_qs else None
-    income_series = build_time_series(inc_qs) if inc_qs else None
+    expense_series = build_time_series(*daily_totals(EXPENSE), "expense")
+    income_series = build_time_series(*daily_totals(INCOME), "income")
 
     has_any_data = bool(expense_series or income_series)
 
+    # Charted history: every day of the window, empty days filled with 0
+    if expense_series:
+        days, totals = daily_totals(EXPENSE)
+        start_day = to_day(start_date)
+        filled = np.zeros(to_day(today) - start_day + 1)
+        filled[days - start_day] = totals
+        expense_series["hist_labels"] = [
+            (start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(len(filled))
+        ]
+        expense_series["hist_values"] = filled.tolist()
+
     # Current overall balance
-    accounts = Account.objects.filter(user=user)
-    opening_total = sum(Decimal(a.balance or 0) for a in accounts)
+    opening_total = Decimal(window.opening_cents) / 100
 
-    totals_by_type = base_qs.values("type").annotate(total=Sum("amount"))
+    # Totals / counts per type (index = type code + 1, 0 is "unknown")
+    type_cents = np.bincount(group_type + 1, weights=group_cents, minlength=len(TYPE_NAMES) + 1)
+    type_count_arr = np.bincount(group_type + 1, weights=group_counts, minlength=len(TYPE_NAMES) + 1)
 
-    income_total = Decimal("0")
-    expense_total = Decimal("0")
-    for row in totals_by_type:
-        if row["type"] == "income":
-            income_total += Decimal(row["total"] or 0)
-        elif row["type"] == "expense":
-            expense_total += Decimal(row["total"] or 0)
+    income_total = Decimal(int(type_cents[INCOME + 1])) / 100
+    expense_total = Decimal(int(type_cents[EXPENSE + 1])) / 100
 
     current_balance = opening_total + income_total - expense_total
 
@@ -152,36 +187,53 @@ def build_advanced_analytics(user, months=6):
             rec_budget = e * Decimal("0.90")
             saved_if_reduce_10 = e - rec_budget
 
-    # Category analytics (expenses only)
-    cat_agg = (
-        base_qs.filter(type="expense")
-        .values("category__name")
-        .annotate(total=Sum("amount"))
-        .order_by("-total")
-    )
+    # Category analytics (expenses only): each top-level category with its
+    # whole subtree, rolled up through the snapshot's parent pointers. The
+    # pie and the top three use the same breakdown
+    sel = group_type == EXPENSE
+    cat_ids, cat_inverse = np.unique(group_cat[sel], return_inverse=True)
+    cat_cents = np.bincount(cat_inverse, weights=group_cents[sel], minlength=len(cat_ids))
+
+    rollup = {}
+    for cat_id, cents in zip(cat_ids.tolist(), cat_cents.tolist()):
+        root = cat_id
+        while window.categories.get(root, (None, None))[1] is not None:
+            root = window.categories[root][1]
+        rollup[root] = rollup.get(root, 0) + int(cents)
 
     cat_labels = []
     cat_values = []
-    for row in cat_agg:
-        label = row["category__name"] or "Uncategorised"
+    top_categories = []
+    for cat_id, cents in sorted(rollup.items(), key=lambda item: -item[1]):
+        label = window.category_names.get(cat_id) or "Uncategorised"
         cat_labels.append(label)
-        cat_values.append(float(row["total"] or 0))
-
-    top_categories = list(cat_agg[:3])
+        cat_values.append(cents / 100)
+        if len(top_categories) < 3:
+            top_categories.append({"category__name": label, "total": Decimal(cents) / 100})
+
+    # Expense per tag (tag links x window rows)
+    tag_rows = []
+    per_tag = window.tag_cents(window.type == EXPENSE)
+    if per_tag:
+        largest = max(per_tag.values())
+        for tag_id, cents in sorted(per_tag.items(), key=lambda item: -item[1]):
+            tag_rows.append({
+                "name": window.tag_names.get(tag_id, ""),
+                "total": Decimal(cents) / 100,
+                "pct": cents * 100 / largest if largest > 0 else 0.0,
+            })
 
     # Transaction type analytics
-    type_agg = (
-        base_qs.values("type")
-        .annotate(count=Count("id"))
-        .order_by("-count")
-    )
+    type_order = np.argsort(-type_count_arr, kind="stable")
 
     type_labels = []
     type_counts = []
-    for row in type_agg:
-        t_label = (row["type"] or "").title() or "Unknown"
+    for idx in type_order:
+        if not type_count_arr[idx]:
+            continue
+        t_label = TYPE_NAMES.get(int(idx) - 1, "").title() or "Unknown"
         type_labels.append(t_label)
-        type_counts.append(int(row["count"] or 0))
+        type_counts.append(int(type_count_arr[idx]))
 
     return {
         "has_any_data": has_any_data,
@@ -207,6 +259,7 @@ def build_advanced_analytics(user, months=6):
         "cat_labels": cat_labels,
         "cat_values": cat_values,
         "top_categories": top_categories,
+        "tag_rows": tag_rows,
 
         "type_labels": type_labels,
         "type_counts": type_counts,
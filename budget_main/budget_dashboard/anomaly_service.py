@@ -0,0 +1,140 @@
+# budget_dashboard/anomaly_service.py
+
+from math import sqrt
+
+from django.conf import settings
+
+from budget_core import sharding
+from budget_core.cache_versions import bump_months, month_key
+from budget_dashboard.models import CategorySpendStat, SpendingAnomaly
+
+# EWMA weight of the newest observation, warm-up size and flag thresholds
+ALPHA = getattr(settings, "ANOMALY_EWMA_ALPHA", 0.1)
+MIN_OBSERVATIONS = getattr(settings, "ANOMALY_MIN_OBSERVATIONS", 5)
+Z_THRESHOLD = getattr(settings, "ANOMALY_Z_THRESHOLD", 3.5)
+RATIO_THRESHOLD = getattr(settings, "ANOMALY_RATIO_THRESHOLD", 5.0)
+
+
+def _score(stat, amount):
+    """
+    Compare an amount with the category's rolling stats (before updating them).
+    Returns (is_anomaly, expected, ratio, zscore).
+    """
+    if stat.n < MIN_OBSERVATIONS or stat.mean <= 0:
+        return False, stat.mean, 0.0, 0.0
+
+    std = sqrt(stat.var) if stat.var > 0 else 0.0
+    ratio = amount / stat.mean
+    zscore = (amount - stat.mean) / std if std else 0.0
+    is_anomaly = amount > stat.mean and (zscore >= Z_THRESHOLD or ratio >= RATIO_THRESHOLD)
+    return is_anomaly, stat.mean, ratio, zscore
+
+
+def _update(stat, amount):
+    """
+    EWMA mean / variance update, O(1).
+    """
+    if stat.n == 0:
+        stat.mean = amount
+        stat.var = 0.0
+    else:
+        diff = amount - stat.mean
+        incr = ALPHA * diff
+        stat.mean += incr
+        stat.var = (1 - ALPHA) * (stat.var + diff * incr)
+    stat.n += 1
+
+
+def observe_many(transactions, rescore=False, learn=True):
+    """
+    Score and learn from newly written transactions (imports through
+    `transactions_created`, e.g. the batch API).
+
+    Loads the stats of every (user, category) involved with one query per
+    user, walks the rows in date order in memory, then writes stats and
+    flags in bulk. rescore=True drops existing flags of the rows first;
+    learn=False scores against the current stats without updating them
+    (edited rows: their amount was learned when they were created).
+    Returns the list of SpendingAnomaly rows created.
+    """
+    rows = [t for t in transactions if t.type == "expense" and t.pk]
+    if not rows:
+        return []
+
+    rows.sort(key=lambda t: (t.date, t.pk))
+    created = []
+    for user_id in {t.user_id for t in rows}:
+        created += _observe_user(user_id, [t for t in rows if t.user_id == user_id], rescore, learn)
+
+    # The "Unusual" badge lives in the cached month groups (rescore may also drop badges)
+    if rescore:
+        flagged = rows
+    else:
+        by_pk = {t.pk: t for t in rows}
+        flagged = [by_pk[a.transaction_id] for a in created]
+    for user_id in {t.user_id for t in flagged}:
+        bump_months(user_id, {month_key(t.date) for t in flagged if t.user_id == user_id})
+    return created
+
+
+def _observe_user(user_id, rows, rescore, learn):
+    with sharding.atomic(user_id):
+        stats = CategorySpendStat.objects.filter(user_id=user_id, category_id__in={t.category_id for t in rows})
+        if learn:
+            stats = stats.select_for_update()
+        stats = {s.category_id: s for s in stats}
+        existing = set(stats)
+
+        if rescore:
+            SpendingAnomaly.objects.filter(transaction_id__in=[t.pk for t in rows]).delete()
+
+        anomalies = {}
+        for t in rows:
+            stat = stats.get(t.category_id)
+            if stat is None:
+                stat = stats[t.category_id] = CategorySpendStat(user_id=user_id, category_id=t.category_id)
+
+            amount = float(t.amount)
+            is_anomaly, expected, ratio, zscore = _score(stat, amount)
+            anomalies.pop(t.pk, None)
+            if is_anomaly:
+                anomalies[t.pk] = SpendingAnomaly(
+                    user_id=user_id,
+                    transaction_id=t.pk,
+                    category_id=t.category_id,
+                    expected=expected,
+                    ratio=ratio,
+                    zscore=zscore,
+                )
+            if learn:
+                _update(stat, amount)
+
+        if learn:
+            CategorySpendStat.objects.bulk_create([s for k, s in stats.items() if k not in existing])
+            CategorySpendStat.objects.bulk_update(
+                [s for k, s in stats.items() if k in existing], ["n", "mean", "var"]
+            )
+        return SpendingAnomaly.objects.bulk_create(anomalies.values())
+
+
+def observe_transaction(tx, edited=False):
+    """
+    Single-row version used by transaction_create / transaction_edit.
+    An edited row is rescored against the current stats, which are left
+    as they are (re-learning it would count it twice).
+    Returns the SpendingAnomaly if the transaction was flagged, else None.
+    """
+    if tx.type != "expense":
+        if SpendingAnomaly.objects.filter(transaction_id=tx.pk).delete()[0]:
+            bump_months(tx.user_id, {month_key(tx.date)})
+        return None
+    created = observe_many([tx], rescore=True, learn=not edited)
+    return created[0] if created else None
+
+
+def recent_anomalies(user, since, limit=5):
+    return list(
+        SpendingAnomaly.objects.filter(user=user, transaction__date__gte=since)
+        .select_related("transaction", "category")
+        .order_by("-transaction__date", "-id")[:limit]
+    )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BudgetDashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'budget_dashboard'
+
+    def ready(self):
+        from budget_dashboard import signals  # noqa: F401
@@ -0,0 +1,408 @@
+# budget_dashboard/assistant_service.py
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.core.cache import cache
+
+from budget_dashboard.scenario_service import apply_scenario, parse_what_if, resolve_changes, run_tool
+
+# Upstream LLM guard rails: at most MAX_CONCURRENCY calls in flight per
+# process, a short wait for a free slot, a hard deadline per call and a
+# per-user budget of calls per minute. Worst case latency of the assistant
+# is QUEUE_WAIT + TIMEOUT; anything refused gets the local answer instead.
+MAX_CONCURRENCY = getattr(settings, "ASSISTANT_MAX_CONCURRENCY", 4)
+QUEUE_WAIT = getattr(settings, "ASSISTANT_QUEUE_WAIT", 0.25)
+TIMEOUT = getattr(settings, "ASSISTANT_TIMEOUT", 8.0)
+RATE_PER_MINUTE = getattr(settings, "ASSISTANT_RATE_PER_MINUTE", 10)
+BREAKER_FAILURES = getattr(settings, "ASSISTANT_BREAKER_FAILURES", 5)
+BREAKER_COOLDOWN = getattr(settings, "ASSISTANT_BREAKER_COOLDOWN", 30.0)
+
+
+# ─── Prompt ───────────────────────────────────────────────────────────────────
+SYSTEM_PROMPT = """
+You are a helpful, cautious personal finance assistant for an app called "Money Manager".
+
+You are given a summary of the user's real financial analytics (balances, predicted expenses/income,
+top spending categories, and model quality). Use ONLY this data and general money management
+knowledge to answer questions.
+
+Constraints:
+- Do NOT give investment or trading recommendations for specific stocks, crypto, or complex products.
+- Instead, focus on budgeting, spending control, emergency funds, saving habits, and general advice.
+- Highlight risky behaviours gently (e.g. overspending, negative cashflow).
+- Keep answers short and clear (3–6 short paragraphs or bullet points).
+- If something is uncertain because the data is missing, say so.
+- For "what if" questions about spending more or less in a category, call the what_if tool
+  (when offered) and quote its projected balances.
+- Always remind that this is not professional financial advice.
+"""
+
+
+def analytics_summary(user, analytics, anomalies, months):
+    """
+    Plain-text snapshot of build_advanced_analytics() output (plus recent
+    anomalies) that the model answers from.
+    """
+    current_balance       = analytics.get("current_balance")
+    predicted_30d_expense = analytics.get("predicted_30d_expense")
+    predicted_30d_income  = analytics.get("predicted_30d_income")
+    expected_balance_30   = analytics.get("expected_balance_30")
+    net_30                = analytics.get("net_30")
+    top_categories        = analytics.get("top_categories") or []
+    rmse_expense          = analytics.get("rmse_expense")
+    rmse_income           = analytics.get("rmse_income")
+    has_income_data       = analytics.get("has_income_data", False)
+
+    # Top categories text
+    if top_categories:
+        cat_bits = []
+        for row in top_categories:
+            name = row.get("category__name") or "Uncategorised"
+            total = row.get("total") or 0
+            cat_bits.append(f"{name} (RM {float(total):.2f})")
+        top_cat_text = ", ".join(cat_bits)
+    else:
+        top_cat_text = "No strong spending categories yet."
+
+    # Unusual transactions flagged on insert (streaming detector)
+    if anomalies:
+        anomaly_text = "\n".join(
+            f"- {a.transaction.date}: RM {float(a.transaction.amount):.2f} on {a.category.name} "
+            f"({a.ratio:.1f}x the usual RM {a.expected:.2f})"
+            for a in anomalies
+        )
+    else:
+        anomaly_text = "None flagged."
+
+    return f"""
+User: {user.username} | History window: last {months} month(s).
+
+Current balance (all accounts combined): RM {float(current_balance or 0):.2f}
+
+Predicted next 30 days:
+- Expenses: {('RM %.2f' % float(predicted_30d_expense)) if predicted_30d_expense is not None else 'N/A'}
+- Income:   {('RM %.2f' % float(predicted_30d_income)) if predicted_30d_income is not None else 'N/A'}
+
+Expected balance in 30 days: {('RM %.2f' % float(expected_balance_30)) if expected_balance_30 is not None else 'N/A'}
+Net 30-day cash flow (income - expense): {('RM %.2f' % float(net_30)) if net_30 is not None else 'N/A'}
+
+Top spending categories recently:
+{top_cat_text}
+
+Unusual transactions (much larger than normal for their category):
+{anomaly_text}
+
+Model quality (approximate):
+- Expense model RMSE: {('RM %.2f' % rmse_expense) if rmse_expense is not None else 'N/A'}
+- Income model RMSE:  {('RM %.2f' % rmse_income) if (has_income_data and rmse_income is not None) else 'N/A or no income data'}
+""".strip()
+
+
+# ─── Circuit breaker ──────────────────────────────────────────────────────────
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; open -> half-open
+    after `cooldown` seconds, where a single probe call decides between
+    closed (success) and open again (failure).
+    """
+
+    def __init__(self, failures, cooldown):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half-open"
+            if self.state == "half-open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def cancel_probe(self):
+        # The allowed call never ran (no free slot): let the next one probe
+        with self._lock:
+            self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive += 1
+            self.probing = False
+            if self.state == "half-open" or self.consecutive >= self.failures:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive, "trips": self.trips}
+
+
+# ─── Gate ─────────────────────────────────────────────────────────────────────
+class AssistantGate:
+    """
+    Runs upstream calls on a small worker pool behind a semaphore. A slot is
+    released when the call really ends (not when the request gives up on
+    it), so a hung upstream cannot pile up more than MAX_CONCURRENCY calls.
+    """
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+        self._slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+        self._executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="assistant")
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "busy": 0,
+            "rate_limited": 0,
+            "circuit_open": 0,
+            "in_flight": 0,
+            "latency_seconds_total": 0.0,
+            "latency_seconds_max": 0.0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _rate_limited(self, user_id):
+        window = int(time.time() // 60)
+        key = f"assistant-rate:{user_id}:{window}"
+        cache.add(key, 0, 120)
+        try:
+            return cache.incr(key) > RATE_PER_MINUTE
+        except ValueError:  # expired between add and incr
+            cache.set(key, 1, 120)
+            return False
+
+    def _run(self, fn):
+        self._count("in_flight")
+        try:
+            return fn()
+        finally:
+            self._count("in_flight", -1)
+            self._slots.release()
+
+    def call(self, user_id, fn):
+        """
+        Run fn() (the upstream request) under the guard rails.
+        Returns (result, None) or (None, reason) with reason one of
+        rate_limited, circuit_open, busy, timeout, error.
+        """
+        if self._rate_limited(user_id):
+            self._count("rate_limited")
+            return None, "rate_limited"
+        if not self.breaker.allow():
+            self._count("circuit_open")
+            return None, "circuit_open"
+        if not self._slots.acquire(timeout=QUEUE_WAIT):
+            self.breaker.cancel_probe()
+            self._count("busy")
+            return None, "busy"
+
+        self._count("calls")
+        started = time.monotonic()
+        future = self._executor.submit(self._run, fn)
+        try:
+            result = future.result(timeout=TIMEOUT)
+        except FutureTimeout:
+            self._count("timeouts")
+            self.breaker.record_failure()
+            return None, "timeout"
+        except Exception:
+            self._count("failures")
+            self.breaker.record_failure()
+            return None, "error"
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.stats["successes"] += 1
+            self.stats["latency_seconds_total"] += elapsed
+            self.stats["latency_seconds_max"] = max(self.stats["latency_seconds_max"], elapsed)
+        self.breaker.record_success()
+        return result, None
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["breaker"] = self.breaker.snapshot()
+        stats["max_concurrency"] = MAX_CONCURRENCY
+        return stats
+
+
+gate = AssistantGate()
+
+
+def assistant_stats():
+    return gate.snapshot()
+
+
+# ─── Local fallback answers ───────────────────────────────────────────────────
+# Deterministic replies from the analytics numbers, picked by keywords
+INTENTS = (
+    ("what_if", ("what if", "what happens if", "scenario", "%")),
+    ("unusual", ("unusual", "strange", "weird", "suspicious", "anomal", "big purchase", "large")),
+    ("budget", ("budget", "next month", "plan", "limit", "allowance")),
+    ("overspending", ("overspend", "too much", "spend less", "cut", "reduce", "where", "most")),
+    ("saving", ("save", "saving", "emergency", "goal")),
+    ("balance", ("balance", "forecast", "predict", "afford", "cash flow", "cashflow", "30 day", "end of month")),
+)
+
+DISCLAIMER = "This is not professional financial advice."
+
+
+def _rm(value):
+    return "N/A" if value is None else f"RM {float(value):.2f}"
+
+
+def detect_intent(message):
+    text = message.lower()
+    for intent, keywords in INTENTS:
+        if any(k in text for k in keywords):
+            return intent
+    return "summary"
+
+
+def _what_if_lines(message, scenario_base):
+    if scenario_base is None:
+        return ["I need at least a few weeks of spending to project a what-if scenario."]
+    changes, _ = resolve_changes(scenario_base, parse_what_if(message, scenario_base))
+    names = ", ".join(c["name"] for c in scenario_base["categories"][:5])
+    if not changes:
+        return [f"Tell me a category and a percentage, e.g. \"what if I cut "
+                f"{scenario_base['categories'][0]['name']} by 20%\". Your biggest categories: {names}."]
+    try:
+        result = apply_scenario(scenario_base, changes)
+    except ValueError as e:
+        return [str(e)]
+    lines = [
+        f"- {c['name']}: {c['percent']:+g}% → {_rm(c['30']['scenario'])} instead of "
+        f"{_rm(c['30']['baseline'])} over 30 days"
+        for c in result["categories"]
+    ]
+    for h in ("30", "90"):
+        lines.append(f"Balance in {h} days: {_rm(result['scenario'][h]['balance'])} "
+                     f"(vs {_rm(result['baseline'][h]['balance'])}, {_rm(result['saved'][h])} saved).")
+    return lines
+
+
+def local_answer(message, analytics, anomalies=(), months=6, scenario_base=None):
+    """
+    Answer common questions straight from build_advanced_analytics() output
+    (used when the LLM is unavailable, slow or the user is rate limited).
+    What-if questions are answered from `scenario_base`
+    (scenario_service.category_forecasts()).
+    """
+    a = analytics
+    expense = a.get("predicted_30d_expense")
+    income = a.get("predicted_30d_income")
+    net = a.get("net_30")
+    top = a.get("top_categories") or []
+    intent = detect_intent(message)
+    lines = []
+
+    if not a.get("has_any_data"):
+        lines.append("I don't have enough transactions yet to say much. Add a few weeks of income and "
+                     "expenses and I can show trends, forecasts and a suggested budget.")
+    elif intent == "what_if":
+        lines += _what_if_lines(message, scenario_base)
+    elif intent == "unusual":
+        if anomalies:
+            lines.append("These transactions were much larger than usual for their category:")
+            lines += [
+                f"- {t.transaction.date}: {_rm(t.transaction.amount)} on {t.category.name} "
+                f"({t.ratio:.1f}x the usual {_rm(t.expected)})"
+                for t in anomalies
+            ]
+        else:
+            lines.append(f"Nothing unusual was flagged in the last {months} month(s).")
+    elif intent == "overspending":
+        if top:
+            lines.append(f"Your biggest spending categories over the last {months} month(s):")
+            lines += [f"- {row['category__name']}: {_rm(row['total'])}" for row in top]
+            first = top[0]
+            lines.append(f"Trimming {first['category__name']} by 10% would save about "
+                         f"{_rm(float(first['total']) * 0.10 / max(months, 1))} a month.")
+        if net is not None and net < 0:
+            lines.append(f"You are forecast to spend {_rm(-net)} more than you earn in the next 30 days.")
+        elif net is not None:
+            lines.append(f"Your next 30 days still look positive: {_rm(net)} net.")
+    elif intent == "budget":
+        if a.get("rec_budget") is not None:
+            lines.append(f"Forecast spending for the next 30 days is {_rm(expense)}. A budget of "
+                         f"{_rm(a['rec_budget'])} (10% less) would save about {_rm(a.get('saved_if_reduce_10'))}.")
+        for row in top:
+            monthly = float(row["total"]) / max(months, 1)
+            lines.append(f"- {row['category__name']}: cap at {_rm(monthly * 0.9)} "
+                         f"(you average {_rm(monthly)} a month)")
+        if income is not None:
+            lines.append(f"Expected income over the same period: {_rm(income)}.")
+    elif intent == "saving":
+        if expense is not None:
+            lines.append(f"An emergency fund of 3–6 months of spending is about "
+                         f"{_rm(float(expense) * 3)}–{_rm(float(expense) * 6)} at your current pace.")
+        if net is not None and net > 0:
+            lines.append(f"You are on track to have {_rm(net)} left over in 30 days; "
+                         f"moving part of it to savings early makes it stick.")
+        elif a.get("saved_if_reduce_10") is not None:
+            lines.append(f"Cutting spending by 10% would free up about {_rm(a['saved_if_reduce_10'])} a month.")
+    else:
+        lines.append(f"Current balance across accounts: {_rm(a.get('current_balance'))}.")
+        lines.append(f"Next 30 days: expenses {_rm(expense)}, income {_rm(income)}, net {_rm(net)}.")
+        lines.append(f"Expected balance in 30 days: {_rm(a.get('expected_balance_30'))}.")
+        if intent == "summary" and top:
+            lines.append("Top categories: " + ", ".join(
+                f"{row['category__name']} ({_rm(row['total'])})" for row in top
+            ) + ".")
+
+    lines.append(DISCLAIMER)
+    return "\n".join(lines)
+
+
+# ─── Tool calls ───────────────────────────────────────────────────────────────
+def tool_messages(scenario_base, message):
+    """
+    Follow-up messages for a completion that asked for tool calls: the
+    assistant turn echoing the calls, then one "tool" reply per call with the
+    what_if result (scenario_service.run_tool) as JSON.
+    """
+    calls = message.tool_calls or []
+    replies = [{
+        "role": "assistant",
+        "content": message.content or "",
+        "tool_calls": [
+            {"id": c.id, "type": "function", "function": {"name": c.function.name, "arguments": c.function.arguments}}
+            for c in calls
+        ],
+    }]
+    for c in calls:
+        try:
+            arguments = json.loads(c.function.arguments or "{}")
+        except ValueError:
+            arguments = {}
+        result = run_tool(scenario_base, arguments) if c.function.name == "what_if" else {"error": "Unknown tool."}
+        replies.append({"role": "tool", "tool_call_id": c.id, "content": json.dumps(result)})
+    return replies
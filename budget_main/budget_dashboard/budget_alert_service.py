@@ -0,0 +1,171 @@
+# budget_dashboard/budget_alert_service.py
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+
+from budget_core import sharding
+from budget_core.category_tree import ancestor_map, subtree_totals
+from budget_core.events import publish
+from budget_dashboard.models import BudgetAlert, BudgetSpend
+
+# Percent of a budget that raises an alert when an expense write crosses it
+THRESHOLDS = tuple(sorted(getattr(settings, "BUDGET_ALERT_THRESHOLDS", (80, 100))))
+
+
+def _month(d):
+    return d.replace(day=1)
+
+
+def _level(spent, amount):
+    """
+    Highest threshold reached by `spent` out of `amount` (0 for none).
+    """
+    if amount <= 0:
+        return THRESHOLDS[-1] if spent > 0 else 0
+    pct = spent * 100 / amount
+    return max((t for t in THRESHOLDS if pct >= t), default=0)
+
+
+def _evaluate(spend, budget):
+    """
+    Move spend.level to the current level; returns an unsaved BudgetAlert
+    for the highest threshold newly crossed upwards, or None. Dropping
+    back below a threshold re-arms it.
+    """
+    level = _level(spend.spent, budget.amount)
+    crossed = level > spend.level
+    spend.level = level
+    if not crossed:
+        return None
+    return BudgetAlert(
+        user_id=budget.user_id,
+        budget=budget,
+        threshold=level,
+        spent=spend.spent,
+        amount=budget.amount,
+    )
+
+
+def _announce(alerts):
+    for alert in alerts:
+        alert.save()
+        publish(alert.user_id, "budget_alert", alert_payload(alert), event_id=alert.pk)
+
+
+def alert_payload(alert):
+    budget = alert.budget
+    return {
+        "id": alert.pk,
+        "budget": budget.pk,
+        "category": budget.category.name,
+        "month": budget.month.strftime("%Y-%m"),
+        "threshold": alert.threshold,
+        "spent": alert.spent,
+        "amount": alert.amount,
+    }
+
+
+# ─── Write path (O(1) per expense) ───────────────────────────────────────────
+def apply_spend(user_id, changes):
+    """
+    Add expense deltas to the matching budget counters and raise alerts.
+
+    `changes`: iterable of (category_id, date, amount) with negative amounts
+    for removed / moved-away expenses. A budget covers its category's
+    subtree, so each delta also goes to the category's ancestors (one
+    closure query). Deltas are summed per (category, month) and the
+    counters are read with one locked query, so the cost depends on the
+    number of rows written, not on the user's history or number of budgets.
+    """
+    changes = [(category_id, _month(d), Decimal(amount)) for category_id, d, amount in changes if amount]
+    if not changes:
+        return []
+    ancestors = ancestor_map({category_id for category_id, _, _ in changes})
+    deltas = {}
+    for category_id, month, amount in changes:
+        for ancestor_id in ancestors.get(category_id) or [category_id]:
+            key = (ancestor_id, month)
+            deltas[key] = deltas.get(key, Decimal("0")) + amount
+
+    with sharding.atomic(user_id):
+        spends = list(
+            BudgetSpend.objects.select_for_update()
+            .select_related("budget__category")
+            .filter(
+                user_id=user_id,
+                category_id__in={c for c, m in deltas},
+                month__in={m for c, m in deltas},
+            )
+        )
+        changed, alerts = [], []
+        for spend in spends:
+            delta = deltas.get((spend.category_id, spend.month))
+            if delta is None:
+                continue
+            spend.spent += delta
+            alert = _evaluate(spend, spend.budget)
+            if alert is not None:
+                alerts.append(alert)
+            changed.append(spend)
+
+        BudgetSpend.objects.bulk_update(changed, ["spent", "level"])
+        _announce(alerts)
+    return alerts
+
+
+# ─── Budget lifecycle ─────────────────────────────────────────────────────────
+def month_expense(user_id, category_id, month):
+    """
+    Total expense of a category and its subcategories in a month, hot rows
+    + archived summaries (one-off, when a budget is created or changed).
+    """
+    start = _month(month)
+    end = start.replace(year=start.year + (start.month == 12), month=start.month % 12 + 1) - timedelta(days=1)
+    totals = subtree_totals(start, end, "expense", user_id=user_id, ancestor_ids=[category_id])
+    return totals.get(category_id, Decimal("0"))
+
+
+def reset_budget(budget):
+    """
+    (Re)build the counter of a budget from its transactions and raise an
+    alert if the budget is already past a threshold.
+    """
+    with sharding.atomic(budget.user_id):
+        spend, _ = BudgetSpend.objects.select_for_update().get_or_create(
+            budget=budget,
+            defaults={"user_id": budget.user_id, "category_id": budget.category_id, "month": _month(budget.month)},
+        )
+        spend.category_id = budget.category_id
+        spend.month = _month(budget.month)
+        spend.spent = month_expense(budget.user_id, budget.category_id, budget.month)
+        alert = _evaluate(spend, budget)
+        spend.save()
+        if alert is not None:
+            _announce([alert])
+    return spend
+
+
+def ensure_spends(budgets):
+    """
+    Attach `spend` to each budget, building missing counters (budgets made
+    before counters existed). Expects select_related("spend").
+    """
+    for budget in budgets:
+        try:
+            budget.spend
+        except BudgetSpend.DoesNotExist:
+            budget.spend = reset_budget(budget)
+    return budgets
+
+
+def alerts_after(user, last_id, limit=20):
+    """
+    Alerts newer than `last_id`, oldest first (SSE catch-up on reconnect).
+    """
+    return list(
+        BudgetAlert.objects.filter(user=user, id__gt=last_id)
+        .select_related("budget__category")
+        .order_by("id")[:limit]
+    )
@@ -0,0 +1,128 @@
+# budget_dashboard/conversation_service.py
+
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from budget_dashboard.models import AssistantConversation, AssistantTurn
+
+# Prompt layout per turn (most stable first, so provider-side prompt caching
+# can reuse the longest possible prefix):
+#   1. static system prompt
+#   2. analytics snapshot, frozen on the conversation (refreshed after SNAPSHOT_TTL)
+#   3. running summary of compacted turns (changes only when compacting)
+#   4. recent turns verbatim (append-only between compactions)
+#   5. the new question
+# Recent turns are capped at HISTORY_TOKENS and the summary at SUMMARY_TOKENS,
+# so the prompt of turn 50 is about as large as the prompt of turn 5.
+HISTORY_TOKENS = getattr(settings, "ASSISTANT_HISTORY_TOKENS", 1200)
+SUMMARY_TOKENS = getattr(settings, "ASSISTANT_SUMMARY_TOKENS", 300)
+SNAPSHOT_TTL = getattr(settings, "ASSISTANT_SNAPSHOT_TTL", 3600)
+
+GIST_CHARS = 200
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; close enough for budgeting
+    return max(1, (len(text) + 3) // 4)
+
+
+def open_conversation(user, conversation_id=None, months=6):
+    """
+    The user's conversation `conversation_id`, or a new one when it is
+    missing / not theirs.
+    """
+    conversation = None
+    if conversation_id and str(conversation_id).isdigit():
+        conversation = AssistantConversation.objects.filter(user=user, pk=conversation_id).first()
+    if conversation is None:
+        conversation = AssistantConversation.objects.create(user=user, months=months)
+    return conversation
+
+
+def snapshot_is_stale(conversation, months):
+    return (
+        not conversation.analytics_text
+        or conversation.months != months
+        or conversation.analytics_at is None
+        or timezone.now() - conversation.analytics_at > timedelta(seconds=SNAPSHOT_TTL)
+    )
+
+
+def set_snapshot(conversation, analytics_text, months):
+    conversation.analytics_text = analytics_text
+    conversation.analytics_at = timezone.now()
+    conversation.months = months
+    conversation.save(update_fields=["analytics_text", "analytics_at", "months", "updated_at"])
+
+
+def _gist(turn):
+    # First sentence of a turn, whitespace collapsed, capped at GIST_CHARS
+    text = " ".join(turn.content.split())
+    text = _SENTENCE_END.split(text, 1)[0]
+    if len(text) > GIST_CHARS:
+        text = text[: GIST_CHARS - 1].rstrip() + "…"
+    who = "User asked" if turn.role == "user" else "Assistant said"
+    return f"- {who}: {text}"
+
+
+def compact(conversation):
+    """
+    Fold the oldest uncompacted turns into the running summary once the
+    recent turns exceed HISTORY_TOKENS (down to half the budget, whole
+    question / answer pairs at a time). The summary keeps its newest lines
+    within SUMMARY_TOKENS. Returns the recent turns that stay verbatim.
+    """
+    recent = list(conversation.turns.filter(compacted=False))
+    total = sum(t.tokens for t in recent)
+    if total <= HISTORY_TOKENS:
+        return recent
+
+    folded = []
+    while recent and (total > HISTORY_TOKENS // 2 or recent[0].role != "user"):
+        turn = recent.pop(0)
+        total -= turn.tokens
+        folded.append(turn)
+
+    lines = [line for line in conversation.summary.splitlines() if line]
+    lines += [_gist(t) for t in folded]
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_TOKENS:
+        lines.pop(0)
+
+    conversation.summary = "\n".join(lines)
+    conversation.save(update_fields=["summary", "updated_at"])
+    AssistantTurn.objects.filter(pk__in=[t.pk for t in folded]).update(compacted=True)
+    return recent
+
+
+def build_messages(conversation, system_prompt, recent, question):
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": "User's analytics summary:\n\n" + conversation.analytics_text},
+    ]
+    if conversation.summary:
+        messages.append({
+            "role": "system",
+            "content": "Summary of the earlier conversation:\n" + conversation.summary,
+        })
+    messages += [{"role": t.role, "content": t.content} for t in recent]
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def record_turn(conversation, role, content, source="", usage=None):
+    usage = usage or {}
+    return AssistantTurn.objects.create(
+        user_id=conversation.user_id,
+        conversation=conversation,
+        role=role,
+        content=content,
+        tokens=estimate_tokens(content),
+        source=source,
+        prompt_tokens=usage.get("prompt_tokens"),
+        cached_tokens=usage.get("cached_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+    )
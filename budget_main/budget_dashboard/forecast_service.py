@@ -0,0 +1,236 @@
+# budget_dashboard/forecast_service.py
+
+from datetime import timedelta
+from decimal import Decimal
+from math import sqrt
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+
+from budget_core import sharding
+from budget_dashboard.models import ForecastDay, ForecastState
+from budget_dashboard.snapshot_service import EXPENSE, INCOME, from_day, to_day
+
+# Features per day: [1, t (years since 1970), Mon..Sat dummies] (Sunday = baseline)
+N_FEATURES = 8
+SERIES = ("income", "expense")
+
+# Same rule as the batch path: no RMSE under 10 days of data
+MIN_DAYS_FOR_RMSE = 10
+RIDGE = 1e-6
+
+
+def features(d):
+    x = np.zeros(N_FEATURES)
+    x[0] = 1.0
+    x[1] = to_day(d) / 365.25
+    dow = d.weekday()  # Mon=0 .. Sun=6
+    if dow < 6:
+        x[2 + dow] = 1.0
+    return x
+
+
+def _empty_state():
+    return np.zeros((N_FEATURES, N_FEATURES)), np.zeros(N_FEATURES)
+
+
+def _load(state):
+    if not state.xtx:
+        return _empty_state()
+    return np.array(state.xtx, dtype=float), np.array(state.xty, dtype=float)
+
+
+def _cache_key(user_id, series):
+    return f"forecast-state:{user_id}:{series}"
+
+
+def _publish(state):
+    """
+    Mirror the committed state into the cache so analytics reads are query-free.
+    """
+    payload = {"xtx": state.xtx, "xty": state.xty, "yty": state.yty, "n": state.n}
+    key = _cache_key(state.user_id, state.series)
+    db_transaction.on_commit(lambda: cache.set(key, payload, None), using=state._state.db)
+
+
+def apply_change(user_id, series, d, amount, count):
+    """
+    O(1) update for `count` transactions totalling `amount` added to (or,
+    with negative values, removed from) day `d` of a series.
+
+    Touches one ForecastDay row and one ForecastState row:
+      X'y += amount * x(d)
+      y'y += new_total^2 - old_total^2
+      X'X, n change only when the day appears or disappears.
+    """
+    apply_changes(user_id, [(series, d, amount, count)])
+
+
+def apply_changes(user_id, changes):
+    """
+    Batch form of apply_change for bulk writes: `changes` is an iterable of
+    (series, date, amount, count). Deltas are summed per day, then each
+    series locks its state once and reads / writes its days in bulk.
+    """
+    per_day = {}
+    for series, d, amount, count in changes:
+        if series not in SERIES or not amount and not count:
+            continue
+        delta = per_day.setdefault((series, d), [Decimal("0"), 0])
+        delta[0] += Decimal(amount)
+        delta[1] += count
+    if not per_day:
+        return
+
+    with sharding.atomic(user_id):
+        for series in SERIES:
+            deltas = {d: delta for (s, d), delta in per_day.items() if s == series}
+            if not deltas:
+                continue
+
+            state, _ = ForecastState.objects.select_for_update().get_or_create(user_id=user_id, series=series)
+            days = {
+                day.date: day
+                for day in ForecastDay.objects.select_for_update().filter(
+                    user_id=user_id, series=series, date__in=list(deltas)
+                )
+            }
+            xtx, xty = _load(state)
+            created, updated, emptied = [], [], []
+
+            for d, (amount, count) in deltas.items():
+                day = days.get(d) or ForecastDay(user_id=user_id, series=series, date=d)
+                x = features(d)
+
+                old_total = float(day.total)
+                new_total = float(day.total + amount)
+                new_count = day.count + count
+
+                if day.count == 0 and new_count > 0:
+                    xtx += np.outer(x, x)
+                    state.n += 1
+                elif day.count > 0 and new_count <= 0:
+                    xtx -= np.outer(x, x)
+                    state.n = max(0, state.n - 1)
+                    new_total = 0.0
+
+                xty += (new_total - old_total) * x
+                state.yty = max(0.0, state.yty + new_total ** 2 - old_total ** 2)
+
+                if new_count <= 0:
+                    if day.pk:
+                        emptied.append(day.pk)
+                else:
+                    day.total = day.total + amount
+                    day.count = new_count
+                    (updated if day.pk else created).append(day)
+
+            state.xtx = xtx.tolist()
+            state.xty = xty.tolist()
+            state.save()
+            _publish(state)
+
+            ForecastDay.objects.bulk_create(created)
+            ForecastDay.objects.bulk_update(updated, ["total", "count"])
+            ForecastDay.objects.filter(pk__in=emptied).delete()
+
+
+def rebuild_user(user_id, snapshot):
+    """
+    Recompute ForecastDay / ForecastState for a user from a TransactionSnapshot
+    (used to backfill existing history and to repair drift).
+    """
+    with sharding.atomic(user_id):
+        ForecastDay.objects.filter(user_id=user_id).delete()
+        ForecastState.objects.filter(user_id=user_id).delete()
+        cache.delete_many([_cache_key(user_id, series) for series in SERIES])
+
+        for series, code in (("income", INCOME), ("expense", EXPENSE)):
+            mask = snapshot.type == code
+            days, inverse = np.unique(snapshot.day[mask], return_inverse=True)
+            if not len(days):
+                continue
+            cents = np.bincount(inverse, weights=snapshot.cents[mask], minlength=len(days))
+            counts = np.bincount(inverse, minlength=len(days))
+
+            dates = [from_day(d) for d in days]
+            X = np.array([features(d) for d in dates])
+            y = cents / 100.0
+
+            ForecastDay.objects.bulk_create([
+                ForecastDay(user_id=user_id, series=series, date=d,
+                            total=Decimal(int(c)) / 100, count=int(k))
+                for d, c, k in zip(dates, cents, counts)
+            ])
+            state = ForecastState.objects.create(
+                user_id=user_id,
+                series=series,
+                xtx=(X.T @ X).tolist(),
+                xty=(X.T @ y).tolist(),
+                yty=float(y @ y),
+                n=len(days),
+            )
+            _publish(state)
+
+
+def _states_for(user_id, series_names):
+    """
+    {series: state payload or None}: cache first, then one query for the misses.
+    """
+    keys = {series: _cache_key(user_id, series) for series in series_names}
+    cached = cache.get_many(list(keys.values()))
+    states = {series: cached.get(key) for series, key in keys.items()}
+    missing = [series for series, payload in states.items() if payload is None]
+    if missing:
+        for state in ForecastState.objects.filter(user_id=user_id, series__in=missing):
+            payload = {"xtx": state.xtx, "xty": state.xty, "yty": state.yty, "n": state.n}
+            cache.set(keys[state.series], payload, None)
+            states[state.series] = payload
+    return states
+
+
+def forecast(user_id, series, today, horizon=30):
+    """
+    Read the forecast straight from the stored state (no refit over history).
+
+    Returns {future_labels, future_values, rmse, n} or None if there is no state.
+    RMSE is the in-sample error: sqrt((y'y - 2b'X'y + b'X'Xb) / n).
+    """
+    return forecasts(user_id, [series], today, horizon)[series]
+
+
+def forecasts(user_id, series_names, today, horizon=30):
+    """
+    forecast() for several series of one user: {series: forecast or None},
+    with at most one query (states missing from the cache).
+    """
+    return {
+        series: _from_state(state, today, horizon)
+        for series, state in _states_for(user_id, series_names).items()
+    }
+
+
+def _from_state(state, today, horizon):
+    if state is None or not state["n"] or not state["xtx"]:
+        return None
+
+    xtx = np.array(state["xtx"], dtype=float)
+    xty = np.array(state["xty"], dtype=float)
+    beta = np.linalg.lstsq(xtx + RIDGE * np.eye(N_FEATURES), xty, rcond=None)[0]
+
+    rmse = None
+    if state["n"] >= MIN_DAYS_FOR_RMSE:
+        sse = state["yty"] - 2 * beta @ xty + beta @ xtx @ beta
+        rmse = float(sqrt(max(0.0, sse) / state["n"]))
+
+    future_dates = [today + timedelta(days=i) for i in range(1, horizon + 1)]
+    X_future = np.array([features(d) for d in future_dates])
+    future_values = np.maximum(X_future @ beta, 0.0)  # no negatives
+
+    return {
+        "future_labels": [d.strftime("%Y-%m-%d") for d in future_dates],
+        "future_values": future_values.tolist(),
+        "rmse": rmse,
+        "n": state["n"],
+    }
@@ -0,0 +1,124 @@
+# budget_dashboard/live_service.py
+
+import threading
+from calendar import monthrange
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Q, Sum
+
+from budget_core.archive import account_type_totals, live_balances
+from budget_core.events import publish, subscriber_count
+from budget_core.models import Account, Transaction
+from budget_core.sharding import shard_for_user
+from budget_dashboard.models import BudgetSpend
+from budget_dashboard.timeseries_service import time_series
+
+# Dashboard deltas pushed to open pages after a write commits. Only the parts
+# a write touched are recomputed (its accounts, days and months), as absolute
+# values, so a page that missed an event is corrected by the next one and a
+# reload always agrees with the stream.
+
+# Footprints waiting for the commit, per user: {"dates", "accounts", "categories"}.
+# Signals fired inside one transaction (e.g. the rows of a cascade delete)
+# are merged into one push.
+_pending = threading.local()
+
+
+def _bucket(user_id):
+    if not hasattr(_pending, "users"):
+        _pending.users = {}
+    return _pending.users.setdefault(user_id, {"dates": set(), "accounts": set(), "categories": set()})
+
+
+def schedule_push(user_id, rows=(), accounts=()):
+    """
+    Queue a dashboard delta for `user_id` once the current transaction on
+    the user's shard commits. `rows`: (date, account_id, category_id) of the written rows;
+    `accounts`: accounts edited or deleted themselves.
+    """
+    pending = _bucket(user_id)
+    for d, account_id, category_id in rows:
+        pending["dates"].add(d)
+        pending["accounts"].add(account_id)
+        if category_id:
+            pending["categories"].add(category_id)
+    pending["accounts"].update(accounts)
+    db_transaction.on_commit(lambda: _flush(user_id), using=shard_for_user(user_id))
+
+
+def _flush(user_id):
+    pending = _pending.users.pop(user_id, None) if hasattr(_pending, "users") else None
+    if pending is None or not subscriber_count(user_id):
+        return  # already sent with an earlier callback, or nobody is watching
+    publish(user_id, "dashboard", dashboard_delta(user_id, **pending))
+
+
+def _money(value):
+    return float(value or 0)
+
+
+def dashboard_delta(user_id, dates=(), accounts=(), categories=(), today=None):
+    """
+    The dashboard values that depend on the given dates / accounts /
+    categories (same rules as the dashboard view):
+      accounts: {id: live balance, or None once deleted}
+      month:    {income, spent} of the current month
+      daily:    {"DD": expense} for touched days of the current month
+      monthly:  {"YYYY-MM": expense} for touched months of the 6-month chart
+      budgets:  {category_id: spent} for this month's budgets
+    Keys are left out when the write did not touch them.
+    """
+    today = today or date.today()
+    first_day = today.replace(day=1)
+    last_day = today.replace(day=monthrange(today.year, today.month)[1])
+    six_months_ago = first_day
+    for _ in range(5):
+        six_months_ago = (six_months_ago - timedelta(days=1)).replace(day=1)
+
+    delta = {}
+
+    if accounts:
+        rows = list(Account.objects.filter(user_id=user_id, pk__in=accounts))
+        live_balances(user_id, rows, account_type_totals(user_id, account_ids=accounts))
+        delta["accounts"] = dict.fromkeys(accounts)  # None: the account was deleted
+        delta["accounts"].update({a.pk: _money(a.live_balance) for a in rows})
+
+    this_month = {d for d in dates if first_day <= d <= last_day}
+    if this_month:
+        month_tx = Transaction.objects.filter(user_id=user_id, date__range=[first_day, last_day])
+        totals = month_tx.aggregate(
+            income=Sum("amount", filter=Q(type="income")),
+            spent=Sum("amount", filter=Q(type="expense")),
+        )
+        delta["month"] = {k: _money(v) for k, v in totals.items()}
+
+        daily = dict.fromkeys(this_month, Decimal("0"))
+        rows = (
+            month_tx.filter(type="expense", date__in=this_month)
+            .values("date").annotate(total=Sum("amount")).order_by()
+        )
+        for row in rows:
+            daily[row["date"]] = row["total"]
+        delta["daily"] = {d.strftime("%d"): _money(v) for d, v in daily.items()}
+
+        if categories:
+            # Budgets on the written categories or any of their ancestors
+            spends = BudgetSpend.objects.filter(
+                user_id=user_id, month=first_day, category__descendant_links__descendant_id__in=categories,
+            ).distinct()
+            delta["budgets"] = {s.category_id: _money(s.spent) for s in spends}
+
+    months = sorted({d.replace(day=1) for d in dates if six_months_ago <= d <= last_day})
+    if months:
+        end = months[-1].replace(day=monthrange(months[-1].year, months[-1].month)[1])
+        series = time_series(user_id, months[0], end, granularity="month", tx_type="expense")
+        wanted = {m.strftime("%Y-%m") for m in months}
+        delta["monthly"] = {
+            bucket[:7]: value
+            for bucket, value in zip(series["buckets"], series["values"])
+            if bucket[:7] in wanted
+        }
+
+    return delta
@@ -0,0 +1,129 @@
+# budget_dashboard/management/commands/generate_statements.py
+
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from budget_core.sharding import shard_for_user
+from budget_dashboard.monthly_statement_service import (
+    FORMATS,
+    PdfDocument,
+    finished_users,
+    generate_chunk,
+    statement_dir,
+    statement_month,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a monthly statement (account opening / closing balances, category "
+        "breakdown, budget results, largest expenses) for every user to "
+        "MEDIA_ROOT/statements/<YYYY-MM>/. Users are processed in per-shard chunks "
+        "across a process pool; users whose files exist are skipped, so an "
+        "interrupted or time-boxed run is resumed by running it again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Statement month YYYY-MM (default: last month).")
+        parser.add_argument("--user", action="append", default=[], help="Username (repeatable); default all users")
+        parser.add_argument(
+            "--format", action="append", choices=FORMATS, default=[],
+            help="html and/or pdf (repeatable, default html; pdf needs weasyprint).",
+        )
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Worker processes (default: CPU count; 1 runs inline).")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Users per chunk (default 500).")
+        parser.add_argument("--max-minutes", type=float,
+                            help="Stop starting new chunks after this long; rerun to resume.")
+        parser.add_argument("--force", action="store_true", help="Regenerate existing statements.")
+
+    def handle(self, *args, **opts):
+        try:
+            month = statement_month(opts["month"])
+        except ValueError:
+            raise CommandError("--month must be YYYY-MM.")
+        formats = tuple(dict.fromkeys(opts["format"] or ["html"]))
+        if "pdf" in formats and PdfDocument is None:
+            raise CommandError("PDF output needs weasyprint (pip install weasyprint).")
+        if opts["chunk_size"] < 1 or opts["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1.")
+
+        User = get_user_model()
+        users = User.objects.order_by("pk")
+        if opts["user"]:
+            users = users.filter(username__in=opts["user"])
+        done = set() if opts["force"] else finished_users(month, formats)
+
+        # Chunks never mix shards: each chunk's bulk queries hit one database
+        by_shard = defaultdict(list)
+        for user_id, username in users.values_list("pk", "username").iterator():
+            if user_id not in done:
+                by_shard[shard_for_user(user_id)].append((user_id, username))
+        size = opts["chunk_size"]
+        chunks = [rows[i:i + size] for rows in by_shard.values() for i in range(0, len(rows), size)]
+        pending = sum(len(c) for c in chunks)
+
+        self.stdout.write(
+            f"Statements for {month:%Y-%m} ({', '.join(formats)}) -> {statement_dir(month)}: "
+            f"{pending} user(s) in {len(chunks)} chunk(s), {len(done)} already done"
+        )
+        if not chunks:
+            return
+
+        deadline = time.monotonic() + opts["max_minutes"] * 60 if opts["max_minutes"] else None
+        started = time.monotonic()
+        written, failed, finished = 0, [], 0
+
+        def report(result, chunk):
+            nonlocal written, finished
+            written += result[0]
+            failed.extend(result[1])
+            finished += len(chunk)
+            elapsed = time.monotonic() - started
+            eta = elapsed / finished * (pending - finished)
+            self.stdout.write(f"  {finished}/{pending} users, {elapsed:.0f}s elapsed, ~{eta:.0f}s left")
+
+        if opts["workers"] == 1:
+            for chunk in chunks:
+                if deadline and time.monotonic() > deadline:
+                    break
+                report(generate_chunk(chunk, month, formats), chunk)
+        else:
+            # Forked workers open their own connections: none may be inherited
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=opts["workers"], mp_context=context) as pool:
+                queue = iter(chunks)
+                running = {}
+                while True:
+                    # Keep two chunks per worker in flight, so the deadline
+                    # stops new work without waiting for a long backlog
+                    while len(running) < 2 * opts["workers"] and not (deadline and time.monotonic() > deadline):
+                        chunk = next(queue, None)
+                        if chunk is None:
+                            break
+                        running[pool.submit(generate_chunk, chunk, month, formats)] = chunk
+                    if not running:
+                        break
+                    completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        chunk = running.pop(future)
+                        try:
+                            report(future.result(), chunk)
+                        except Exception as exc:
+                            report((0, [(user_id, f"chunk failed: {exc}") for user_id, _ in chunk]), chunk)
+
+        for user_id, error in failed[:20]:
+            self.stderr.write(f"  user {user_id}: {error}")
+        remaining = pending - finished
+        summary = f"{written} statement(s) written, {len(failed)} failed"
+        if remaining:
+            summary += f", {remaining} left (time limit reached: run again to resume)"
+        self.stdout.write((self.style.WARNING if failed or remaining else self.style.SUCCESS)(summary + "."))
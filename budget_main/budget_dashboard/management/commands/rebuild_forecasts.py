@@ -0,0 +1,73 @@
+# budget_dashboard/management/commands/rebuild_forecasts.py
+
+from math import sqrt
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from sklearn.linear_model import LinearRegression
+
+from budget_core.sharding import use_shard_for
+from budget_dashboard.forecast_service import N_FEATURES, RIDGE, features, rebuild_user
+from budget_dashboard.snapshot_service import EXPENSE, INCOME, from_day, load_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the online forecaster state (ForecastDay / ForecastState) from "
+        "transaction history. With --compare, also report holdout RMSE of the "
+        "online model (trend + day-of-week) against the batch LinearRegression path."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", default=[], help="Username (repeatable); default all users")
+        parser.add_argument("--compare", action="store_true")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        users = User.objects.order_by("pk")
+        if opts["user"]:
+            users = users.filter(username__in=opts["user"])
+
+        for user in users.iterator():
+            with use_shard_for(user.pk):
+                snapshot = load_snapshot(user)
+                rebuild_user(user.pk, snapshot)
+
+                line = f"{user.username}: {len(snapshot)} transaction(s)"
+                if opts["compare"]:
+                    for series, code in (("expense", EXPENSE), ("income", INCOME)):
+                        result = self._compare(snapshot, code)
+                        if result:
+                            line += f" | {series} RMSE batch={result[0]:.2f} online={result[1]:.2f}"
+                self.stdout.write(line)
+
+    def _compare(self, snapshot, code):
+        """
+        Same 80/20 split as the batch path. Returns (batch_rmse, online_rmse)
+        on the holdout days, or None with fewer than 10 days of data.
+        """
+        mask = snapshot.type == code
+        days, inverse = np.unique(snapshot.day[mask], return_inverse=True)
+        n = len(days)
+        if n < 10:
+            return None
+        y = np.bincount(inverse, weights=snapshot.cents[mask], minlength=n) / 100.0
+        split = int(n * 0.8)
+
+        # Batch: LinearRegression on positional day index
+        idx = np.arange(n, dtype=float).reshape(-1, 1)
+        model = LinearRegression().fit(idx[:split], y[:split])
+        batch_err = y[split:] - model.predict(idx[split:])
+
+        # Online: the normal equations the incremental state accumulates
+        X = np.array([features(from_day(d)) for d in days])
+        xtx = X[:split].T @ X[:split]
+        xty = X[:split].T @ y[:split]
+        beta = np.linalg.lstsq(xtx + RIDGE * np.eye(N_FEATURES), xty, rcond=None)[0]
+        online_err = y[split:] - np.maximum(X[split:] @ beta, 0.0)
+
+        return (
+            sqrt(float(np.mean(batch_err ** 2))),
+            sqrt(float(np.mean(online_err ** 2))),
+        )
@@ -1,3 +1,148 @@
 from django.db import models
+from django.contrib.auth.models import User
+from budget_core.models import Budget, Category, Transaction
 
-# Create your models here.
+class ForecastDay(models.Model):
+    # Daily total of one series (expense / income), kept in sync with Transaction writes
+    SERIES_CHOICES = (
+        ('income', 'Income'),
+        ('expense', 'Expense'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    series = models.CharField(max_length=7, choices=SERIES_CHOICES)
+    date = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'series', 'date')
+        db_table = "money_forecast_day"
+
+    def __str__(self):
+        return f"{self.series} {self.date} = {self.total}"
+
+class ForecastState(models.Model):
+    # Sufficient statistics (X'X, X'y, y'y, n) of the online forecaster
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    series = models.CharField(max_length=7, choices=ForecastDay.SERIES_CHOICES)
+    xtx = models.JSONField(default=list)
+    xty = models.JSONField(default=list)
+    yty = models.FloatField(default=0)
+    n = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'series')
+        db_table = "money_forecast_state"
+
+    def __str__(self):
+        return f"{self.user_id} {self.series} (n={self.n})"
+
+class CategorySpendStat(models.Model):
+    # Rolling (EWMA) mean / variance of expense amounts per (user, category)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    n = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    var = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'category')
+        db_table = "money_category_spend_stat"
+
+    def __str__(self):
+        return f"{self.category_id}: mean={self.mean:.2f} (n={self.n})"
+
+class SpendingAnomaly(models.Model):
+    # Transaction flagged as unusual when it was recorded
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='anomaly')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    expected = models.FloatField()
+    ratio = models.FloatField()
+    zscore = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        db_table = "money_spending_anomaly"
+
+    def __str__(self):
+        return f"{self.transaction_id}: {self.ratio:.1f}x typical"
+
+class BudgetSpend(models.Model):
+    # Running expense total of one budget's category and month, updated on
+    # every expense write (see budget_alert_service.py)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    budget = models.OneToOneField(Budget, on_delete=models.CASCADE, related_name='spend')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    month = models.DateField(help_text='1st of the budget month')
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    level = models.PositiveSmallIntegerField(default=0, help_text='Highest threshold (%) currently crossed')
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'category', 'month'])]
+        db_table = "money_budget_spend"
+
+    def __str__(self):
+        return f"{self.budget_id}: {self.spent} ({self.level}%)"
+
+class BudgetAlert(models.Model):
+    # A budget threshold crossed by an expense write
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='alerts')
+    threshold = models.PositiveSmallIntegerField()
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [models.Index(fields=['user', 'id'])]
+        db_table = "money_budget_alert"
+
+    def __str__(self):
+        return f"{self.budget_id} crossed {self.threshold}%"
+
+class AssistantConversation(models.Model):
+    # Server-side chat with the finance assistant (see conversation_service.py)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    months = models.PositiveSmallIntegerField(default=6)
+    analytics_text = models.TextField(blank=True, help_text='Frozen analytics snapshot (stable prompt prefix)')
+    analytics_at = models.DateTimeField(null=True, blank=True)
+    summary = models.TextField(blank=True, help_text='Running summary of compacted turns')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        db_table = "money_assistant_conversation"
+
+    def __str__(self):
+        return f"{self.user_id} conversation {self.pk}"
+
+class AssistantTurn(models.Model):
+    ROLE_CHOICES = (
+        ('user', 'User'),
+        ('assistant', 'Assistant'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    conversation = models.ForeignKey(AssistantConversation, on_delete=models.CASCADE, related_name='turns')
+    role = models.CharField(max_length=9, choices=ROLE_CHOICES)
+    content = models.TextField()
+    tokens = models.PositiveIntegerField(default=0, help_text='Estimated tokens of content')
+    compacted = models.BooleanField(default=False, help_text='Folded into the conversation summary')
+    source = models.CharField(max_length=5, blank=True, help_text='ai / local (assistant turns)')
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cached_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['conversation', 'compacted'])]
+        db_table = "money_assistant_turn"
+
+    def __str__(self):
+        return f"{self.role}: {self.content[:40]}"
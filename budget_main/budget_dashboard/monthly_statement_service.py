@@ -0,0 +1,279 @@
+# budget_dashboard/monthly_statement_service.py
+
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from budget_core.category_tree import subtree_totals
+from budget_core.models import Account, ArchivedTransaction, Budget, Transaction, TransactionMonthSummary
+from budget_core.sharding import use_shard_for
+
+try:  # optional: PDF output (pip install weasyprint)
+    from weasyprint import HTML as PdfDocument
+except ImportError:
+    PdfDocument = None
+
+# Monthly statements for every user, written by `manage.py generate_statements`
+# to MEDIA_ROOT/statements/<YYYY-MM>/<user_id>.<format>. Users are handled in
+# chunks (all on one shard) and every aggregate of a chunk comes from a fixed
+# number of grouped queries, whatever the chunk size. A finished file is the
+# checkpoint, so an interrupted run resumes where it stopped.
+STATEMENT_DIR = "statements"
+TOP_TRANSACTIONS = getattr(settings, "MONTHLY_STATEMENT_TOP", 10)
+FORMATS = ("html", "pdf")
+
+ZERO = Decimal("0")
+
+
+def statement_month(value=None, today=None):
+    """
+    First day of the statement month: "YYYY-MM", or last month by default.
+    Raises ValueError on a malformed value.
+    """
+    if value:
+        return datetime.strptime(value, "%Y-%m").date()
+    today = today or date.today()
+    return (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def month_end(start):
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def statement_dir(month):
+    return Path(settings.MEDIA_ROOT) / STATEMENT_DIR / month.strftime("%Y-%m")
+
+
+def finished_users(month, formats):
+    """
+    Ids of users whose statement files all exist for `month` (one directory
+    scan; files are written atomically, so an existing file is complete).
+    """
+    folder = statement_dir(month)
+    if not folder.exists():
+        return set()
+    found = defaultdict(set)
+    for entry in os.scandir(folder):
+        stem, _, ext = entry.name.partition(".")
+        if stem.isdigit() and ext in formats:
+            found[int(stem)].add(ext)
+    return {user_id for user_id, exts in found.items() if exts >= set(formats)}
+
+
+# ─── Bulk reads (one chunk of users on one shard) ─────────────────────────────
+def _flows(ids, start, end):
+    """
+    {user_id: {(account_id, type): [before the month, inside the month]}}
+    over hot rows plus archived month summaries.
+    """
+    flows = defaultdict(lambda: defaultdict(lambda: [ZERO, ZERO]))
+    sources = (
+        (Transaction, "amount", 0, {"date__lt": start}),
+        (Transaction, "amount", 1, {"date__range": [start, end]}),
+        (TransactionMonthSummary, "total", 0, {"month__lt": start}),
+        (TransactionMonthSummary, "total", 1, {"month": start}),
+    )
+    for model, field, slot, filters in sources:
+        rows = (
+            model.objects.filter(user_id__in=ids, **filters)
+            .values("user_id", "account_id", "type")
+            .annotate(total=Sum(field))
+            .order_by()
+        )
+        for row in rows:
+            flows[row["user_id"]][(row["account_id"], row["type"])][slot] += row["total"] or ZERO
+    return flows
+
+
+def _category_totals(ids, start, end):
+    """
+    {user_id: {(category name, type): [total, count]}} for the month.
+    """
+    totals = defaultdict(lambda: defaultdict(lambda: [ZERO, 0]))
+    sources = (
+        (Transaction, {"date__range": [start, end]}, Sum("amount"), Count("id")),
+        (TransactionMonthSummary, {"month": start}, Sum("total"), Sum("count")),
+    )
+    for model, filters, total, count in sources:
+        rows = (
+            model.objects.filter(user_id__in=ids, **filters)
+            .values("user_id", "category_id", "category__name", "type")
+            .annotate(total=total, count=count)
+            .order_by()
+        )
+        for row in rows:
+            entry = totals[row["user_id"]][(row["category__name"], row["type"])]
+            entry[0] += row["total"] or ZERO
+            entry[1] += row["count"] or 0
+    return totals
+
+
+def _top_transactions(ids, start, end, limit=TOP_TRANSACTIONS):
+    """
+    {user_id: [largest expenses of the month]}: one ranked (window
+    function) query per table instead of one query per user.
+    """
+    top = defaultdict(list)
+    for model in (Transaction, ArchivedTransaction):
+        rows = (
+            model.objects.filter(user_id__in=ids, type="expense", date__range=[start, end])
+            .annotate(rank=Window(RowNumber(), partition_by=[F("user_id")], order_by=[F("amount").desc(), F("id")]))
+            .filter(rank__lte=limit)
+            .values("user_id", "date", "amount", "note", "category__name", "account__name")
+        )
+        for row in rows:
+            top[row["user_id"]].append(row)
+    for rows in top.values():
+        rows.sort(key=lambda r: (-r["amount"], r["date"]))
+        del rows[limit:]
+    return top
+
+
+def chunk_statements(users, start):
+    """
+    Statement context per user for the month starting at `start`.
+    `users`: [(user_id, username)], all on the current shard.
+    Returns {user_id: context}.
+    """
+    end = month_end(start)
+    ids = [user_id for user_id, _ in users]
+
+    accounts = defaultdict(list)
+    for a in Account.objects.filter(user_id__in=ids).values("id", "user_id", "name", "balance").order_by("name"):
+        accounts[a["user_id"]].append(a)
+    budgets = defaultdict(list)
+    for b in (
+        Budget.objects.filter(user_id__in=ids, month=start)
+        .values("user_id", "category_id", "category__name", "amount")
+        .order_by("category__name")
+    ):
+        budgets[b["user_id"]].append(b)
+    flows = _flows(ids, start, end)
+    categories = _category_totals(ids, start, end)
+    top = _top_transactions(ids, start, end)
+    # A budget covers its category's subcategories
+    budget_spent = subtree_totals(
+        start, end, "expense", ancestor_ids={b["category_id"] for rows in budgets.values() for b in rows},
+    )
+
+    generated_at = timezone.now()
+    return {
+        user_id: _context(
+            username, start, end, accounts[user_id], flows[user_id],
+            categories[user_id], budgets[user_id], budget_spent, top[user_id], generated_at,
+        )
+        for user_id, username in users
+    }
+
+
+def _context(username, start, end, accounts, flows, categories, budgets, budget_spent, top, generated_at):
+    # Same balance rule as live_balances(): income in, every other type out.
+    # per_account: [in before, in during, out before, out during]
+    per_account = defaultdict(lambda: [ZERO, ZERO, ZERO, ZERO])
+    for (account_id, tx_type), (before, during) in flows.items():
+        offset = 0 if tx_type == "income" else 2
+        per_account[account_id][offset] += before
+        per_account[account_id][offset + 1] += during
+
+    account_rows = []
+    for a in accounts:
+        in_before, money_in, out_before, money_out = per_account[a["id"]]
+        opening = (a["balance"] or ZERO) + in_before - out_before
+        account_rows.append({
+            "name": a["name"],
+            "opening": opening,
+            "money_in": money_in,
+            "money_out": money_out,
+            "closing": opening + money_in - money_out,
+        })
+
+    expense_total = sum((t for (_, tx_type), (t, _) in categories.items() if tx_type == "expense"), ZERO)
+    category_rows = sorted(
+        (
+            {
+                "name": name,
+                "type": tx_type,
+                "total": total,
+                "count": count,
+                "share": float(total * 100 / expense_total) if tx_type == "expense" and expense_total else None,
+            }
+            for (name, tx_type), (total, count) in categories.items()
+        ),
+        key=lambda r: (r["type"] != "expense", -r["total"]),
+    )
+
+    budget_rows = []
+    for b in budgets:
+        used = budget_spent.get(b["category_id"], ZERO)
+        budget_rows.append({
+            "name": b["category__name"],
+            "amount": b["amount"],
+            "spent": used,
+            "remaining": b["amount"] - used,
+            "percent": float(used * 100 / b["amount"]) if b["amount"] else None,
+            "over": used > b["amount"],
+        })
+
+    return {
+        "username": username,
+        "month": start,
+        "start": start,
+        "end": end,
+        "accounts": account_rows,
+        "totals": {
+            "opening": sum((r["opening"] for r in account_rows), ZERO),
+            "money_in": sum((r["money_in"] for r in account_rows), ZERO),
+            "money_out": sum((r["money_out"] for r in account_rows), ZERO),
+            "closing": sum((r["closing"] for r in account_rows), ZERO),
+        },
+        "categories": category_rows,
+        "budgets": budget_rows,
+        "top_transactions": top,
+        "generated_at": generated_at,
+    }
+
+
+# ─── Output ───────────────────────────────────────────────────────────────────
+def _write_atomic(path, data):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_statement(folder, user_id, context, formats):
+    html = render_to_string("budget_dashboard/statements/monthly_statement.html", context)
+    # PDF first: the HTML file completes the checkpoint of an html+pdf run
+    for fmt in sorted(formats, key=lambda f: f == "html"):
+        if fmt == "pdf":
+            data = PdfDocument(string=html).write_pdf()
+        else:
+            data = html.encode("utf-8")
+        _write_atomic(folder / f"{user_id}.{fmt}", data)
+
+
+def generate_chunk(users, month, formats):
+    """
+    Build and write the statements of one chunk (users on the same shard).
+    Runs in pool workers. Returns (written, [(user_id, error)]).
+    """
+    folder = statement_dir(month)
+    folder.mkdir(parents=True, exist_ok=True)
+    with use_shard_for(users[0][0]):
+        contexts = chunk_statements(users, month)
+
+    written, failed = 0, []
+    for user_id, context in contexts.items():
+        try:
+            write_statement(folder, user_id, context, formats)
+            written += 1
+        except Exception as exc:  # one bad statement must not sink the chunk
+            failed.append((user_id, f"{type(exc).__name__}: {exc}"))
+    return written, failed
@@ -0,0 +1,167 @@
+# budget_dashboard/projection_service.py
+
+import multiprocessing
+from calendar import monthrange
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+
+from budget_core.archive import in_out_totals
+from budget_core.models import Account
+from budget_dashboard.snapshot_service import EXPENSE, INCOME, load_snapshot, to_day
+
+# Monte Carlo balance projection: every simulated path draws each future day
+# from a random day of the user's recent history (income and expense of the
+# same day together, so paydays and big bills keep their shape), summed per
+# month. All paths advance together as NumPy arrays; with PROJECTION_WORKERS
+# > 1 the paths are split across a process pool.
+HISTORY_DAYS = getattr(settings, "PROJECTION_HISTORY_DAYS", 365)
+MIN_HISTORY_DAYS = 30
+WORKERS = getattr(settings, "PROJECTION_WORKERS", 1)
+
+MAX_YEARS = 5
+DEFAULT_PATHS = 10000
+MAX_PATHS = 50000
+MIN_PATHS = 100
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Below this many simulated days (paths x days) a pool costs more than it saves
+POOL_MIN_WORK = 5_000_000
+
+_pool = None
+
+
+def _add_months(d, months):
+    index = d.year * 12 + d.month - 1 + months
+    year, month = divmod(index, 12)
+    return date(year, month + 1, min(d.day, monthrange(year, month + 1)[1]))
+
+
+def daily_history(user, today, days=HISTORY_DAYS):
+    """
+    (income, expense) per day in RM over the `days` before today, starting
+    at the first day with a transaction (empty days count as 0).
+    """
+    window = load_snapshot(user).window(today - timedelta(days=days), today - timedelta(days=1))
+    if not len(window):
+        return np.zeros(0), np.zeros(0)
+    first = int(window.day[0])
+    span = to_day(today) - first
+    offset = window.day - first
+    totals = []
+    for type_code in (INCOME, EXPENSE):
+        sel = window.type == type_code
+        totals.append(np.bincount(offset[sel], weights=window.cents[sel], minlength=span)[:span] / 100.0)
+    return totals[0], totals[1]
+
+
+def simulate(net, start_balance, month_days, paths, seed):
+    """
+    Balance at the end of each month for `paths` paths: one
+    (paths x days) bootstrap draw from `net` per month. Returns an array
+    (months, paths). Pure NumPy, so it runs in pool workers too.
+    """
+    rng = np.random.default_rng(seed)
+    balance = np.full(paths, float(start_balance))
+    out = np.empty((len(month_days), paths))
+    for m, days in enumerate(month_days):
+        draws = rng.integers(0, len(net), size=(paths, days), dtype=np.int32)
+        balance += net[draws].sum(axis=1)
+        out[m] = balance
+    return out
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        # fork: workers inherit the loaded modules and only run simulate()
+        _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("fork"))
+    return _pool
+
+
+def run_paths(net, start_balance, month_days, paths, seed=None, workers=None):
+    """
+    simulate() over `paths`, split into one chunk per worker (independent
+    random streams from one SeedSequence) when a pool is worth it.
+    """
+    workers = WORKERS if workers is None else workers
+    seeds = np.random.SeedSequence(seed)
+    work = paths * sum(month_days)
+    if (
+        workers <= 1
+        or work < POOL_MIN_WORK
+        or "fork" not in multiprocessing.get_all_start_methods()
+    ):
+        return simulate(net, start_balance, month_days, paths, seeds)
+
+    sizes = [paths // workers + (i < paths % workers) for i in range(workers)]
+    jobs = [
+        _executor().submit(simulate, net, start_balance, month_days, size, child)
+        for size, child in zip(sizes, seeds.spawn(workers))
+    ]
+    return np.concatenate([job.result() for job in jobs], axis=1)
+
+
+def current_balance(user):
+    opening = Account.objects.filter(user=user).aggregate(total=Sum("balance"))["total"] or Decimal("0")
+    in_total, out_total = in_out_totals(user)
+    return opening + in_total - out_total
+
+
+def project(user, years=1, paths=DEFAULT_PATHS, goal=None, today=None, seed=None):
+    """
+    Project the user's total balance `years` (1-5) ahead over `paths`
+    bootstrapped futures.
+
+    Returns None without MIN_HISTORY_DAYS of history, else a dict:
+      start_balance, history_days, mean_daily_income, mean_daily_expense,
+      labels (month ends), bands ({"p5": [...], ..., "p95": [...]} per month),
+      final (the same percentiles at the horizon) and, with a `goal`:
+      goal {amount, probability (reached at any month end), by_year, median_months}
+    Raises ValueError on out-of-range arguments.
+    """
+    if not 1 <= years <= MAX_YEARS:
+        raise ValueError(f"Years must be between 1 and {MAX_YEARS}.")
+    if not MIN_PATHS <= paths <= MAX_PATHS:
+        raise ValueError(f"Paths must be between {MIN_PATHS} and {MAX_PATHS}.")
+
+    today = today or date.today()
+    income, expense = daily_history(user, today)
+    if len(income) < MIN_HISTORY_DAYS:
+        return None
+
+    ends = [_add_months(today, m) for m in range(1, years * 12 + 1)]
+    month_days = [(end - start).days for start, end in zip([today] + ends, ends)]
+    start_balance = float(current_balance(user))
+
+    balances = run_paths(income - expense, start_balance, month_days, paths, seed)
+    bands = np.percentile(balances, PERCENTILES, axis=1)
+
+    result = {
+        "years": years,
+        "paths": paths,
+        "start_balance": round(start_balance, 2),
+        "history_days": len(income),
+        "mean_daily_income": round(float(income.mean()), 2),
+        "mean_daily_expense": round(float(expense.mean()), 2),
+        "labels": [end.isoformat() for end in ends],
+        "bands": {f"p{p}": np.round(band, 2).tolist() for p, band in zip(PERCENTILES, bands)},
+        "final": {f"p{p}": round(float(band[-1]), 2) for p, band in zip(PERCENTILES, bands)},
+        "goal": None,
+    }
+
+    if goal is not None:
+        reached = balances >= float(goal)            # (months, paths)
+        ever = reached.any(axis=0)
+        first = np.argmax(reached, axis=0)           # first month reached (where ever)
+        result["goal"] = {
+            "amount": float(goal),
+            "probability": round(float(ever.mean()), 4),
+            "by_year": [round(float(reached[: 12 * y].any(axis=0).mean()), 4) for y in range(1, years + 1)],
+            "median_months": int(np.median(first[ever])) + 1 if ever.any() else None,
+        }
+    return result
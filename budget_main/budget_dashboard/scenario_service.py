@@ -0,0 +1,230 @@
+# budget_dashboard/scenario_service.py
+
+import re
+from datetime import date, timedelta
+
+import numpy as np
+
+from budget_dashboard.forecast_service import features
+from budget_dashboard.projection_service import current_balance
+from budget_dashboard.snapshot_service import EXPENSE, INCOME, from_day, load_snapshot, to_day
+
+# What-if scenarios: every expense category gets its own daily forecast
+# (trend + day-of-week, the online model's features) and all of them, plus
+# total income, are fitted in ONE least-squares solve: Y is (days x
+# categories + 1), so the design matrix is factorised once however many
+# categories the user has. A scenario only rescales forecast columns, so it
+# is answered from the fitted forecasts without refitting.
+HORIZONS = (30, 90)
+MIN_HISTORY_DAYS = 14
+MIN_PERCENT = -100   # stop spending entirely
+MAX_PERCENT = 200    # triple it
+
+
+# ─── Batched fit ──────────────────────────────────────────────────────────────
+def fit_columns(days, Y, future_days):
+    """
+    Least-squares fit of every column of Y (history days x series) on the
+    shared day features, one solve for all columns. Returns the forecasts
+    for `future_days` (future days x series), clipped at 0.
+    """
+    X = np.array([features(from_day(d)) for d in days])
+    X_future = np.array([features(from_day(d)) for d in future_days])
+    beta = np.linalg.lstsq(X, Y, rcond=None)[0]          # (N_FEATURES, series)
+    return np.maximum(X_future @ beta, 0.0)
+
+
+def category_forecasts(user, months=6, today=None):
+    """
+    Per-category expense forecasts for the next max(HORIZONS) days, fitted
+    on the last `months` months (from the first transaction in the window,
+    days without spending count as 0).
+
+    Returns None without MIN_HISTORY_DAYS of history, else a dict:
+      start_balance, history_days, income {30, 90},
+      categories [{id, name, monthly (average spend), 30, 90}] (largest first)
+    """
+    today = today or date.today()
+    window = load_snapshot(user).window(today - timedelta(days=30 * int(months)), today - timedelta(days=1))
+    if not len(window):
+        return None
+    first = int(window.day[0])
+    span = to_day(today) - first
+    if span < MIN_HISTORY_DAYS:
+        return None
+
+    spend = window.type == EXPENSE
+    cat_ids, column = np.unique(window.category[spend], return_inverse=True)
+    n_cols = len(cat_ids) + 1                                # last column: income
+
+    # (day, column) -> cents in one bincount over the flattened matrix
+    cols = np.full(len(window), -1, dtype=np.int64)
+    cols[spend] = column
+    cols[window.type == INCOME] = n_cols - 1
+    sel = cols >= 0
+    flat = (window.day[sel] - first) * n_cols + cols[sel]
+    Y = np.bincount(flat, weights=window.cents[sel], minlength=span * n_cols).reshape(span, n_cols) / 100.0
+
+    horizon = max(HORIZONS)
+    days = np.arange(first, first + span)
+    future = fit_columns(days, Y, np.arange(first + span, first + span + horizon))
+    totals = {h: future[:h].sum(axis=0) for h in HORIZONS}
+
+    categories = [
+        {
+            "id": int(cat_id),
+            "name": window.category_names.get(int(cat_id)) or "Uncategorised",
+            "monthly": round(float(Y[:, i].sum()) * 30 / span, 2),
+            **{str(h): round(float(totals[h][i]), 2) for h in HORIZONS},
+        }
+        for i, cat_id in enumerate(cat_ids)
+    ]
+    categories.sort(key=lambda c: -c["30"])
+
+    return {
+        "start_balance": round(float(current_balance(user)), 2),
+        "history_days": span,
+        "income": {str(h): round(float(totals[h][-1]), 2) for h in HORIZONS},
+        "categories": categories,
+    }
+
+
+# ─── Scenarios ────────────────────────────────────────────────────────────────
+def apply_scenario(base, changes):
+    """
+    Rescale the forecasts of `base` (category_forecasts()) by `changes`
+    ({category_id: percent}, e.g. -20 for a 20% cut). Pure arithmetic, no
+    queries, so it is cheap enough to run per keystroke or per tool call.
+
+    Returns {baseline, scenario} ({expense, balance} per horizon), saved
+    (per horizon) and categories (the changed ones, with both forecasts).
+    Raises ValueError on unknown categories or out-of-range percents.
+    """
+    known = {c["id"]: c for c in base["categories"]}
+    for cat_id, percent in changes.items():
+        if cat_id not in known:
+            raise ValueError(f"No forecast for category {cat_id}.")
+        if not MIN_PERCENT <= percent <= MAX_PERCENT:
+            raise ValueError(f"Changes must be between {MIN_PERCENT}% and +{MAX_PERCENT}%.")
+
+    result = {"baseline": {}, "scenario": {}, "saved": {}, "categories": []}
+    for h in map(str, HORIZONS):
+        baseline = sum(c[h] for c in base["categories"])
+        scenario = sum(c[h] * (1 + changes.get(c["id"], 0) / 100) for c in base["categories"])
+        for key, expense in (("baseline", baseline), ("scenario", scenario)):
+            result[key][h] = {
+                "expense": round(expense, 2),
+                "balance": round(base["start_balance"] + base["income"][h] - expense, 2),
+            }
+        result["saved"][h] = round(baseline - scenario, 2)
+
+    for cat_id, percent in changes.items():
+        c = known[cat_id]
+        result["categories"].append({
+            "id": cat_id,
+            "name": c["name"],
+            "percent": percent,
+            **{h: {"baseline": c[h], "scenario": round(c[h] * (1 + percent / 100), 2)} for h in map(str, HORIZONS)},
+        })
+    return result
+
+
+def resolve_changes(base, named):
+    """
+    [(category name, percent)] -> ({category_id: percent}, [unknown names]).
+    Names match case-insensitively, exactly first, then as a prefix.
+    """
+    by_name = {c["name"].lower(): c["id"] for c in base["categories"]}
+    changes, unknown = {}, []
+    for name, percent in named:
+        key = (name or "").strip().lower()
+        cat_id = by_name.get(key)
+        if cat_id is None and key:
+            prefixed = [i for n, i in by_name.items() if n.startswith(key) or key.startswith(n)]
+            cat_id = prefixed[0] if len(prefixed) == 1 else None
+        if cat_id is None:
+            unknown.append(name)
+        else:
+            changes[cat_id] = percent
+    return changes, unknown
+
+
+# "cut dining by 20%", "increase groceries 10%", "spend 15% less on transport"
+_DOWN = ("cut", "reduce", "lower", "less", "decrease", "drop", "save", "trim")
+_UP = ("increase", "raise", "more", "add", "grow")
+_PERCENT = re.compile(r"([+-]?\d+(?:\.\d+)?)\s*%")
+
+
+def parse_what_if(message, base):
+    """
+    Pull [(category name, percent)] out of a question, one per clause that
+    names a forecast category and a percentage. Used by the local answer
+    when the LLM (which calls the scenario tool itself) is unavailable.
+    """
+    named = []
+    for clause in re.split(r",|;|\band\b|\bthen\b", message.lower()):
+        found = _PERCENT.search(clause)
+        if not found:
+            continue
+        names = [c["name"] for c in base["categories"] if re.search(rf"\b{re.escape(c['name'].lower())}\b", clause)]
+        if not names:
+            continue
+        percent = float(found.group(1))
+        words = set(re.findall(r"[a-z]+", clause))
+        if not found.group(1).startswith(("+", "-")) and words & set(_DOWN) and not words & set(_UP):
+            percent = -percent
+        named.append((max(names, key=len), percent))
+    return named
+
+
+# ─── Assistant tool ───────────────────────────────────────────────────────────
+def scenario_tool(base):
+    """
+    OpenAI function-calling spec for apply_scenario, limited to the
+    user's forecast categories.
+    """
+    return {
+        "type": "function",
+        "function": {
+            "name": "what_if",
+            "description": (
+                "Project the user's balance in 30 and 90 days if spending in some "
+                "categories changes by a percentage (negative = cut)."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "changes": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "category": {"type": "string", "enum": [c["name"] for c in base["categories"]]},
+                                "percent": {"type": "number", "minimum": MIN_PERCENT, "maximum": MAX_PERCENT},
+                            },
+                            "required": ["category", "percent"],
+                        },
+                    },
+                },
+                "required": ["changes"],
+            },
+        },
+    }
+
+
+def run_tool(base, arguments):
+    """
+    Execute a what_if tool call (`arguments`: the decoded JSON). Errors are
+    returned to the model as {"error": ...} rather than raised.
+    """
+    try:
+        named = [(c.get("category"), float(c.get("percent"))) for c in arguments.get("changes") or []]
+    except (AttributeError, TypeError, ValueError):
+        return {"error": "changes must be a list of {category, percent}."}
+    changes, unknown = resolve_changes(base, named)
+    if unknown:
+        return {"error": f"Unknown categories: {', '.join(map(str, unknown))}."}
+    try:
+        return apply_scenario(base, changes)
+    except ValueError as e:
+        return {"error": str(e)}
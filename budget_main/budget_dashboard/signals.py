@@ -0,0 +1,162 @@
+# budget_dashboard/signals.py
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from budget_core.models import Account, Budget, Category, Transaction
+from budget_core.signals import (
+    categories_moved,
+    transactions_created,
+    transactions_deleted,
+    transactions_updated,
+)
+from budget_dashboard.anomaly_service import observe_many
+from budget_dashboard.budget_alert_service import apply_spend, reset_budget
+from budget_dashboard.forecast_service import apply_change, apply_changes
+from budget_dashboard.live_service import schedule_push
+
+
+# ── Online forecaster (O(1) per write) ───────────────────────────────────────
+@receiver(post_save, sender=Transaction)
+def update_forecast_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, "_old_row", None)  # budget_core.signals.remember_old_row
+    if old is not None:
+        apply_change(instance.user_id, old["type"], old["date"], -old["amount"], -1)
+    apply_change(instance.user_id, instance.type, instance.date, instance.amount, 1)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_forecast_on_delete(sender, instance, **kwargs):
+    apply_change(instance.user_id, instance.type, instance.date, -instance.amount, -1)
+
+
+@receiver(transactions_created)
+def update_forecast_on_bulk_create(sender, user_id, transactions, **kwargs):
+    # One locked state per series for the whole batch
+    apply_changes(user_id, [(t.type, t.date, t.amount, 1) for t in transactions])
+
+
+@receiver(transactions_deleted)
+def update_forecast_on_bulk_delete(sender, user_id, rows, **kwargs):
+    # Category / account moves leave the daily totals as they are
+    apply_changes(user_id, [(r["type"], r["date"], -r["amount"], -1) for r in rows])
+
+
+# ── Budget counters / threshold alerts (O(1) per write) ─────────────────────
+def _expense(tx_type, category_id, d, amount):
+    return [(category_id, d, amount)] if tx_type == "expense" else []
+
+
+@receiver(post_save, sender=Transaction)
+def update_budget_spend_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    changes = _expense(instance.type, instance.category_id, instance.date, instance.amount)
+    old = getattr(instance, "_old_row", None)
+    if old is not None:
+        changes += _expense(old["type"], old["category_id"], old["date"], -old["amount"])
+    apply_spend(instance.user_id, changes)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_budget_spend_on_delete(sender, instance, **kwargs):
+    apply_spend(instance.user_id, _expense(instance.type, instance.category_id, instance.date, -instance.amount))
+
+
+@receiver(transactions_created)
+def update_budget_spend_on_bulk_create(sender, user_id, transactions, **kwargs):
+    apply_spend(user_id, [(t.category_id, t.date, t.amount) for t in transactions if t.type == "expense"])
+
+
+@receiver(transactions_updated)
+def update_budget_spend_on_bulk_update(sender, user_id, rows, changes, **kwargs):
+    if "category_id" not in changes:
+        return  # account moves do not touch budgets
+    moved = [r for r in rows if r["type"] == "expense"]
+    apply_spend(user_id, [(r["category_id"], r["date"], -r["amount"]) for r in moved]
+                + [(changes["category_id"], r["date"], r["amount"]) for r in moved])
+
+
+@receiver(transactions_deleted)
+def update_budget_spend_on_bulk_delete(sender, user_id, rows, **kwargs):
+    apply_spend(user_id, [(r["category_id"], r["date"], -r["amount"]) for r in rows if r["type"] == "expense"])
+
+
+@receiver(post_save, sender=Budget)
+def budget_saved(sender, instance, raw=False, **kwargs):
+    # New / edited budget: one aggregate to (re)build its counter
+    if not raw:
+        reset_budget(instance)
+
+
+@receiver(categories_moved)
+def rebuild_spend_on_category_move(sender, user_id, category_ids, **kwargs):
+    # Budgets on the old and new ancestors gained / lost a subtree
+    for budget in Budget.objects.filter(user_id=user_id, category_id__in=category_ids):
+        reset_budget(budget)
+
+
+# ── Spending anomalies (imports; single rows are scored by the views) ───────
+@receiver(transactions_created)
+def score_bulk_created(sender, user_id, transactions, **kwargs):
+    # Stats of the batch's categories loaded once, flags written in bulk
+    observe_many(transactions)
+
+
+# ── Live dashboard deltas (pushed after commit, only with open pages) ───────
+def _footprint(rows):
+    return [(r["date"], r["account_id"], r["category_id"]) for r in rows]
+
+
+@receiver(post_save, sender=Transaction)
+def push_dashboard_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rows = [(instance.date, instance.account_id, instance.category_id)]
+    old = getattr(instance, "_old_row", None)
+    if old is not None:
+        rows += _footprint([old])
+    schedule_push(instance.user_id, rows)
+
+
+@receiver(post_delete, sender=Transaction)
+def push_dashboard_on_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, get_user_model()):
+        return  # the user is going away with it
+    schedule_push(instance.user_id, [(instance.date, instance.account_id, instance.category_id)])
+
+
+@receiver(transactions_created)
+def push_dashboard_on_bulk_create(sender, user_id, transactions, **kwargs):
+    schedule_push(user_id, [(t.date, t.account_id, t.category_id) for t in transactions])
+
+
+@receiver(transactions_updated)
+def push_dashboard_on_bulk_update(sender, user_id, rows, changes, **kwargs):
+    moved = [
+        (r["date"], changes.get("account_id", r["account_id"]), changes.get("category_id", r["category_id"]))
+        for r in rows
+    ]
+    schedule_push(user_id, _footprint(rows) + moved)
+
+
+@receiver(transactions_deleted)
+def push_dashboard_on_bulk_delete(sender, user_id, rows, **kwargs):
+    schedule_push(user_id, _footprint(rows))
+
+
+@receiver(post_save, sender=Account)
+def push_dashboard_on_account_save(sender, instance, raw=False, **kwargs):
+    # Opening balance edits move the live balance
+    if not raw:
+        schedule_push(instance.user_id, accounts=[instance.pk])
+
+
+@receiver(post_delete, sender=Account)
+def push_dashboard_on_account_delete(sender, instance, origin=None, **kwargs):
+    # Sent as a null balance, so the page drops the card
+    if not isinstance(origin, get_user_model()):
+        schedule_push(instance.user_id, accounts=[instance.pk])
@@ -0,0 +1,355 @@
+# budget_dashboard/snapshot_service.py
+
+import json
+import os
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+
+from budget_core.models import (
+    Account,
+    ArchivedTransaction,
+    Category,
+    ChangeCursor,
+    ChangeLogEntry,
+    Tag,
+    Transaction,
+    TransactionTag,
+)
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Transaction.type -> int32 code (anything else is stored as -1)
+TYPE_CODES = {
+    "income": 0,
+    "expense": 1,
+    "in-transfer": 2,
+    "out-transfer": 3,
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+INCOME = TYPE_CODES["income"]
+EXPENSE = TYPE_CODES["expense"]
+
+SNAPSHOT_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("day", "<i8"),        # days since 1970-01-01
+    ("cents", "<i8"),      # amount * 100
+    ("account", "<i4"),    # account_id
+    ("category", "<i4"),   # category_id
+    ("type", "<i4"),       # TYPE_CODES
+])
+
+# One row per (transaction, tag) link, sorted by id
+LINK_DTYPE = np.dtype([
+    ("id", "<i8"),         # transaction id
+    ("tag", "<i4"),        # tag_id
+])
+
+# Files of a replaced snapshot are removed once they are this old (a reader
+# that still opens one after that re-reads the metadata and retries)
+STALE_FILE_SECONDS = 60
+
+
+def to_day(d):
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def from_day(day):
+    return date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def _snapshot_dir():
+    path = Path(getattr(settings, "ANALYTICS_SNAPSHOT_DIR", Path(settings.BASE_DIR) / "var" / "snapshots"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class TransactionSnapshot:
+    """
+    Columnar, day-sorted view of one user's transactions (hot and archived),
+    with the tag links, the category tree, the tag names and the accounts'
+    opening balance as of the same change-log position.
+
+    Columns are zero-copy views into one structured array (memory-mapped
+    from disk), and `window()` slices by day with searchsorted, so window
+    columns are views too.
+    """
+
+    def __init__(self, data, links=None, categories=None, tag_names=None, opening_cents=0):
+        self.data = data
+        self.links = links if links is not None else np.empty(0, dtype=LINK_DTYPE)
+        self.categories = categories or {}  # id -> (name, parent id)
+        self.category_names = {pk: name for pk, (name, _) in self.categories.items()}
+        self.tag_names = tag_names or {}
+        self.opening_cents = opening_cents
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def id(self):
+        return self.data["id"]
+
+    @property
+    def day(self):
+        return self.data["day"]
+
+    @property
+    def cents(self):
+        return self.data["cents"]
+
+    @property
+    def account(self):
+        return self.data["account"]
+
+    @property
+    def category(self):
+        return self.data["category"]
+
+    @property
+    def type(self):
+        return self.data["type"]
+
+    def window(self, start, end):
+        """
+        Rows with start <= date <= end (dates or day numbers).
+        """
+        if isinstance(start, date):
+            start = to_day(start)
+        if isinstance(end, date):
+            end = to_day(end)
+        days = self.data["day"]
+        lo = int(np.searchsorted(days, start, side="left"))
+        hi = int(np.searchsorted(days, end, side="right"))
+        return TransactionSnapshot(
+            self.data[lo:hi], self.links, self.categories, self.tag_names, self.opening_cents,
+        )
+
+    def tag_cents(self, mask=None):
+        """
+        {tag_id: cents} over the rows (those where `mask` is true), each
+        transaction counted under every tag it carries.
+        """
+        rows = self.data if mask is None else self.data[mask]
+        if not len(rows) or not len(self.links):
+            return {}
+        order = np.argsort(rows["id"], kind="stable")
+        ids = rows["id"][order]
+        pos = np.minimum(np.searchsorted(ids, self.links["id"]), len(ids) - 1)
+        hit = ids[pos] == self.links["id"]
+        tags, inverse = np.unique(self.links["tag"][hit], return_inverse=True)
+        cents = np.bincount(inverse, weights=rows["cents"][order][pos[hit]], minlength=len(tags))
+        return {int(t): int(c) for t, c in zip(tags, cents)}
+
+
+# ─── Building / refreshing ────────────────────────────────────────────────────
+ROW_FIELDS = ("id", "date", "amount", "account_id", "category_id", "type")
+
+
+def _rows_to_array(rows):
+    arr = np.empty(len(rows), dtype=SNAPSHOT_DTYPE)
+    if not rows:
+        return arr
+    ids, dates, amounts, accounts, categories, types = zip(*rows)
+    arr["id"] = ids
+    arr["day"] = [to_day(d) for d in dates]
+    arr["cents"] = [int(a * 100) for a in amounts]
+    arr["account"] = accounts
+    arr["category"] = categories
+    arr["type"] = [TYPE_CODES.get(t, -1) for t in types]
+    return arr
+
+
+def _links_to_array(pairs):
+    arr = np.empty(len(pairs), dtype=LINK_DTYPE)
+    if pairs:
+        arr["id"], arr["tag"] = zip(*pairs)
+    return arr[np.argsort(arr["id"], kind="stable")]
+
+
+def _sorted(arr):
+    return arr[np.lexsort((arr["id"], arr["day"]))]
+
+
+def _categories(user):
+    return {
+        pk: (name, parent_id)
+        for pk, name, parent_id in Category.objects.filter(user=user).values_list("pk", "name", "parent_id")
+    }
+
+
+def _opening_cents(user):
+    total = Account.objects.filter(user=user).aggregate(total=Sum("balance"))["total"]
+    return int((total or 0) * 100)
+
+
+def _build(user):
+    """
+    Everything from scratch (first load): hot and archived rows, tag links,
+    categories, tag names and opening balance.
+    """
+    # Log position first: anything committed after it is applied by the next load
+    seq = ChangeCursor.objects.filter(user=user).values_list("seq", flat=True).first() or 0
+    rows = []
+    for model in (ArchivedTransaction, Transaction):
+        rows += model.objects.filter(user=user).order_by().values_list(*ROW_FIELDS)
+    links = list(TransactionTag.objects.filter(user=user).values_list("transaction_id", "tag_id"))
+    return {
+        "seq": seq,
+        "rows": _sorted(_rows_to_array(rows)),
+        "links": _links_to_array(links),
+        "categories": _categories(user),
+        "tag_names": dict(Tag.objects.filter(user=user).values_list("pk", "name")),
+        "opening_cents": _opening_cents(user),
+    }
+
+
+def _apply(user, snapshot, seq, entries):
+    """
+    Bring `snapshot` (at log position `seq`) up to date with the change-log
+    `entries` after it: upserted transactions are re-read with their tags
+    in one query, deleted ones dropped; categories and the opening balance
+    are re-read only when one of them changed.
+    """
+    new_seq = max(e[0] for e in entries)
+    changed = {model for _, model, _, _ in entries}
+    state = {
+        "seq": new_seq,
+        "rows": snapshot.data,
+        "links": snapshot.links,
+        "categories": snapshot.categories,
+        "tag_names": dict(snapshot.tag_names),
+        "opening_cents": snapshot.opening_cents,
+    }
+
+    if "transaction" in changed:
+        deleted = [pk for _, model, pk, op in entries if model == "transaction" and op == "delete"]
+        upserted = ChangeLogEntry.objects.filter(
+            user=user, model="transaction", op="upsert", seq__gt=seq, seq__lte=new_seq,
+        ).values("object_id")
+        fetched = {}
+        pairs = []
+        for *row, tag_id, tag_name in (
+            Transaction.objects.filter(user=user, pk__in=upserted)
+            .order_by()
+            .values_list(*ROW_FIELDS, "tag_links__tag_id", "tag_links__tag__name")
+        ):
+            fetched[row[0]] = row
+            if tag_id is not None:
+                pairs.append((row[0], tag_id))
+                state["tag_names"][tag_id] = tag_name
+        # Upserted ids missing from the hot table were archived since: those
+        # already in the snapshot are unchanged, the others are read there
+        missing = {pk for _, model, pk, op in entries if model == "transaction" and op == "upsert"}
+        missing -= set(fetched) | set(snapshot.data["id"][np.isin(snapshot.data["id"], list(missing))].tolist())
+        if missing:
+            for row in ArchivedTransaction.objects.filter(user=user, pk__in=missing).values_list(*ROW_FIELDS):
+                fetched[row[0]] = row
+            pairs += TransactionTag.objects.filter(transaction_id__in=missing).values_list("transaction_id", "tag_id")
+        replaced = np.array(list(fetched) + deleted, dtype=np.int64)
+        state["rows"] = _sorted(np.concatenate([
+            snapshot.data[~np.isin(snapshot.data["id"], replaced)],
+            _rows_to_array(list(fetched.values())),
+        ]))
+        state["links"] = _links_to_array(
+            [(int(i), int(t)) for i, t in snapshot.links[~np.isin(snapshot.links["id"], replaced)]] + pairs
+        )
+
+    if "category" in changed:
+        state["categories"] = _categories(user)
+    if "account" in changed:
+        state["opening_cents"] = _opening_cents(user)
+    return state
+
+
+def _save(folder, user_id, state):
+    """
+    Write the arrays under new unique names, then publish them by replacing
+    the metadata file (atomic), so concurrent refreshes never mix files.
+    """
+    files = {}
+    for key in ("rows", "links"):
+        with tempfile.NamedTemporaryFile(dir=folder, prefix=f"{user_id}.", suffix=f".{key}.npy", delete=False) as f:
+            np.save(f, state[key])
+        files[key] = os.path.basename(f.name)
+    meta = {
+        "seq": state["seq"],
+        "files": files,
+        "categories": {str(pk): list(value) for pk, value in state["categories"].items()},
+        "tag_names": {str(pk): name for pk, name in state["tag_names"].items()},
+        "opening_cents": state["opening_cents"],
+    }
+    with tempfile.NamedTemporaryFile("w", dir=folder, prefix=f"{user_id}.", suffix=".json.tmp", delete=False) as f:
+        json.dump(meta, f)
+    os.replace(f.name, folder / f"{user_id}.json")
+    _remove_stale(folder, user_id, meta)
+    return meta
+
+
+def _remove_stale(folder, user_id, meta):
+    keep = {f"{user_id}.json", *meta["files"].values()}
+    cutoff = time.time() - STALE_FILE_SECONDS
+    for path in folder.glob(f"{user_id}.*"):
+        try:
+            if path.name not in keep and path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass  # removed by a concurrent refresh
+
+
+def _read_meta(folder, user_id):
+    try:
+        meta = json.loads((folder / f"{user_id}.json").read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if "files" in meta else None  # older format: rebuild
+
+
+def _open(folder, meta):
+    return TransactionSnapshot(
+        np.load(folder / meta["files"]["rows"], mmap_mode="r"),
+        np.load(folder / meta["files"]["links"], mmap_mode="r"),
+        {int(pk): (name, parent) for pk, (name, parent) in meta["categories"].items()},
+        {int(pk): name for pk, name in meta["tag_names"].items()},
+        meta["opening_cents"],
+    )
+
+
+def load_snapshot(user):
+    """
+    Return the user's TransactionSnapshot, brought up to date with the
+    user's change log first:
+      - no snapshot yet -> full build
+      - otherwise the log entries after the snapshot's position (one query;
+        nothing else when none), applied by _apply()
+
+    The log position is a DB watermark shared by every process: a row that
+    commits late gets its log entry after the ones already applied, and
+    archiving needs nothing (archived rows keep their id and values).
+    """
+    folder = _snapshot_dir()
+    for _ in range(3):
+        meta = _read_meta(folder, user.pk)
+        try:
+            if meta is None:
+                state = _build(user)
+            else:
+                entries = list(
+                    ChangeLogEntry.objects.filter(user=user, seq__gt=meta["seq"])
+                    .order_by()
+                    .values_list("seq", "model", "object_id", "op")
+                )
+                snapshot = _open(folder, meta)
+                if not entries:
+                    return snapshot
+                state = _apply(user, snapshot, meta["seq"], entries)
+            return _open(folder, _save(folder, user.pk, state))
+        except FileNotFoundError:
+            continue  # files replaced by a concurrent refresh: read the new metadata
+    state = _build(user)
+    return TransactionSnapshot(state["rows"], state["links"], state["categories"], state["tag_names"], state["opening_cents"])
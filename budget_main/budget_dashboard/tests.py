@@ -1,3 +1,681 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from budget_core.archive import archive_user
+from budget_core.changelog import record_changes
+from budget_core import events
+from budget_core.models import Account, Budget, Category, Transaction
+from budget_core.sharding import current_shard, shard_for_user, use_shard_for
+from budget_core.signals import transactions_created
+from budget_core.tags import set_tags
+from budget_dashboard import assistant_service, conversation_service, snapshot_service
+from budget_dashboard.analytics_service import build_advanced_analytics
+from budget_dashboard.anomaly_service import observe_transaction
+from budget_dashboard.forecast_service import N_FEATURES, RIDGE, features, forecast, rebuild_user
+from budget_dashboard.scenario_service import apply_scenario, category_forecasts, fit_columns, parse_what_if, run_tool
+from budget_dashboard.projection_service import PERCENTILES, project, simulate
+from budget_dashboard.models import BudgetAlert, CategorySpendStat, ForecastState, SpendingAnomaly
+from budget_dashboard.snapshot_service import EXPENSE, load_snapshot
+from budget_dashboard.timeseries_service import time_series
+from budget_management.batch_service import create_transactions
+
+
+class DashboardTestCase(TestCase):
+    """
+    A user with one account and Food / Salary categories, pinned to their
+    shard; analytics snapshots go to a temporary folder.
+    """
+
+    databases = "__all__"  # the user's shard, with DB_SHARDS set
+
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        self.enterContext(override_settings(ANALYTICS_SNAPSHOT_DIR=folder))
+        self.folder = folder
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.user = User.objects.create_user(username="alice", password="p")
+        self.enterContext(use_shard_for(self.user.pk))  # as UserShardMiddleware does
+        self.account = Account.objects.create(user=self.user, name="Cash", balance=Decimal("1000"))
+        self.food = Category.objects.create(user=self.user, name="Food", type="expense")
+        self.salary = Category.objects.create(user=self.user, name="Salary", type="income")
+
+    def add(self, amount, days_ago=0, category=None, tx_type="expense"):
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=category or self.food, type=tx_type,
+            amount=Decimal(amount), date=date.today() - timedelta(days=days_ago),
+        )
+
+
+# ─── Columnar snapshot ────────────────────────────────────────────────────────
+class SnapshotTests(DashboardTestCase):
+    def cents_by_id(self):
+        snapshot = load_snapshot(self.user)
+        return dict(zip(snapshot.id.tolist(), snapshot.cents.tolist()))
+
+    def test_inserts_edits_and_deletes_are_applied(self):
+        kept = self.add("10.00", days_ago=3)
+        edited = self.add("20.00", days_ago=2)
+        deleted = self.add("30.00", days_ago=1)
+        self.assertEqual(len(load_snapshot(self.user)), 3)
+
+        edited.amount = Decimal("25.50")
+        edited.save()
+        deleted.delete()
+        added = self.add("5.00")
+        self.assertEqual(self.cents_by_id(), {kept.pk: 1000, edited.pk: 2550, added.pk: 500})
+
+    def test_late_commit_with_a_lower_id_is_picked_up(self):
+        late = self.add("7.00", days_ago=5)
+        late_id = late.pk
+        hot = Transaction.objects.filter(pk=late_id)
+        hot._raw_delete(hot.db)  # not committed yet
+        self.add("1.00")
+        load_snapshot(self.user)
+
+        # The lower id commits after a newer row was already in the snapshot
+        late.pk = late_id
+        Transaction.objects.bulk_create([late])
+        transactions_created.send(sender=Transaction, user_id=self.user.pk, transactions=[late])
+        self.assertEqual(self.cents_by_id().get(late_id), 700)
+
+    def test_changes_from_another_process_are_seen(self):
+        tx = self.add("10.00")
+        load_snapshot(self.user)
+        # Another worker: same database, its own cache
+        Transaction.objects.filter(pk=tx.pk).update(amount=Decimal("12.00"))
+        record_changes(self.user.pk, "transaction", [tx.pk], "upsert")
+        cache.clear()
+        self.assertEqual(self.cents_by_id(), {tx.pk: 1200})
+
+    def test_category_rename_and_opening_balance(self):
+        self.add("10.00")
+        load_snapshot(self.user)
+        self.food.name = "Groceries"
+        self.food.save()
+        self.account.balance = Decimal("250.00")
+        self.account.save()
+        snapshot = load_snapshot(self.user)
+        self.assertEqual(snapshot.category_names[self.food.pk], "Groceries")
+        self.assertEqual(snapshot.opening_cents, 25000)
+
+    def test_tags_follow_the_change_log(self):
+        tx = self.add("10.00")
+        other = self.add("4.00")
+        load_snapshot(self.user)
+        set_tags(tx, ["trip", "work"])
+        set_tags(other, ["work"])
+        snapshot = load_snapshot(self.user)
+        by_name = {snapshot.tag_names[t]: c for t, c in snapshot.tag_cents(snapshot.type == EXPENSE).items()}
+        self.assertEqual(by_name, {"trip": 1000, "work": 1400})
+
+    def test_refreshes_write_unique_files(self):
+        self.add("10.00")
+        first = snapshot_service._save(
+            snapshot_service._snapshot_dir(), self.user.pk, snapshot_service._build(self.user),
+        )
+        second = snapshot_service._save(
+            snapshot_service._snapshot_dir(), self.user.pk, snapshot_service._build(self.user),
+        )
+        self.assertNotEqual(first["files"], second["files"])
+        for name in [*first["files"].values(), *second["files"].values()]:
+            self.assertTrue(os.path.exists(os.path.join(self.folder, name)))
+        self.assertEqual(len(load_snapshot(self.user)), 1)
+
+
+# ─── Advanced analytics ───────────────────────────────────────────────────────
+class AnalyticsTests(DashboardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.groceries = Category.objects.create(user=self.user, name="Groceries", type="expense", parent=self.food)
+        self.rent = Category.objects.create(user=self.user, name="Rent", type="expense")
+
+    def test_warm_call_stays_within_two_queries(self):
+        for days_ago in range(12):
+            self.add("10.00", days_ago=days_ago, category=self.groceries)
+        self.add("3000.00", days_ago=1, category=self.salary, tx_type="income")
+        build_advanced_analytics(self.user)  # builds the snapshot
+        cache.clear()  # forecast states come from the database again
+
+        using = current_shard() or "default"
+        with self.assertNumQueries(2, using=using):
+            build_advanced_analytics(self.user)
+        with self.assertNumQueries(1, using=using):
+            build_advanced_analytics(self.user)
+
+    def test_categories_are_rolled_up_for_the_pie_and_the_top_three(self):
+        self.add("10.00", category=self.food)
+        self.add("30.00", category=self.groceries)
+        self.add("25.00", category=self.rent)
+        result = build_advanced_analytics(self.user)
+        self.assertEqual(result["cat_labels"], ["Food", "Rent"])
+        self.assertEqual(result["cat_values"], [40.0, 25.0])
+        self.assertEqual(
+            [(c["category__name"], c["total"]) for c in result["top_categories"]],
+            [("Food", Decimal("40")), ("Rent", Decimal("25"))],
+        )
+
+    def test_history_fills_empty_days_and_totals_come_from_the_snapshot(self):
+        self.add("10.00", days_ago=0)
+        self.add("5.00", days_ago=2)
+        self.add("100.00", category=self.salary, tx_type="income")
+        set_tags(self.add("7.00", days_ago=2), ["trip"])
+        result = build_advanced_analytics(self.user, months=1)
+
+        self.assertEqual(len(result["hist_labels"]), 31)
+        self.assertEqual(result["hist_labels"][-1], date.today().strftime("%Y-%m-%d"))
+        self.assertEqual(result["hist_values"][-3:], [12.0, 0.0, 10.0])
+        self.assertEqual(result["current_balance"], Decimal("1078"))
+        self.assertEqual([(t["name"], t["total"]) for t in result["tag_rows"]], [("trip", Decimal("7"))])
+
+
+# ─── Online forecaster ────────────────────────────────────────────────────────
+class ForecastTests(DashboardTestCase):
+    def test_online_state_matches_a_batch_fit(self):
+        rng = random.Random(7)
+        rows = [self.add(f"{rng.randint(100, 9000) / 100:.2f}", days_ago=rng.randint(0, 60)) for _ in range(40)]
+        for tx in rows[:10]:  # edits: amount and day
+            tx.amount += Decimal("1.25")
+            tx.date -= timedelta(days=rng.randint(0, 3))
+            tx.save()
+        for tx in rows[10:15]:
+            tx.delete()
+
+        # Batch fit over the remaining rows, from scratch
+        totals = {}
+        for d, amount in Transaction.objects.filter(user=self.user, type="expense").values_list("date", "amount"):
+            totals[d] = totals.get(d, 0.0) + float(amount)
+        X = np.array([features(d) for d in sorted(totals)])
+        y = np.array([totals[d] for d in sorted(totals)])
+        beta = np.linalg.lstsq(X.T @ X + RIDGE * np.eye(N_FEATURES), X.T @ y, rcond=None)[0]
+        expected = np.maximum(np.array([features(date.today() + timedelta(days=i)) for i in range(1, 31)]) @ beta, 0)
+
+        state = ForecastState.objects.get(user=self.user, series="expense")
+        np.testing.assert_allclose(state.xtx, X.T @ X, atol=1e-6)
+        np.testing.assert_allclose(state.xty, X.T @ y, rtol=1e-9)
+        self.assertAlmostEqual(state.yty, float(y @ y), places=4)
+        self.assertEqual(state.n, len(totals))
+
+        cache.clear()
+        online = forecast(self.user.pk, "expense", date.today())
+        np.testing.assert_allclose(online["future_values"], expected, rtol=1e-6, atol=1e-6)
+
+        # The backfill from the snapshot lands on the same state
+        rebuild_user(self.user.pk, load_snapshot(self.user))
+        rebuilt = ForecastState.objects.get(user=self.user, series="expense")
+        np.testing.assert_allclose(rebuilt.xty, state.xty, rtol=1e-9)
+        self.assertEqual(rebuilt.n, state.n)
+
+
+# ─── Spending anomalies ───────────────────────────────────────────────────────
+class AnomalyTests(DashboardTestCase):
+    def learn(self, count, amount="10.00"):
+        for days_ago in range(count, 0, -1):
+            observe_transaction(self.add(amount, days_ago=days_ago))
+
+    def test_edit_is_rescored_without_updating_the_stats(self):
+        self.learn(6)
+        tx = self.add("10.00")
+        observe_transaction(tx)
+        stat = CategorySpendStat.objects.get(user=self.user, category=self.food)
+        learned = (stat.n, stat.mean, stat.var)
+
+        for _ in range(2):  # saving the same edit twice changes nothing either
+            tx.amount = Decimal("100.00")
+            tx.save()
+            self.assertIsNotNone(observe_transaction(tx, edited=True))
+        stat.refresh_from_db()
+        self.assertEqual((stat.n, stat.mean, stat.var), learned)
+        self.assertEqual(SpendingAnomaly.objects.filter(transaction=tx).count(), 1)
+
+        tx.amount = Decimal("10.00")
+        tx.save()
+        self.assertIsNone(observe_transaction(tx, edited=True))
+        self.assertFalse(SpendingAnomaly.objects.filter(transaction=tx).exists())
+
+    def test_imported_rows_are_scored_and_learned(self):
+        self.learn(6)
+        item = {"account": self.account.pk, "category": self.food.pk, "type": "expense",
+                "date": date.today().isoformat()}
+        results = create_transactions(self.user, [{**item, "amount": "11.00"}, {**item, "amount": "500.00"}])
+        self.assertEqual([r["unusual"] for r in results], [False, True])
+        self.assertEqual(CategorySpendStat.objects.get(user=self.user, category=self.food).n, 8)
+        self.assertTrue(SpendingAnomaly.objects.filter(transaction_id=results[1]["id"]).exists())
+
+
+# ─── Balance projection ───────────────────────────────────────────────────────
+class ProjectionTests(DashboardTestCase):
+    def history(self, days=90):
+        for days_ago in range(days, 0, -3):
+            self.add("60.00", days_ago=days_ago)
+        for days_ago in range(days - 5, 0, -30):
+            self.add("3000.00", days_ago=days_ago, category=self.salary, tx_type="income")
+
+    def test_simulate_adds_the_drawn_days(self):
+        out = simulate(np.array([10.0, 10.0]), 100, [30, 31], paths=4, seed=1)
+        self.assertEqual(out.tolist(), [[400.0] * 4, [710.0] * 4])
+
+    def test_bands_are_ordered_and_reproducible(self):
+        self.history()
+        result = project(self.user, years=2, paths=500, seed=7)
+        self.assertEqual(result, project(self.user, years=2, paths=500, seed=7))
+        self.assertEqual(result["start_balance"], 1000 + 3 * 3000 - 30 * 60)
+        self.assertEqual(len(result["labels"]), 24)
+
+        bands = [result["bands"][f"p{p}"] for p in PERCENTILES]
+        for month in range(24):
+            column = [band[month] for band in bands]
+            self.assertEqual(column, sorted(column), month)
+        self.assertEqual(result["final"], {f"p{p}": result["bands"][f"p{p}"][-1] for p in PERCENTILES})
+        self.assertGreater(result["final"]["p50"], result["start_balance"])  # earns more than it spends
+
+    def test_goal_probability(self):
+        self.history()
+        reachable = project(self.user, years=2, paths=500, goal=9000, seed=7)["goal"]
+        self.assertEqual(reachable["amount"], 9000)
+        self.assertEqual(reachable["probability"], 1.0)
+        self.assertEqual(reachable["by_year"], [1.0, 1.0])
+        self.assertGreaterEqual(reachable["median_months"], 1)
+
+        far = project(self.user, years=2, paths=500, goal=10_000_000, seed=7)["goal"]
+        self.assertEqual((far["probability"], far["by_year"], far["median_months"]), (0.0, [0.0, 0.0], None))
+
+        some = project(self.user, years=2, paths=500, goal=40_000, seed=7)["goal"]
+        self.assertLessEqual(some["by_year"][0], some["by_year"][1])
+        self.assertEqual(some["probability"], some["by_year"][-1])
+
+    def test_no_or_short_history(self):
+        self.assertIsNone(project(self.user, seed=1))
+        self.add("10.00", days_ago=10)
+        self.assertIsNone(project(self.user, seed=1))  # 10 days < MIN_HISTORY_DAYS
+        with self.assertRaises(ValueError):
+            project(self.user, years=6)
+        with self.assertRaises(ValueError):
+            project(self.user, paths=10)
+
+
+# ─── What-if scenarios ────────────────────────────────────────────────────────
+class ScenarioTests(DashboardTestCase):
+    BASE = {
+        "start_balance": 1000.0,
+        "income": {"30": 3000.0, "90": 9000.0},
+        "categories": [
+            {"id": 1, "name": "Food", "monthly": 600.0, "30": 600.0, "90": 1800.0},
+            {"id": 2, "name": "Transport", "monthly": 300.0, "30": 300.0, "90": 900.0},
+        ],
+    }
+
+    def test_batched_fit_matches_one_fit_per_column(self):
+        rng = np.random.default_rng(3)
+        days = np.arange(20000, 20060)
+        Y = rng.gamma(2.0, 15.0, size=(len(days), 4)) * (rng.random((len(days), 4)) < 0.6)
+        future = np.arange(20060, 20150)
+        batched = fit_columns(days, Y, future)
+        separate = np.hstack([fit_columns(days, Y[:, [i]], future) for i in range(Y.shape[1])])
+        np.testing.assert_allclose(batched, separate, atol=1e-9)
+
+    def test_category_forecasts_use_the_batched_fit(self):
+        transport = Category.objects.create(user=self.user, name="Transport", type="expense")
+        for days_ago in range(1, 43):
+            self.add("12.00", days_ago=days_ago)
+            if days_ago % 7 == 0:
+                self.add("35.00", days_ago=days_ago, category=transport)
+        self.add("2500.00", days_ago=20, category=self.salary, tx_type="income")
+
+        base = category_forecasts(self.user, months=2)
+        self.assertEqual(base["history_days"], 42)
+        self.assertEqual([c["name"] for c in base["categories"]], ["Food", "Transport"])
+        food = base["categories"][0]
+        self.assertEqual(food["monthly"], 360.0)
+        self.assertAlmostEqual(food["30"], 360.0, delta=1.0)  # flat history, flat forecast
+        self.assertLess(base["categories"][1]["30"], food["30"])
+        self.assertIsNone(category_forecasts(self.user, months=2, today=date.today() - timedelta(days=35)))
+
+    def test_apply_scenario_with_overrides(self):
+        result = apply_scenario(self.BASE, {1: -50, 2: 100})
+        self.assertEqual(result["baseline"]["30"], {"expense": 900.0, "balance": 3100.0})
+        self.assertEqual(result["scenario"]["30"], {"expense": 900.0, "balance": 3100.0})
+        self.assertEqual(result["scenario"]["90"], {"expense": 2700.0, "balance": 7300.0})
+
+        result = apply_scenario(self.BASE, {1: -20})
+        self.assertEqual(result["scenario"]["30"], {"expense": 780.0, "balance": 3220.0})
+        self.assertEqual(result["saved"], {"30": 120.0, "90": 360.0})
+        self.assertEqual(result["categories"], [{
+            "id": 1, "name": "Food", "percent": -20,
+            "30": {"baseline": 600.0, "scenario": 480.0},
+            "90": {"baseline": 1800.0, "scenario": 1440.0},
+        }])
+        self.assertEqual(apply_scenario(self.BASE, {})["saved"], {"30": 0.0, "90": 0.0})
+
+        for changes in ({3: -10}, {1: -101}, {2: 250}):
+            with self.assertRaises(ValueError):
+                apply_scenario(self.BASE, changes)
+
+    def test_named_changes(self):
+        self.assertEqual(
+            parse_what_if("Cut food by 20% and spend 10% more on transport", self.BASE),
+            [("Food", -20.0), ("Transport", 10.0)],
+        )
+        result = run_tool(self.BASE, {"changes": [{"category": "trans", "percent": -50}]})
+        self.assertEqual(result["saved"]["30"], 150.0)
+        self.assertIn("error", run_tool(self.BASE, {"changes": [{"category": "Rent", "percent": -5}]}))
+        self.assertIn("error", run_tool(self.BASE, {"changes": "all of it"}))
+
+
+# ─── Assistant gate / local answers ───────────────────────────────────────────
+class AssistantGateTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)  # never leave a worker blocked
+
+    def gate(self, **limits):
+        # Limits are read when the gate is built (slots, breaker) or per call
+        settings = {"MAX_CONCURRENCY": 1, "QUEUE_WAIT": 0.01, "TIMEOUT": 5.0, "BREAKER_FAILURES": 2, "BREAKER_COOLDOWN": 60.0}
+        settings.update(limits)
+        for name, value in settings.items():
+            self.enterContext(mock.patch.object(assistant_service, name, value))
+        gate = assistant_service.AssistantGate()
+        self.addCleanup(gate._executor.shutdown, wait=False)
+        return gate
+
+    def blocked(self):
+        self.release.wait(5)
+        return "late"
+
+    def test_timeout_keeps_the_slot_until_the_call_ends(self):
+        gate = self.gate(TIMEOUT=0.05)
+        self.assertEqual(gate.call(1, self.blocked), (None, "timeout"))
+        # The hung call still holds the only slot
+        self.assertEqual(gate.call(1, lambda: "ok"), (None, "busy"))
+        self.release.set()
+        for _ in range(100):
+            if not gate.snapshot()["in_flight"]:
+                break
+            time.sleep(0.01)
+        self.assertEqual(gate.call(1, lambda: "ok"), ("ok", None))
+        stats = gate.snapshot()
+        self.assertEqual((stats["timeouts"], stats["busy"], stats["successes"]), (1, 1, 1))
+
+    def test_breaker_opens_after_failures_and_probes_after_cooldown(self):
+        gate = self.gate()
+        upstream = mock.Mock(side_effect=RuntimeError("502"))
+        self.assertEqual(gate.call(1, upstream), (None, "error"))
+        self.assertEqual(gate.call(1, upstream), (None, "error"))
+        self.assertEqual(gate.call(1, upstream), (None, "circuit_open"))
+        self.assertEqual(upstream.call_count, 2)  # not called while open
+        self.assertEqual(gate.snapshot()["breaker"]["state"], "open")
+
+        gate.breaker.cooldown = 0
+        self.assertEqual(gate.call(1, lambda: "ok"), ("ok", None))  # the half-open probe
+        self.assertEqual(gate.snapshot()["breaker"], {"state": "closed", "consecutive_failures": 0, "trips": 1})
+
+    def test_rate_limit_per_user(self):
+        gate = self.gate()
+        with mock.patch.object(assistant_service, "RATE_PER_MINUTE", 2):
+            self.assertEqual([gate.call(7, lambda: "ok")[1] for _ in range(3)], [None, None, "rate_limited"])
+            self.assertEqual(gate.call(8, lambda: "ok"), ("ok", None))
+
+
+class LocalAnswerTests(SimpleTestCase):
+    ANALYTICS = {
+        "has_any_data": True,
+        "current_balance": 5000,
+        "predicted_30d_expense": 1500,
+        "predicted_30d_income": 3000,
+        "net_30": 1500,
+        "expected_balance_30": 6500,
+        "rec_budget": 1350,
+        "saved_if_reduce_10": 150,
+        "top_categories": [{"category__name": "Food", "total": 1200}, {"category__name": "Transport", "total": 600}],
+    }
+    BASE = {
+        "start_balance": 5000.0,
+        "income": {"30": 3000.0, "90": 9000.0},
+        "categories": [{"id": 1, "name": "Food", "monthly": 200.0, "30": 200.0, "90": 600.0}],
+    }
+
+    def answer(self, message, **kwargs):
+        return assistant_service.local_answer(message, self.ANALYTICS, months=6, **kwargs)
+
+    def test_each_intent_is_answered_from_the_numbers(self):
+        expected = {
+            "How am I doing?": "Top categories: Food (RM 1200.00)",
+            "Where do I spend too much?": "Trimming Food by 10% would save about RM 20.00 a month.",
+            "Plan a budget for next month": "A budget of RM 1350.00 (10% less)",
+            "How big should my emergency fund be?": "RM 4500.00–RM 9000.00",
+            "Can I afford a holiday? Check my balance": "Expected balance in 30 days: RM 6500.00.",
+            "Anything unusual?": "Nothing unusual was flagged in the last 6 month(s).",
+        }
+        for message, text in expected.items():
+            answer = self.answer(message)
+            self.assertIn(text, answer, message)
+            self.assertTrue(answer.endswith(assistant_service.DISCLAIMER))
+
+    def test_what_if_uses_the_scenario_base(self):
+        answer = self.answer("What if I cut food by 50%?", scenario_base=self.BASE)
+        self.assertIn("- Food: -50% → RM 100.00 instead of RM 200.00 over 30 days", answer)
+        self.assertIn("Balance in 30 days: RM 7900.00 (vs RM 7800.00, RM 100.00 saved).", answer)
+        self.assertIn("at least a few weeks", self.answer("What if I cut food by 50%?"))
+
+    def test_no_data(self):
+        answer = assistant_service.local_answer("hi", {"has_any_data": False})
+        self.assertIn("enough transactions", answer)
+
+
+class AssistantViewTests(DashboardTestCase):
+    def ask(self, message):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("finance_assistant_api"), {"message": message})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def fresh_gate(self):
+        gate = assistant_service.AssistantGate()
+        self.addCleanup(gate._executor.shutdown, wait=False)
+        return self.enterContext(mock.patch("budget_dashboard.views.assistant_gate", gate))
+
+    def test_model_answer(self):
+        self.fresh_gate()
+        reply = mock.Mock(content="Spend less on snacks.", tool_calls=None)
+        with mock.patch("budget_dashboard.views.client") as client:
+            llm = client.with_options.return_value
+            llm.chat.completions.create.return_value = mock.Mock(choices=[mock.Mock(message=reply)], usage=None)
+            data = self.ask("How am I doing?")
+        self.assertEqual((data["source"], data["answer"]), ("ai", "Spend less on snacks."))
+
+    def test_open_breaker_answers_locally_without_calling_the_model(self):
+        self.add("25.00", days_ago=3)
+        gate = self.fresh_gate()
+        for _ in range(gate.breaker.failures):
+            gate.breaker.record_failure()
+        with mock.patch("budget_dashboard.views.client") as client:
+            data = self.ask("Plan a budget for next month")
+        client.with_options.assert_not_called()
+        self.assertEqual((data["source"], data["reason"]), ("local", "circuit_open"))
+        self.assertTrue(data["answer"].endswith(assistant_service.DISCLAIMER))
+
+
+class ConversationTests(DashboardTestCase):
+    @mock.patch.object(conversation_service, "SUMMARY_TOKENS", 60)
+    @mock.patch.object(conversation_service, "HISTORY_TOKENS", 120)
+    def test_compaction_keeps_the_prompt_within_budget(self):
+        conversation = conversation_service.open_conversation(self.user)
+        conversation_service.set_snapshot(conversation, "Balance: RM 1000.00", 6)
+        sizes = []
+        for i in range(40):
+            recent = conversation_service.compact(conversation)
+            question = f"Question {i}: how much did I spend on food this week?"
+            messages = conversation_service.build_messages(conversation, "You are a budget assistant.", recent, question)
+            sizes.append(sum(conversation_service.estimate_tokens(m["content"]) for m in messages))
+
+            self.assertLessEqual(sum(t.tokens for t in recent), 120)
+            self.assertLessEqual(conversation_service.estimate_tokens(conversation.summary), 60)
+            if recent:
+                self.assertEqual(recent[0].role, "user")  # whole question / answer pairs
+            if i:
+                # The latest exchange is always kept verbatim
+                self.assertEqual([t.content for t in recent[-2:]], [previous, f"Answer {i - 1}: about RM 40.00, mostly lunches."])
+            conversation_service.record_turn(conversation, "user", question)
+            conversation_service.record_turn(conversation, "assistant", f"Answer {i}: about RM 40.00, mostly lunches.")
+            previous = question
+
+        self.assertLessEqual(max(sizes), 2 * sizes[5])  # turn 40 costs about what turn 5 does
+        # The summary ends where the verbatim turns begin and has dropped the oldest gists
+        first_kept = int(recent[0].content.split()[1].rstrip(":"))
+        self.assertTrue(conversation.summary.endswith(f"Answer {first_kept - 1}: about RM 40.00, mostly lunches."))
+        self.assertNotIn("Question 0:", conversation.summary)
+
+
+# ─── Budget alerts / events ───────────────────────────────────────────────────
+class BudgetAlertTests(DashboardTestCase):
+    def setUp(self):
+        super().setUp()
+        Budget.objects.create(user=self.user, category=self.food, month=date.today().replace(day=1), amount=Decimal("100"))
+
+    def test_alert_is_delivered_when_the_shard_commits(self):
+        q = events.subscribe(self.user.pk)
+        self.addCleanup(events.unsubscribe, self.user.pk, q)
+        with self.captureOnCommitCallbacks(using=shard_for_user(self.user.pk), execute=True):
+            self.add("85.00")
+            self.assertTrue(q.empty())
+        name, data, event_id = q.get_nowait()
+        self.assertEqual((name, data["threshold"]), ("budget_alert", 80))
+        self.assertEqual(event_id, BudgetAlert.objects.get(user=self.user).pk)
+
+    @mock.patch.object(events, "POLL_SECONDS", 0.01)
+    def test_stream_polls_alerts_raised_by_other_workers(self):
+        self.add("85.00")  # alert raised before the page opened: not replayed
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("events_api"))
+        self.addCleanup(response.close)
+        frames = (frame.decode() for frame in response.streaming_content)
+        self.assertTrue(next(frames).startswith("retry:"))
+        self.assertIn("event: ready", next(frames))
+
+        # Another worker's alert: stored, but never published to this process
+        self.add("20.00")
+        newest = BudgetAlert.objects.filter(user=self.user).latest("id")
+        self.assertEqual(newest.threshold, 100)
+        frame = next(frames)
+        self.assertIn("event: budget_alert", frame)
+        self.assertIn(f"id: {newest.pk}", frame)
+
+
+class LiveDashboardTests(DashboardTestCase):
+    def test_delta_is_pushed_when_the_shard_commits(self):
+        q = events.subscribe(self.user.pk)
+        self.addCleanup(events.unsubscribe, self.user.pk, q)
+        with self.captureOnCommitCallbacks(using=shard_for_user(self.user.pk), execute=True):
+            self.add("12.50")
+            self.add("7.50", days_ago=1)
+            self.assertTrue(q.empty())
+        name, data, event_id = q.get_nowait()
+        self.assertEqual(name, "dashboard")
+        self.assertEqual(data["accounts"][self.account.pk], 980.0)
+        self.assertTrue(q.empty())  # both writes merged into one push
+
+
+# ─── Monthly statements ───────────────────────────────────────────────────────
+class StatementCommandTests(DashboardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(MEDIA_ROOT=self.folder))
+        self.day = date.today() - timedelta(days=40)
+        self.month = self.day.strftime("%Y-%m")
+        self.folder_for_month = os.path.join(self.folder, "statements", self.month)
+        self.add("12.50", days_ago=40)
+        self.add("300.00", days_ago=40, category=self.salary, tx_type="income")
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("generate_statements", "--month", self.month, "--workers", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def statement(self, user):
+        with open(os.path.join(self.folder_for_month, f"{user.pk}.html"), encoding="utf-8") as f:
+            return f.read()
+
+    def test_one_month(self):
+        out = self.run_command()
+        self.assertIn("1 user(s) in 1 chunk(s), 0 already done", out)
+        self.assertIn("1 statement(s) written, 0 failed.", out)
+        html = self.statement(self.user)
+        self.assertIn("alice", html)
+        self.assertIn(f"Monthly Statement — {self.day:%B %Y}", html)
+        for line in ("Food", "RM 12.50", "Salary", "RM 300.00"):
+            self.assertIn(line, html)
+
+    def test_resumed_run_skips_existing_statements(self):
+        self.run_command()
+        path = os.path.join(self.folder_for_month, f"{self.user.pk}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("kept")  # a regenerated file would lose this
+        bob = User.objects.create_user(username="bob", password="p")
+
+        out = self.run_command()
+        self.assertIn("1 user(s) in 1 chunk(s), 1 already done", out)
+        self.assertEqual(self.statement(self.user), "kept")
+        self.assertIn("bob", self.statement(bob))
+
+        self.assertIn("0 user(s) in 0 chunk(s), 2 already done", self.run_command())
+        self.assertIn("2 statement(s) written", self.run_command("--force"))
+        self.assertIn("alice", self.statement(self.user))
+
+
+# ─── Time series ──────────────────────────────────────────────────────────────
+class TimeSeriesTests(DashboardTestCase):
+    def test_archived_month_counts_only_when_it_starts_in_range(self):
+        first = (date.today() - timedelta(days=400)).replace(day=1)
+        for day in (3, 20):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.food, type="expense",
+                amount=Decimal("10.00"), date=first.replace(day=day),
+            )
+        archive_user(self.user.pk, date.today().replace(day=1))
+
+        whole = time_series(self.user, first, date.today(), granularity="month", tx_type="expense")
+        self.assertEqual(whole["values"][0], 20.0)
+        # From mid-month the summary can't be split: it is left out, not counted whole
+        partial = time_series(self.user, first.replace(day=15), date.today(), granularity="month", tx_type="expense")
+        self.assertEqual(partial["values"][0], 0.0)
+        self.assertEqual(sum(partial["values"]), 0.0)
+
+    def test_tag_filter_reads_archived_rows_not_the_summaries(self):
+        first = (date.today() - timedelta(days=400)).replace(day=1)
+        for amount, tags in (("10.00", ["trip", "work"]), ("20.00", ["trip"]), ("40.00", [])):
+            tx = Transaction.objects.create(
+                user=self.user, account=self.account, category=self.food, type="expense",
+                amount=Decimal(amount), date=first.replace(day=5),
+            )
+            set_tags(tx, tags)
+        archive_user(self.user.pk, date.today().replace(day=1))
+
+        def total(**tags):
+            series = time_series(self.user, first, date.today(), granularity="month", tx_type="expense", **tags)
+            return series["values"][0]
+
+        self.assertEqual(total(), 70.0)
+        self.assertEqual(total(tags=["trip", "work"], match="all"), 10.0)
+        self.assertEqual(total(tags=["trip", "work"], match="any"), 30.0)
+        with self.assertRaises(ValueError):
+            total(tags=["trip"], match="some")
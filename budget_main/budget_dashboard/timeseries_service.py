@@ -0,0 +1,166 @@
+# budget_dashboard/timeseries_service.py
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+
+from budget_core.models import ArchivedTransaction, Transaction, TransactionMonthSummary
+from budget_core.tags import MATCHES, tag_filter
+
+GRANULARITIES = {
+    "day": TruncDay,
+    "week": TruncWeek,    # buckets start on Monday
+    "month": TruncMonth,
+    "year": TruncYear,
+}
+
+METRICS = ("sum", "count", "avg", "net")
+
+
+def _aggregates(amount, count):
+    # Per bucket: sum, row count and net (income positive, expense negative)
+    return {
+        "s": Sum(amount),
+        "n": count,
+        "net": Sum(
+            Case(
+                When(type="income", then=F(amount)),
+                When(type="expense", then=-F(amount)),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            )
+        ),
+    }
+
+
+# Guard against e.g. daily buckets over decades
+MAX_BUCKETS = 3700
+
+
+def bucket_start(d, granularity):
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    if granularity == "year":
+        return d.replace(month=1, day=1)
+    return d
+
+
+def next_bucket(d, granularity):
+    if granularity == "week":
+        return d + timedelta(days=7)
+    if granularity == "month":
+        return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+    if granularity == "year":
+        return date(d.year + 1, 1, 1)
+    return d + timedelta(days=1)
+
+
+def bucket_label(d, granularity):
+    if granularity == "month":
+        return d.strftime("%Y-%m")
+    if granularity == "year":
+        return d.strftime("%Y")
+    return d.strftime("%Y-%m-%d")
+
+
+def time_series(user, start, end, metric="sum", granularity="day",
+                account=None, category=None, tx_type=None, tags=None, match="all"):
+    """
+    One grouped query per table: transactions of `user` in [start, end]
+    (hot + archived), bucketed by the database (Trunc*) and aggregated with
+    `metric`; empty buckets are filled with 0 so every chart gets a
+    continuous axis. `tags` keeps the rows carrying all / any (`match`) of
+    those tag names.
+
+    Returns a dict: metric, granularity, start, end, buckets (ISO dates of
+    the bucket starts), labels, values (floats).
+    Raises ValueError on an unknown metric / granularity / match or a range that
+    is inverted or too long for the granularity.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Use one of: {', '.join(METRICS)}.")
+    if granularity not in GRANULARITIES:
+        raise ValueError(
+            f"Unknown granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}."
+        )
+    if match not in MATCHES:
+        raise ValueError(f"Unknown match '{match}'. Use one of: {', '.join(MATCHES)}.")
+    if start > end:
+        raise ValueError("Start date must be on or before end date.")
+
+    buckets = []
+    cursor = bucket_start(start, granularity)
+    while cursor <= end:
+        buckets.append(cursor)
+        if len(buckets) > MAX_BUCKETS:
+            raise ValueError(f"Range too long for '{granularity}' buckets (max {MAX_BUCKETS}).")
+        cursor = next_bucket(cursor, granularity)
+
+    filters = {}
+    if account:
+        filters["account_id"] = account
+    if category:
+        filters["category_id"] = category
+    if tx_type:
+        filters["type"] = tx_type
+    trunc = GRANULARITIES[granularity]
+    tagged = tag_filter(getattr(user, "pk", user), tags, match) if tags else Q()
+
+    # Hot rows, then archived data: month summaries when the buckets are
+    # months/years (only months starting inside the range, as subtree_totals
+    # does: a summary can't be split by day), the archive rows for day/week
+    # buckets (and for tag filters: the summaries carry no tags)
+    sources = [
+        Transaction.objects.filter(tagged, user=user, date__range=[start, end], **filters)
+        .annotate(bucket=trunc("date"))
+        .values("bucket")
+        .annotate(**_aggregates("amount", Count("id"))),
+    ]
+    if granularity in ("month", "year") and not tags:
+        sources.append(
+            TransactionMonthSummary.objects.filter(
+                user=user, month__range=[start, end], **filters
+            )
+            .annotate(bucket=trunc("month"))
+            .values("bucket")
+            .annotate(**_aggregates("total", Sum("count")))
+        )
+    else:
+        sources.append(
+            ArchivedTransaction.objects.filter(tagged, user=user, date__range=[start, end], **filters)
+            .annotate(bucket=trunc("date"))
+            .values("bucket")
+            .annotate(**_aggregates("amount", Count("id")))
+        )
+
+    sums, counts, nets = defaultdict(float), defaultdict(int), defaultdict(float)
+    for rows in sources:
+        for row in rows.order_by():
+            b = row["bucket"]
+            if isinstance(b, datetime):
+                b = b.date()
+            sums[b] += float(row["s"] or 0)
+            counts[b] += int(row["n"] or 0)
+            nets[b] += float(row["net"] or 0)
+
+    if metric == "sum":
+        totals = sums
+    elif metric == "count":
+        totals = {b: float(n) for b, n in counts.items()}
+    elif metric == "avg":
+        totals = {b: sums[b] / n for b, n in counts.items() if n}
+    else:
+        totals = nets
+
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "buckets": [b.isoformat() for b in buckets],
+        "labels": [bucket_label(b, granularity) for b in buckets],
+        "values": [totals.get(b, 0.0) for b in buckets],
+    }
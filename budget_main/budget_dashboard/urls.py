@@ -6,4 +6,9 @@ urlpatterns = [
     path('Dashboard', views.dashboard, name='dashboard'),
     path("Advance-Analytics/", views.advanced_analytics, name="advanced_analytics"),     
     path("api/finance-assistant/", views.finance_assistant_api, name="finance_assistant_api"),
+    path("api/metrics/", views.metrics_api, name="metrics_api"),
+    path("api/timeseries/", views.timeseries_api, name="timeseries_api"),
+    path("api/events/", views.events_api, name="events_api"),
+    path("api/projection/", views.projection_api, name="projection_api"),
+    path("api/scenario/", views.scenario_api, name="scenario_api"),
 ]
\ No newline at end of file
@@ -14,8 +14,44 @@ import pandas as pd
 from sklearn.linear_model import LinearRegression
 from math import sqrt
 from sklearn.metrics import mean_squared_error
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from budget_dashboard.analytics_service import build_advanced_analytics
+from budget_dashboard.anomaly_service import recent_anomalies
+from budget_dashboard.assistant_service import (
+    SYSTEM_PROMPT,
+    TIMEOUT as ASSISTANT_TIMEOUT,
+    analytics_summary,
+    assistant_stats,
+    detect_intent,
+    gate as assistant_gate,
+    local_answer,
+    tool_messages,
+)
+from budget_dashboard.conversation_service import (
+    build_messages,
+    compact,
+    open_conversation,
+    record_turn,
+    set_snapshot,
+    snapshot_is_stale,
+)
+from budget_dashboard.projection_service import DEFAULT_PATHS, MIN_HISTORY_DAYS, project
+from budget_dashboard.scenario_service import (
+    MIN_HISTORY_DAYS as SCENARIO_MIN_DAYS,
+    apply_scenario,
+    category_forecasts,
+    scenario_tool,
+)
+from budget_dashboard.timeseries_service import GRANULARITIES, time_series
+from django.contrib.admin.views.decorators import staff_member_required
+from budget_core.db.pool import pool_stats
+from budget_core.cache_versions import account_versions
+from budget_core.archive import account_type_totals, in_out_totals, live_balances
+from budget_core.events import aevent_stream, event_stream
+from budget_core.sharding import use_shard_for
+from budget_dashboard.budget_alert_service import alert_payload, alerts_after, ensure_spends
+from budget_dashboard.models import BudgetAlert
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
@@ -34,106 +70,47 @@ def dashboard(request):
 
     # NEW: Live Money = opening balances + all-time income - all-time expense
     opening_sum = Account.objects.filter(user=user).aggregate(total=Sum('balance'))['total'] or Decimal('0')
-    all_tx = (
-        Transaction.objects
-        .filter(user=user)
-        .values('type')
-        .annotate(total=Sum('amount'))
-    )
-    in_total = Decimal('0'); out_total = Decimal('0')
-    for row in all_tx:
-        if row['type'] == 'income':
-            in_total += row['total'] or 0
-        else:
-            out_total += row['total'] or 0
+    # All-time totals: hot rows + archived month summaries
+    all_totals = account_type_totals(user)
+    in_total, out_total = in_out_totals(user, all_totals)
     live_total = Decimal(opening_sum) + in_total - out_total
 
     # --- Daily expenses for current month ---
-    # Month bounds: [start, next_month_start)
-    start = date(today.year, today.month, 1)
-    next_month_start = date(today.year + (1 if today.month == 12 else 0),
-                            1 if today.month == 12 else today.month + 1, 1)
-
-    # Pull only what we need (no DB functions)
-    qs = (
-        Transaction.objects
-        .filter(
-            user=user,                      # remove if you don't filter per-user
-            type__iexact='expense',
-            date__gte=start,
-            date__lt=next_month_start,
-            date__isnull=False,
-        )
-        .values_list('date', 'amount')
-    )
-
-    # Sum per day in Python (works for DateField or DateTimeField)
-    totals_by_day = {}
-    for d, amt in qs:
-        if d is None:
-            continue
-        day_num = (d.day if hasattr(d, "day") else int(str(d)[8:10]))  # super defensive
-        totals_by_day[day_num] = totals_by_day.get(day_num, 0) + float(amt or 0)
-
-    last_day = (next_month_start - start).days
-    exp_daily_labels = [f"{i:02d}" for i in range(1, last_day + 1)]
-    exp_daily_values = [totals_by_day.get(i, 0.0) for i in range(1, last_day + 1)]
+    daily = time_series(user, first_day, last_day, granularity="day", tx_type="expense")
+    exp_daily_labels = [b[8:10] for b in daily["buckets"]]  # "01".."31"
+    exp_daily_values = daily["values"]
 
     # Chart data: last 6 months expense by month
-    chart_labels = []
-    chart_values = []
-    m, y = today.month, today.year
-    for _ in range(6):
-        chart_labels.append(f"{y}-{m:02d}")
-        start = date(y, m, 1)
-        end = date(y, m, monthrange(y, m)[1])
-        total = Transaction.objects.filter(user=user, type='expense', date__range=[start, end]).aggregate(Sum('amount'))['amount__sum'] or 0
-        chart_values.append(float(total))
-        # prev month
-        m -= 1
-        if m == 0:
-            m = 12
-            y -= 1
-    chart_labels.reverse(); chart_values.reverse()
+    six_months_ago = first_day
+    for _ in range(5):
+        six_months_ago = (six_months_ago - timedelta(days=1)).replace(day=1)
+    monthly = time_series(user, six_months_ago, last_day, granularity="month", tx_type="expense")
+    chart_labels = monthly["labels"]
+    chart_values = monthly["values"]
 
     # Budgets status for this month
-    budgets = Budget.objects.filter(user=user, month__year=today.year, month__month=today.month).select_related('category')
-    spent_by_cat = (
-        month_tx.filter(type='expense')
-        .values('category__id', 'category__name')
-        .annotate(total=Sum('amount'))
+    budgets = ensure_spends(
+        Budget.objects.filter(user=user, month__year=today.year, month__month=today.month)
+        .select_related('category', 'spend')
     )
-    spent_map = {row['category__id']: row['total'] for row in spent_by_cat}
+    # Spent per budget from the counters kept up to date on every expense write
+    spent_map = {b.category_id: b.spend.spent for b in budgets}
 
     live_after_month_expense = Decimal(live_total) - Decimal(expense or 0)
     live_money = live_after_month_expense + income
 
     budget_labels = [b.category.name for b in budgets]
+    budget_categories = [b.category_id for b in budgets]
     budget_values = [float(b.amount or 0) for b in budgets]
     spent_values = [float(spent_map.get(b.category_id, 0) or 0) for b in budgets]
     total=Coalesce(Sum('amount'), Cast(Value(0), DecimalField(max_digits=12, decimal_places=2)))
 
     accounts = Account.objects.filter(user=request.user).order_by('name')
     # Compute live balances: opening + income - expense per account
-    tx = Transaction.objects.filter(user=request.user)
-    totals = (
-        tx.values('account_id', 'type')
-          .annotate(total=Sum('amount'))
-    )
-    acc_totals = {}
-    for row in totals:
-        aid = row['account_id']
-        typ = row['type']
-        acc_totals.setdefault(aid, {'in': Decimal('0'), 'out': Decimal('0')})
-        if typ == 'income':
-            acc_totals[aid]['in'] += row['total'] or 0
-        else:
-            acc_totals[aid]['out'] += row['total'] or 0
+    live_balances(user, accounts, all_totals)
+    versions = account_versions(user.pk, [a.id for a in accounts])
     for a in accounts:
-        opening = Decimal(a.balance or 0)
-        in_sum = acc_totals.get(a.id, {}).get('in', Decimal('0'))
-        out_sum = acc_totals.get(a.id, {}).get('out', Decimal('0'))
-        a.live_balance = (opening + in_sum) - out_sum
+        a.version = versions[a.id]  # cached card key
 
     context = {
         'income': income, 
@@ -150,6 +127,8 @@ def dashboard(request):
         'budgets': budgets, 
         'spent_map': spent_map,
         'budget_labels': budget_labels, 
+        'budget_categories': budget_categories,
+        'account_balances': {a.id: float(a.live_balance) for a in accounts},
         'budget_values': budget_values, 
         'spent_values': spent_values,
         'accounts':accounts,
@@ -166,11 +145,20 @@ def advanced_analytics(request):
     except ValueError:
         months = 6
 
+    granularity = request.GET.get("granularity", "week")
+    if granularity not in GRANULARITIES:
+        granularity = "week"
+
     analytics_ctx = build_advanced_analytics(request.user, months=months)
 
     # analytics_ctx already has months, but we override just in case
     analytics_ctx["months"] = months
 
+    # Income vs expenses chart is loaded from timeseries_api
+    analytics_ctx["granularity"] = granularity
+    analytics_ctx["granularities"] = list(GRANULARITIES)
+    analytics_ctx["series_start"] = (date.today() - timedelta(days=30 * months)).isoformat()
+
     return render(
         request,
         "budget_dashboard/pages/advanced_analytics.html",
@@ -181,8 +169,10 @@ def advanced_analytics(request):
 @require_POST
 def finance_assistant_api(request):
     """
-    POST: { message: "question text", months: "6" (optional) }
-    Returns: { answer: "AI reply" } OR { error: "..." }
+    POST: { message: "question text", months: "6" (optional),
+            conversation: id (optional, omit to start a new one) }
+    Returns: { answer, source: "ai", conversation, usage } OR
+             { answer, source: "local", reason, conversation } OR { error: "..." }
     """
     user = request.user
     message = (request.POST.get("message") or "").strip()
@@ -195,86 +185,224 @@ def finance_assistant_api(request):
     if not message:
         return JsonResponse({"error": "Empty message."}, status=400)
 
-    # 1) Get analytics snapshot for this user
-    analytics = build_advanced_analytics(user, months=months)
-
-    current_balance       = analytics.get("current_balance")
-    predicted_30d_expense = analytics.get("predicted_30d_expense")
-    predicted_30d_income  = analytics.get("predicted_30d_income")
-    expected_balance_30   = analytics.get("expected_balance_30")
-    net_30                = analytics.get("net_30")
-    top_categories        = analytics.get("top_categories") or []
-    rmse_expense          = analytics.get("rmse_expense")
-    rmse_income           = analytics.get("rmse_income")
-    has_income_data       = analytics.get("has_income_data", False)
-
-    # Top categories text
-    if top_categories:
-        cat_bits = []
-        for row in top_categories:
-            name = row.get("category__name") or "Uncategorised"
-            total = row.get("total") or 0
-            cat_bits.append(f"{name} (RM {float(total):.2f})")
-        top_cat_text = ", ".join(cat_bits)
-    else:
-        top_cat_text = "No strong spending categories yet."
-
-    analytics_text = f"""
-User: {user.username} | History window: last {months} month(s).
-
-Current balance (all accounts combined): RM {float(current_balance or 0):.2f}
-
-Predicted next 30 days:
-- Expenses: {('RM %.2f' % float(predicted_30d_expense)) if predicted_30d_expense is not None else 'N/A'}
-- Income:   {('RM %.2f' % float(predicted_30d_income)) if predicted_30d_income is not None else 'N/A'}
-
-Expected balance in 30 days: {('RM %.2f' % float(expected_balance_30)) if expected_balance_30 is not None else 'N/A'}
-Net 30-day cash flow (income - expense): {('RM %.2f' % float(net_30)) if net_30 is not None else 'N/A'}
-
-Top spending categories recently:
-{top_cat_text}
-
-Model quality (approximate):
-- Expense model RMSE: {('RM %.2f' % rmse_expense) if rmse_expense is not None else 'N/A'}
-- Income model RMSE:  {('RM %.2f' % rmse_income) if (has_income_data and rmse_income is not None) else 'N/A or no income data'}
-""".strip()
-
-    system_prompt = """
-You are a helpful, cautious personal finance assistant for an app called "Money Manager".
-
-You are given a summary of the user's real financial analytics (balances, predicted expenses/income,
-top spending categories, and model quality). Use ONLY this data and general money management
-knowledge to answer questions.
-
-Constraints:
-- Do NOT give investment or trading recommendations for specific stocks, crypto, or complex products.
-- Instead, focus on budgeting, spending control, emergency funds, saving habits, and general advice.
-- Highlight risky behaviours gently (e.g. overspending, negative cashflow).
-- Keep answers short and clear (3–6 short paragraphs or bullet points).
-- If something is uncertain because the data is missing, say so.
-- Always remind that this is not professional financial advice.
-"""
-
-    user_prompt = f"""
-Here is my analytics summary:
-
-{analytics_text}
-
-Now my question is:
-{message}
-"""
+    conversation = open_conversation(user, request.POST.get("conversation"), months)
+
+    # 1) Analytics snapshot, frozen on the conversation (stable prompt prefix);
+    #    rebuilt only when stale, so follow-up turns skip the analytics work
+    analytics = anomalies = None
+    if snapshot_is_stale(conversation, months):
+        analytics = build_advanced_analytics(user, months=months)
+        anomalies = recent_anomalies(user, since=date.today() - timedelta(days=30 * months))
+        set_snapshot(conversation, analytics_summary(user, analytics, anomalies, months), months)
+
+    # 2) Older turns folded into the running summary under the token budget
+    recent = compact(conversation)
+    prompt = build_messages(conversation, SYSTEM_PROMPT, recent, message)
+
+    # What-if questions: per-category forecasts fitted here (request thread,
+    # DB access); the what_if tool only rescales them inside ask_llm
+    scenario_base = category_forecasts(user, months=months) if detect_intent(message) == "what_if" else None
+
+    def ask_llm():
+        llm = client.with_options(timeout=ASSISTANT_TIMEOUT, max_retries=0)
+        options = {"tools": [scenario_tool(scenario_base)]} if scenario_base else {}
+        messages = prompt
+        usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        for _ in range(2):  # at most one tool round trip
+            completion = llm.chat.completions.create(
+                model="gpt-4o-mini",   # or other model
+                temperature=0.3,
+                max_tokens=400,
+                messages=messages,
+                **options,
+            )
+            if completion.usage:
+                details = getattr(completion.usage, "prompt_tokens_details", None)
+                usage["prompt_tokens"] += completion.usage.prompt_tokens
+                usage["cached_tokens"] += getattr(details, "cached_tokens", None) or 0
+                usage["completion_tokens"] += completion.usage.completion_tokens
+            reply = completion.choices[0].message
+            if not getattr(reply, "tool_calls", None):
+                break
+            messages = messages + tool_messages(scenario_base, reply)
+            options = {}
+        return (reply.content or "").strip(), usage
+
+    # 3) Bounded concurrency + deadline + circuit breaker; refused / failed
+    #    calls get a deterministic answer from the same numbers
+    result, reason = assistant_gate.call(user.pk, ask_llm)
+    answer, usage = result or (None, None)
+    record_turn(conversation, "user", message)
+    if answer:
+        record_turn(conversation, "assistant", answer, source="ai", usage=usage)
+        return JsonResponse({"answer": answer, "source": "ai", "conversation": conversation.pk, "usage": usage})
+
+    if analytics is None:
+        analytics = build_advanced_analytics(user, months=months)
+        anomalies = recent_anomalies(user, since=date.today() - timedelta(days=30 * months))
+    answer = local_answer(message, analytics, anomalies, months, scenario_base)
+    record_turn(conversation, "assistant", answer, source="local")
+    return JsonResponse({
+        "answer": answer,
+        "source": "local",
+        "reason": reason or "empty",
+        "conversation": conversation.pk,
+    })
+
+
+@staff_member_required
+def metrics_api(request):
+    """
+    GET: runtime metrics for operators (staff only).
+    Returns: { db_pools: { alias: {checkouts, waits, in_use, idle, ...} },
+               assistant: {calls, timeouts, busy, rate_limited, circuit_open, breaker, ...} }
+    """
+    return JsonResponse({"db_pools": pool_stats(), "assistant": assistant_stats()})
+
+
+@login_required
+def timeseries_api(request):
+    """
+    GET: ?metric=sum|count|avg|net &granularity=day|week|month|year
+         &start=YYYY-MM-DD &end=YYYY-MM-DD (default: last 6 months)
+         &account=<id> &category=<id> &type=income|expense
+         &tag=<name> (repeatable) &match=all|any (default all)
+    Returns: { metric, granularity, start, end, buckets, labels, values } OR { error: "..." }
+    """
+    today = date.today()
+    try:
+        end = date.fromisoformat(request.GET["end"]) if request.GET.get("end") else today
+        start = (
+            date.fromisoformat(request.GET["start"])
+            if request.GET.get("start")
+            else end - timedelta(days=183)
+        )
+    except ValueError:
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD."}, status=400)
+
+    tx_type = (request.GET.get("type") or "").strip().lower() or None
+    if tx_type not in (None, "income", "expense"):
+        return JsonResponse({"error": "Type must be income or expense."}, status=400)
+
+    account = request.GET.get("account") or None
+    category = request.GET.get("category") or None
+    if (account and not account.isdigit()) or (category and not category.isdigit()):
+        return JsonResponse({"error": "Account and category must be ids."}, status=400)
+    tags = [t.strip().lower() for t in request.GET.getlist("tag") if t.strip()]
+
+    try:
+        series = time_series(
+            request.user,
+            start,
+            end,
+            metric=(request.GET.get("metric") or "sum").strip().lower(),
+            granularity=(request.GET.get("granularity") or "day").strip().lower(),
+            account=account,
+            category=category,
+            tx_type=tx_type,
+            tags=tags,
+            match=(request.GET.get("match") or "all").strip().lower(),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(series)
+
+
+@login_required
+def projection_api(request):
+    """
+    GET: ?years=1..5 &paths=<100-50000, default 10000> &goal=<RM, optional>
+    Returns: { start_balance, labels, bands: {p5..p95}, final, goal, ... }
+             OR { error: "..." }
+    """
+    try:
+        years = int(request.GET.get("years") or 1)
+        paths = int(request.GET.get("paths") or DEFAULT_PATHS)
+        goal = Decimal(request.GET["goal"]) if request.GET.get("goal") else None
+    except (ValueError, ArithmeticError):
+        return JsonResponse({"error": "Years and paths must be whole numbers, goal an amount."}, status=400)
+    if goal is not None and not goal.is_finite():
+        return JsonResponse({"error": "Goal must be an amount."}, status=400)
 
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",   # or other model
-            temperature=0.3,
-            max_tokens=400,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+        result = project(request.user, years=years, paths=paths, goal=goal)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if result is None:
+        return JsonResponse(
+            {"error": f"At least {MIN_HISTORY_DAYS} days of history are needed for a projection."},
+            status=400,
         )
-        answer = completion.choices[0].message.content.strip()
-        return JsonResponse({"answer": answer})
-    except Exception as e:
-        return JsonResponse({"error": f"AI error: {e}"}, status=500)
\ No newline at end of file
+    return JsonResponse(result)
+
+
+@login_required
+def scenario_api(request):
+    """
+    GET: ?months=<history, default 6> &change=<category_id>:<percent> (repeatable,
+         e.g. change=12:-20 for a 20% cut)
+    Returns: { start_balance, income, categories: [{id, name, monthly, 30, 90}],
+               baseline, scenario, saved, changed } OR { error: "..." }
+    """
+    try:
+        months = int(request.GET.get("months") or 6)
+        changes = {}
+        for item in request.GET.getlist("change"):
+            cat_id, percent = item.split(":")
+            changes[int(cat_id)] = float(percent)
+    except ValueError:
+        return JsonResponse({"error": "Changes look like change=<category id>:<percent>."}, status=400)
+    if not 1 <= months <= 24:
+        return JsonResponse({"error": "Months must be between 1 and 24."}, status=400)
+
+    base = category_forecasts(request.user, months=months)
+    if base is None:
+        return JsonResponse(
+            {"error": f"At least {SCENARIO_MIN_DAYS} days of history are needed for a scenario."},
+            status=400,
+        )
+    try:
+        result = apply_scenario(base, changes)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({**base, **result, "changed": result["categories"], "categories": base["categories"]})
+
+
+@login_required
+def events_api(request):
+    """
+    GET (text/event-stream): live events of the logged-in user.
+      event: ready         data: { last }   (newest alert id, to resume from)
+      event: budget_alert  data: { id, budget, category, month, threshold, spent, amount }
+      event: dashboard     data: { accounts, month, daily, monthly, budgets }   (changed values only)
+    ?last=<alert id> (or the Last-Event-ID header) replays the alerts after it first;
+    alerts raised by other worker processes arrive through the stream's poll.
+    """
+    user = request.user
+    last = (request.headers.get("Last-Event-ID") or request.GET.get("last") or "").strip()
+
+    resume_from = 0  # alert id the page is at once caught up; polls start after it
+
+    # Both run after the middleware returned (in the stream): pin the shard here
+    def catch_up():
+        nonlocal resume_from
+        with use_shard_for(user.pk):
+            missed = alerts_after(user, int(last)) if last.isdigit() else []
+            newest = BudgetAlert.objects.filter(user=user).order_by("-id").values_list("id", flat=True).first()
+        resume_from = int(last) if last.isdigit() else newest or 0
+        yield "ready", {"last": newest or 0}, None
+        for alert in missed:
+            yield "budget_alert", alert_payload(alert), alert.pk
+
+    def poll(seen):
+        with use_shard_for(user.pk):
+            alerts = alerts_after(user, max(seen, resume_from))
+        return [("budget_alert", alert_payload(alert), alert.pk) for alert in alerts]
+
+    # Under ASGI the stream waits on the event loop (no thread per open page)
+    stream = aevent_stream if isinstance(request, ASGIRequest) else event_stream
+    response = StreamingHttpResponse(stream(user.pk, catch_up, poll), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: do not buffer the stream
+    return response
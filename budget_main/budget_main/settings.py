@@ -52,10 +52,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'budget_core.middleware.StaticCacheControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'budget_core.middleware.UserShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,9 +93,36 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD", ""),
         "HOST": os.environ.get("DB_HOST"),
         "PORT": os.environ.get("DB_PORT"),
+        # Persistent connections for the stock backends (seconds, 0 = per request)
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
+        # Used by the pooled backends (ENGINE=budget_core.db.backends.mysql / .sqlite3)
+        "POOL": {
+            "MIN_SIZE": int(os.environ.get("DB_POOL_MIN_SIZE", 0)),
+            "MAX_SIZE": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "MAX_LIFETIME": int(os.environ.get("DB_POOL_MAX_LIFETIME", 1800)),
+            "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        },
     },
 }
 
+# User shards (optional), e.g. DB_SHARDS="shard_a,shard_b"
+# Each shard reuses the default connection settings with its own database name
+# (DB_SHARD_<ALIAS>_NAME, defaults to "<DB_NAME>_<alias>"), so a local/test setup
+# with several SQLite shards only needs DB_ENGINE=sqlite3 + DB_SHARDS.
+DATABASE_SHARDS = [a.strip() for a in os.environ.get("DB_SHARDS", "").split(",") if a.strip()]
+
+for _alias in DATABASE_SHARDS:
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        "NAME": os.environ.get(
+            f"DB_SHARD_{_alias.upper()}_NAME",
+            f"{DATABASES['default']['NAME']}_{_alias}",
+        ),
+    }
+
+DATABASE_ROUTERS = ['budget_core.routers.UserShardRouter']
+
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
 # Password validation
@@ -136,9 +165,42 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# `collectstatic` output; file names get a content hash (css/app.3f2a….css)
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"},
+}
+
+# Hashed files never change: cache them for a year (see StaticCacheControlMiddleware)
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", 60 * 60 * 24 * 365))
+
+# Serve STATIC_ROOT from Django itself (single-host / offline installs without a web server)
+SERVE_STATIC = os.environ.get("SERVE_STATIC", "0") == "1"
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Fragment cache versions, forecast states and the user -> shard map live in
+# the cache. The default (local memory) is per process: with several worker
+# processes, point all of them at one shared cache, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    },
+}
+
+# Server-sent events go through an in-process broker: with several worker
+# processes, each open stream polls the alerts table this often (seconds) to
+# pick up alerts raised by other workers. 0 turns polling off (single worker).
+EVENTS_POLL_SECONDS = int(os.environ.get("EVENTS_POLL_SECONDS", 15))
+
+# Per-user columnar transaction snapshots used by the analytics service
+ANALYTICS_SNAPSHOT_DIR = Path(os.environ.get("ANALYTICS_SNAPSHOT_DIR", BASE_DIR / "var" / "snapshots"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BudgetManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'budget_management'
+
+    def ready(self):
+        from budget_management import signals  # noqa: F401
@@ -0,0 +1,226 @@
+# budget_management/batch_service.py
+
+from collections import defaultdict, deque
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from budget_core import sharding
+from budget_core.models import Account, Category, StatementLine, Transaction, TransactionTag
+from budget_core.signals import transactions_created, transactions_deleted, transactions_updated
+from budget_dashboard.models import SpendingAnomaly
+from budget_management.categorizer import categorize_many
+
+MAX_BATCH = 1000
+MAX_AMOUNT = Decimal("9999999999.99")  # Transaction.amount: 12 digits, 2 decimals
+
+# Columns used to find bulk-inserted rows again when the backend returns no ids
+IDENTITY = ("account_id", "category_id", "type", "amount", "date", "note")
+
+
+def _parse(item):
+    """
+    Validate one item's fields (ownership is checked later, in bulk).
+    Returns (Transaction, None) or (None, error message).
+    """
+    if not isinstance(item, dict):
+        return None, "Each item must be an object."
+
+    account_id = item.get("account")
+    category_id = item.get("category") or None
+    if not isinstance(account_id, int) or isinstance(account_id, bool):
+        return None, "Account must be an id."
+    if category_id is not None and (not isinstance(category_id, int) or isinstance(category_id, bool)):
+        return None, "Category must be an id."
+
+    tx_type = str(item.get("type") or "").strip().lower()
+    if tx_type not in ("income", "expense"):
+        return None, "Type must be income or expense."
+
+    try:
+        amount = Decimal(str(item.get("amount")))
+    except InvalidOperation:
+        return None, "Invalid amount format."
+    if not amount.is_finite() or amount <= 0:
+        return None, "Amount must be greater than zero."
+    if amount > MAX_AMOUNT or amount != amount.quantize(Decimal("0.01")):
+        return None, "Amount must have at most 10 digits and 2 decimals."
+
+    try:
+        tx_date = date.fromisoformat(str(item.get("date") or ""))
+    except ValueError:
+        return None, "Invalid date format."
+
+    note = item.get("note") or ""
+    if not isinstance(note, str) or len(note.strip()) > 255:
+        return None, "Note must be text of at most 255 characters."
+
+    return Transaction(
+        account_id=account_id,
+        category_id=category_id,
+        type=tx_type,
+        amount=amount,
+        date=tx_date,
+        note=note.strip(),
+    ), None
+
+
+def _identity(values):
+    return tuple(values[f] for f in IDENTITY)
+
+
+def _fill_ids(user, rows, since):
+    # MySQL's bulk INSERT returns no ids: read the user's new rows back in id
+    # order and pair them with the batch by content
+    pending = defaultdict(deque)
+    for t in rows:
+        pending[_identity(vars(t))].append(t)
+    new_rows = (
+        Transaction.objects.filter(user=user, created_at__gte=since)
+        .order_by("id")
+        .values("id", *IDENTITY)
+    )
+    for values in new_rows:
+        queue = pending.get(_identity(values))
+        if queue:
+            queue.popleft().pk = values["id"]
+
+
+def create_transactions(user, items):
+    """
+    Validate and insert a batch of transactions for `user`.
+
+    Field checks run per item; account and category ownership is checked
+    with one query each; items without a category go through the user's
+    rules in one pass. Valid rows are inserted with one bulk_create inside
+    one atomic block, then announced through `transactions_created`
+    (caches, change log, forecaster, anomaly flags).
+
+    Returns one result per item, in order:
+      {index, status: "created", id, category, unusual} or {index, status: "error", error}
+    """
+    results = [None] * len(items)
+    parsed = []
+    for index, item in enumerate(items):
+        tx, error = _parse(item)
+        if error:
+            results[index] = {"index": index, "status": "error", "error": error}
+        else:
+            tx.user = user
+            parsed.append((index, tx))
+
+    categorize_many(user, [tx for _, tx in parsed])  # unmatched rows keep category None
+
+    account_ids = set(
+        Account.objects.filter(user=user, pk__in={tx.account_id for _, tx in parsed})
+        .values_list("pk", flat=True)
+    )
+    category_ids = set(
+        Category.objects.filter(user=user, pk__in={tx.category_id for _, tx in parsed if tx.category_id})
+        .values_list("pk", flat=True)
+    )
+
+    valid = []
+    for index, tx in parsed:
+        if tx.account_id not in account_ids:
+            error = "Account not found."
+        elif tx.category_id is None:
+            error = "No rule matched this transaction — please pick a category."
+        elif tx.category_id not in category_ids:
+            error = "Category not found."
+        else:
+            valid.append((index, tx))
+            continue
+        results[index] = {"index": index, "status": "error", "error": error}
+
+    rows = [tx for _, tx in valid]
+    unusual = set()
+    if rows:
+        since = timezone.now()
+        with sharding.atomic(user.pk):
+            Transaction.objects.bulk_create(rows, batch_size=500)
+            if rows[0].pk is None:
+                _fill_ids(user, rows, since)
+            transactions_created.send(sender=Transaction, user_id=user.pk, transactions=rows)
+        # Scored by the transactions_created receiver
+        unusual = set(
+            SpendingAnomaly.objects.filter(transaction_id__in=[tx.pk for tx in rows])
+            .values_list("transaction_id", flat=True)
+        )
+
+    for index, tx in valid:
+        results[index] = {
+            "index": index,
+            "status": "created",
+            "id": tx.pk,
+            "category": tx.category_id,
+            "unusual": tx.pk in unusual,
+        }
+    return results
+
+
+# ─── Set-based edits ──────────────────────────────────────────────────────────
+# Columns the bulk signals need (months, accounts, forecaster day totals, budget counters)
+FOOTPRINT = ("id", "type", "date", "account_id", "category_id", "amount")
+
+
+def _lock_selection(user, ids):
+    """
+    Lock the user's rows among `ids` and read their footprint in one query.
+    """
+    return list(
+        Transaction.objects.select_for_update()
+        .filter(user=user, pk__in=ids)
+        .order_by()
+        .values(*FOOTPRINT)
+    )
+
+
+def update_transactions(user, ids, category=None, account=None):
+    """
+    Recategorize and / or move the selected transactions with one UPDATE.
+    With a category, only rows of the same type (income / expense) change.
+    Returns the number of rows updated.
+    """
+    changes = {}
+    if category is not None:
+        changes["category_id"] = category.pk
+    if account is not None:
+        changes["account_id"] = account.pk
+    if not changes:
+        return 0
+
+    with sharding.atomic(user.pk):
+        rows = _lock_selection(user, ids)
+        if category is not None:
+            rows = [r for r in rows if r["type"] == category.type]
+        if not rows:
+            return 0
+        row_ids = [r["id"] for r in rows]
+        updated = Transaction.objects.filter(pk__in=row_ids).update(**changes)
+        if category is not None:
+            SpendingAnomaly.objects.filter(transaction_id__in=row_ids).update(category_id=category.pk)
+        transactions_updated.send(sender=Transaction, user_id=user.pk, rows=rows, changes=changes)
+    return updated
+
+
+def delete_transactions(user, ids):
+    """
+    Delete the selected transactions with one DELETE (plus their anomaly
+    flags and tag links; reconciled statement lines become unmatched).
+    Returns the number of rows deleted.
+    """
+    with sharding.atomic(user.pk):
+        rows = _lock_selection(user, ids)
+        if not rows:
+            return 0
+        row_ids = [r["id"] for r in rows]
+        SpendingAnomaly.objects.filter(transaction_id__in=row_ids).delete()
+        TransactionTag.objects.filter(transaction_id__in=row_ids).delete()
+        StatementLine.objects.filter(transaction_id__in=row_ids).update(transaction=None, match="")
+        # Raw delete: no per-row collector / post_delete, the bulk signal covers them
+        selected = Transaction.objects.filter(pk__in=row_ids)
+        deleted = selected._raw_delete(selected.db)
+        transactions_deleted.send(sender=Transaction, user_id=user.pk, rows=rows)
+    return deleted
@@ -0,0 +1,312 @@
+# budget_management/categorizer.py
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from decimal import Decimal
+from operator import itemgetter
+
+from django.core.cache import cache
+
+from budget_core.models import CategoryRule
+
+try:  # Python 3.11+
+    from re import _constants, _parser
+except ImportError:
+    import sre_constants as _constants
+    import sre_parse as _parser
+
+_LITERAL = _constants.LITERAL
+INFINITY = Decimal("Infinity")
+MAX_CACHED_USERS = 256
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over lower-cased keywords.
+
+    Every node stores the best (lowest) value reachable through its output /
+    fail chain, so `best_match()` is a single pass over the text whatever the
+    number of keywords. `all_matches()` walks output links instead and
+    returns every value whose keyword occurs in the text.
+    """
+
+    def __init__(self, keywords):
+        # keywords: iterable of (keyword, value); values compare by rule key
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [None]
+        self.out = [[]]
+        self.link = [0]  # nearest node on the fail chain with own outputs
+
+        for word, value in keywords:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                    self.out.append([])
+                    self.link.append(0)
+                node = nxt
+            self.out[node].append(value)
+            if self.best[node] is None or value < self.best[node]:
+                self.best[node] = value
+
+        # BFS: fail links + merge outputs along the fail chain
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                fail = self.fail[nxt] = target if target != nxt else 0
+                self.link[nxt] = fail if self.out[fail] else self.link[fail]
+                inherited = self.best[fail]
+                if inherited is not None and (self.best[nxt] is None or inherited < self.best[nxt]):
+                    self.best[nxt] = inherited
+
+    def _states(self, text):
+        goto, fail = self.goto, self.fail
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            yield state
+
+    def best_match(self, text):
+        best_at = self.best
+        best = None
+        for state in self._states(text):
+            hit = best_at[state]
+            if hit is not None and (best is None or hit < best):
+                best = hit
+        return best
+
+    def all_matches(self, text):
+        out, link = self.out, self.link
+        found = set()
+        for state in self._states(text):
+            node = state if out[state] else link[state]
+            while node:
+                found.update(out[node])
+                node = link[node]
+        return found
+
+
+def _required_literal(pattern):
+    """
+    Longest literal run every match of `pattern` must contain (lower-cased),
+    or "" when there is none (top-level alternation, only classes, ...).
+    """
+    try:
+        parsed = _parser.parse(pattern)
+    except re.error:
+        return ""
+    best, run = "", []
+    for op, arg in list(parsed) + [(None, None)]:
+        if op is _LITERAL:
+            run.append(chr(arg))
+            continue
+        if len(run) > len(best):
+            best = "".join(run)
+        run = []
+    return best.lower()
+
+
+class RegexMatcher:
+    """
+    Regex rules behind a literal prefilter: the longest literal each pattern
+    requires goes into one Aho-Corasick automaton, so a note only runs the
+    regexes whose literal it contains (patterns without one always run).
+    Candidates are tried in rule-key order; the first hit is the best.
+    """
+
+    def __init__(self, patterns):
+        literals = []
+        self.always = []
+        for pattern, key in patterns:
+            try:
+                regex = re.compile(pattern, re.IGNORECASE)
+            except re.error:
+                continue  # invalid patterns are rejected on save; skip leftovers
+            literal = _required_literal(pattern)
+            if literal:
+                literals.append((literal, (key, regex)))
+            else:
+                self.always.append((key, regex))
+        self.prefilter = KeywordAutomaton(literals)
+
+    def best_match(self, text):
+        candidates = self.prefilter.all_matches(text.lower())
+        candidates.update(self.always)
+        for key, regex in sorted(candidates, key=itemgetter(0)):
+            if regex.search(text):
+                return key
+        return None
+
+
+class AmountIndex:
+    """
+    Amount-range rules flattened into sorted boundaries; the best rule of
+    every elementary segment is precomputed, so a lookup is one bisect.
+    """
+
+    def __init__(self, ranges):
+        # ranges: iterable of (low, high, rule_key), bounds inclusive
+        ranges = list(ranges)
+        self.points = sorted({b for low, high, _ in ranges for b in (low, high)})
+        # segment 2*i = exactly points[i], 2*i+1 = open gap after points[i], -1 = before all
+        probes = []
+        if self.points:
+            probes.append((-1, self.points[0] - 1))
+            probes.append((2 * len(self.points) - 1, self.points[-1] + 1))
+        for i, point in enumerate(self.points):
+            probes.append((2 * i, point))
+            if i + 1 < len(self.points):
+                probes.append((2 * i + 1, (point + self.points[i + 1]) / 2))
+
+        self.segments = {}
+        for seg, value in probes:
+            best = None
+            for low, high, key in ranges:
+                if low <= value <= high and (best is None or key < best):
+                    best = key
+            self.segments[seg] = best
+
+    def best_match(self, amount):
+        if amount is None or not self.points:
+            return None
+        i = bisect_left(self.points, amount)
+        if i < len(self.points) and self.points[i] == amount:
+            return self.segments.get(2 * i)
+        return self.segments.get(2 * i - 1)
+
+
+class RuleSet:
+    """
+    Compiled rules of one user, split by category type so an expense never
+    gets an income category (type=None searches all rules).
+    """
+
+    def __init__(self, rules):
+        self.engines = {}
+        by_type = {}
+        for rule in rules:
+            by_type.setdefault(rule.category.type, []).append(rule)
+            by_type.setdefault(None, []).append(rule)
+
+        for tx_type, type_rules in by_type.items():
+            keywords, patterns, ranges = [], [], []
+            for rule in type_rules:
+                key = (rule.priority, rule.pk, rule.category_id)
+                if rule.kind == "keyword" and rule.pattern.strip():
+                    keywords.append((rule.pattern.strip().lower(), key))
+                elif rule.kind == "regex" and rule.pattern:
+                    patterns.append((rule.pattern, key))
+                elif rule.kind == "amount":
+                    low = rule.min_amount if rule.min_amount is not None else -INFINITY
+                    high = rule.max_amount if rule.max_amount is not None else INFINITY
+                    ranges.append((low, high, key))
+            self.engines[tx_type] = (
+                KeywordAutomaton(keywords),
+                RegexMatcher(patterns),
+                AmountIndex(ranges),
+            )
+
+    def match(self, note, amount=None, tx_type=None):
+        """
+        Return the category_id of the best matching rule, or None.
+        """
+        engines = self.engines.get(tx_type)
+        if engines is None:
+            return None
+        keywords, regexes, amounts = engines
+        text = (note or "").lower()
+        hits = [
+            keywords.best_match(text),
+            regexes.best_match(note or ""),
+            amounts.best_match(amount),
+        ]
+        hits = [h for h in hits if h is not None]
+        return min(hits)[2] if hits else None
+
+
+# ── Per-user cache (process-local, invalidated through a cache version) ─────
+# The version is an opaque token replaced on every change (as in
+# budget_core/cache_versions.py): a counter evicted from the cache would
+# restart at a value a process may still hold with stale rules.
+_rule_sets = OrderedDict()
+_rule_sets_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f"category-rules-version:{user_id}"
+
+
+def _new_token():
+    return str(time.time_ns())
+
+
+def invalidate_rules(user_id):
+    cache.set(_version_key(user_id), _new_token(), None)
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        token = _new_token()
+        version = token if cache.add(key, token, None) else cache.get(key, token)
+    return version
+
+
+def get_rule_set(user):
+    version = _version(user.pk)
+    with _rule_sets_lock:
+        cached = _rule_sets.get(user.pk)
+        if cached is not None and cached[0] == version:
+            _rule_sets.move_to_end(user.pk)
+            return cached[1]
+
+    rules = CategoryRule.objects.filter(user=user).select_related("category")
+    rule_set = RuleSet(rules)
+
+    with _rule_sets_lock:
+        _rule_sets[user.pk] = (version, rule_set)
+        _rule_sets.move_to_end(user.pk)
+        while len(_rule_sets) > MAX_CACHED_USERS:
+            _rule_sets.popitem(last=False)
+    return rule_set
+
+
+def categorize(user, note, amount=None, tx_type=None):
+    """
+    Category id suggested by the user's rules for one transaction, or None.
+    """
+    return get_rule_set(user).match(note, amount, tx_type)
+
+
+def categorize_many(user, transactions):
+    """
+    Fill `category_id` on uncategorized rows of an import in one pass,
+    compiling the user's rules once. Returns the rows left without a match.
+    """
+    rule_set = get_rule_set(user)
+    unmatched = []
+    for t in transactions:
+        if t.category_id:
+            continue
+        t.category_id = rule_set.match(t.note, t.amount, t.type)
+        if t.category_id is None:
+            unmatched.append(t)
+    return unmatched
@@ -0,0 +1,106 @@
+# budget_management/management/commands/bench_transaction_list.py
+
+import random
+from contextlib import ExitStack
+from datetime import date, timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from budget_core.models import Account, Category, Transaction
+from budget_core.sharding import DIRECTORY_DB, get_shard_aliases, shard_for_user, use_shard_for
+from budget_management.views import account_list, transaction_list
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark transaction_list / account_list rendering with fragment caching: "
+        "cold, warm, and after one new transaction. Runs on a throwaway user inside "
+        "a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--months", type=int, default=24)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        try:
+            with ExitStack() as stack:
+                # One transaction per database: the user row, its shard mirror
+                # and every benchmark row are rolled back
+                for alias in dict.fromkeys([DIRECTORY_DB, *get_shard_aliases()]):
+                    stack.enter_context(transaction.atomic(using=alias))
+                user = User.objects.create_user(f"bench-{random.getrandbits(32):08x}")
+                with use_shard_for(user.pk):
+                    self._run(user, opts)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, user, opts):
+        accounts = [Account.objects.create(user=user, name=f"Account {i}", balance=0) for i in range(3)]
+        categories = [
+            Category.objects.create(user=user, name=f"Category {i}", type=("income" if i == 0 else "expense"))
+            for i in range(8)
+        ]
+        today = date.today()
+        days = opts["months"] * 30
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    user=user,
+                    account=random.choice(accounts),
+                    category=(category := random.choice(categories)),
+                    type=category.type,
+                    amount=Decimal(random.randint(100, 50000)) / 100,
+                    date=today - timedelta(days=random.randrange(days)),
+                    note=f"bench row {i}",
+                )
+                for i in range(opts["rows"])
+            ],
+            batch_size=2000,
+        )
+        self.stdout.write(f"{opts['rows']} transaction(s) over {opts['months']} month(s)")
+
+        factory = RequestFactory()
+
+        def render(view, path):
+            request = factory.get(path)
+            request.user = user
+            with CaptureQueriesContext(connections[shard_for_user(user.pk)]) as ctx:
+                started = perf_counter()
+                response = view(request)
+                elapsed = perf_counter() - started
+            return elapsed, len(ctx.captured_queries), len(response.content)
+
+        for name, view, path in (
+            ("transaction_list", transaction_list, "/Managements/Manage-Transactions/"),
+            ("account_list", account_list, "/Managements/Manage-Accounts"),
+        ):
+            cold = render(view, path)
+            warm = min(render(view, path) for _ in range(opts["repeat"]))
+
+            # One new row: only its month group and account card re-render
+            Transaction.objects.create(
+                user=user, account=accounts[0], category=categories[1], type="expense",
+                amount=Decimal("12.34"), date=today, note="bench new row",
+            )
+            after_write = render(view, path)
+
+            for label, (elapsed, queries, size) in (
+                ("cold", cold), ("warm", warm), ("after 1 write", after_write),
+            ):
+                self.stdout.write(
+                    f"  {name:<16} {label:<14} {elapsed * 1000:8.1f} ms  {queries:3d} queries  {size // 1024} KiB"
+                )
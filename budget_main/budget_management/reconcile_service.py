@@ -0,0 +1,314 @@
+# budget_management/reconcile_service.py
+
+import csv
+import io
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from budget_core import sharding
+from budget_core.cache_versions import bump_months, month_key
+from budget_core.models import Account, Statement, StatementLine, Transaction
+
+MAX_LINES = 20000
+MAX_TOLERANCE = 10  # days
+REPORT_ROWS = 200   # rows shown per report section (counts are always complete)
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d %b %Y", "%d %B %Y")
+
+# Accepted CSV headers (lower-cased) per field
+DATE_HEADERS = ("date", "transaction date", "posting date", "value date")
+DESCRIPTION_HEADERS = ("description", "details", "narrative", "note", "reference")
+AMOUNT_HEADERS = ("amount",)
+DEBIT_HEADERS = ("debit", "withdrawal", "money out")
+CREDIT_HEADERS = ("credit", "deposit", "money in")
+
+
+# ─── CSV parsing ──────────────────────────────────────────────────────────────
+def _column(header, names):
+    for i, h in enumerate(header):
+        if h in names:
+            return i
+    return None
+
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unknown date '{value}'")
+
+
+def _parse_amount(value):
+    text = value.replace(",", "").replace("RM", "").strip()
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()").strip()
+    if not text:
+        return Decimal("0")
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount '{value}'")
+    if not amount.is_finite():
+        raise ValueError(f"invalid amount '{value}'")
+    return -amount if negative else amount
+
+
+def parse_statement(data):
+    """
+    Parse a statement CSV (bytes or text) into [(date, description, amount)]
+    with signed amounts: credits positive, debits negative. Accepts a single
+    signed `amount` column or separate debit / credit columns.
+    Raises ValueError with the offending line number.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig", errors="replace")
+    reader = csv.reader(io.StringIO(data))
+    header = [h.strip().lower() for h in next(reader, [])]
+
+    date_col = _column(header, DATE_HEADERS)
+    desc_col = _column(header, DESCRIPTION_HEADERS)
+    amount_col = _column(header, AMOUNT_HEADERS)
+    debit_col = _column(header, DEBIT_HEADERS)
+    credit_col = _column(header, CREDIT_HEADERS)
+    if date_col is None or (amount_col is None and debit_col is None and credit_col is None):
+        raise ValueError("The CSV needs a date column and an amount (or debit / credit) column.")
+
+    def cell(row, col):
+        return row[col].strip() if col is not None and col < len(row) else ""
+
+    lines = []
+    for number, row in enumerate(reader, start=2):
+        if not any(c.strip() for c in row):
+            continue
+        try:
+            d = _parse_date(cell(row, date_col))
+            if amount_col is not None:
+                amount = _parse_amount(cell(row, amount_col))
+            else:
+                amount = _parse_amount(cell(row, credit_col)) - _parse_amount(cell(row, debit_col))
+        except ValueError as exc:
+            raise ValueError(f"Line {number}: {exc}.")
+        if amount:
+            lines.append((d, cell(row, desc_col)[:255], amount.quantize(Decimal("0.01"))))
+        if len(lines) > MAX_LINES:
+            raise ValueError(f"At most {MAX_LINES} lines per statement.")
+    if not lines:
+        raise ValueError("No statement lines found.")
+    return lines
+
+
+# ─── Matching ─────────────────────────────────────────────────────────────────
+def match_lines(lines, candidates, tolerance_days):
+    """
+    Pair statement lines with transactions of the same signed amount.
+
+    `lines`: [(line_id, date, cents)]; `candidates`: [(tx_id, date, cents)].
+    Pass 1 joins on (cents, date) through a hash index; pass 2 looks up the
+    leftover lines in per-amount date-sorted lists with bisect and takes the
+    closest unused transaction within `tolerance_days` (earlier id on ties).
+    Each transaction is used once. O((lines + candidates) log candidates).
+
+    Returns (exact, fuzzy, unmatched_line_ids, unused_tx_ids), where exact /
+    fuzzy are [(line_id, tx_id)].
+    """
+    exact_index = defaultdict(deque)
+    by_amount = defaultdict(list)
+    for tx_id, d, cents in sorted(candidates, key=lambda c: (c[1], c[0])):
+        exact_index[(cents, d)].append(tx_id)
+        by_amount[cents].append((d.toordinal(), tx_id))
+
+    used = set()
+    exact, leftover = [], []
+    for line_id, d, cents in sorted(lines, key=lambda l: (l[1], l[0])):
+        queue = exact_index.get((cents, d))
+        if queue:
+            tx_id = queue.popleft()
+            used.add(tx_id)
+            exact.append((line_id, tx_id))
+        else:
+            leftover.append((line_id, d, cents))
+
+    ordinals = {cents: [o for o, _ in rows] for cents, rows in by_amount.items()}
+    fuzzy, unmatched = [], []
+    for line_id, d, cents in leftover:
+        rows = by_amount.get(cents)
+        best = None
+        if rows:
+            day = d.toordinal()
+            keys = ordinals[cents]
+            lo = bisect_left(keys, day - tolerance_days)
+            hi = bisect_right(keys, day + tolerance_days)
+            for ordinal, tx_id in rows[lo:hi]:
+                if tx_id in used:
+                    continue
+                rank = (abs(ordinal - day), tx_id)
+                if best is None or rank < best[0]:
+                    best = (rank, tx_id)
+        if best is None:
+            unmatched.append(line_id)
+        else:
+            used.add(best[1])
+            fuzzy.append((line_id, best[1]))
+
+    unused = [tx_id for tx_id, _, _ in candidates if tx_id not in used]
+    return exact, fuzzy, unmatched, unused
+
+
+def _cents(amount):
+    return int(amount * 100)
+
+
+# Transaction types that are credits on the statement (everything else is a debit)
+CREDIT_TYPES = ("income", "in-transfer")
+
+# Amounts per candidate query (stays under SQLite's bound-parameter limit)
+AMOUNT_CHUNK = 900
+
+
+def _candidates(user_id, account_id, lines, tolerance):
+    """
+    Unreconciled transactions of the account that could match `lines`:
+    same absolute amount (money_tx_account_amount index) and a date within
+    the lines' range +- tolerance. Returns [(tx_id, date, signed cents)],
+    money in (income, incoming transfers) positive like a statement credit.
+    """
+    start = min(line.date for line in lines) - tolerance
+    end = max(line.date for line in lines) + tolerance
+    amounts = sorted({abs(line.amount) for line in lines})
+    candidates = []
+    for i in range(0, len(amounts), AMOUNT_CHUNK):
+        rows = (
+            Transaction.objects.filter(
+                user_id=user_id,
+                account_id=account_id,
+                amount__in=amounts[i:i + AMOUNT_CHUNK],
+                date__range=[start, end],
+                statement_line__isnull=True,
+            )
+            .order_by()
+            .values_list("id", "date", "type", "amount")
+        )
+        for tx_id, d, tx_type, amount in rows:
+            cents = _cents(amount)
+            candidates.append((tx_id, d, cents if tx_type in CREDIT_TYPES else -cents))
+    return candidates
+
+
+def _match(user_id, account_id, lines, tolerance_days):
+    """
+    Set `transaction_id` / `match` on the lines that match (the StatementLine
+    objects may be unsaved). Returns (matched lines, counts, month keys of
+    the matched transactions).
+    """
+    candidates = _candidates(user_id, account_id, lines, timedelta(days=tolerance_days))
+    exact, fuzzy, unmatched, _ = match_lines(
+        [(i, line.date, _cents(line.amount)) for i, line in enumerate(lines)],
+        candidates,
+        tolerance_days,
+    )
+    dates = {tx_id: d for tx_id, d, _ in candidates}
+    matched = []
+    for kind, pairs in (("exact", exact), ("fuzzy", fuzzy)):
+        for i, tx_id in pairs:
+            line = lines[i]
+            line.transaction_id = tx_id
+            line.match = kind
+            matched.append(line)
+    counts = {"exact": len(exact), "fuzzy": len(fuzzy), "unmatched": len(unmatched)}
+    return matched, counts, {month_key(dates[line.transaction_id]) for line in matched}
+
+
+def reconcile(statement):
+    """
+    Match the statement's open lines against the account's transactions
+    that are not reconciled yet. Safe to run again after adding missing
+    transactions. Returns {"exact": n, "fuzzy": n, "unmatched": n} for this run.
+    """
+    with sharding.atomic(statement.user_id):
+        # One reconcile per account at a time (a transaction matches one line)
+        Account.objects.select_for_update().get(pk=statement.account_id)
+        lines = list(
+            StatementLine.objects.filter(statement=statement, transaction__isnull=True)
+            .only("id", "date", "amount")
+        )
+        if not lines:
+            return {"exact": 0, "fuzzy": 0, "unmatched": 0}
+        matched, counts, months = _match(statement.user_id, statement.account_id, lines, statement.tolerance_days)
+        StatementLine.objects.bulk_update(matched, ["transaction", "match"], batch_size=500)
+
+    # Transaction list month groups show the reconciled badge
+    bump_months(statement.user_id, months)
+    return counts
+
+
+def import_statement(user, account, lines, name="", tolerance_days=3):
+    """
+    Store parsed statement lines for `account`, matched before they are
+    inserted (one bulk_create, no per-line updates). Returns (statement, counts).
+    """
+    with sharding.atomic(user.pk):
+        Account.objects.select_for_update().get(pk=account.pk)
+        statement = Statement.objects.create(
+            user=user,
+            account=account,
+            name=name[:255],
+            start=min(d for d, _, _ in lines),
+            end=max(d for d, _, _ in lines),
+            tolerance_days=tolerance_days,
+        )
+        rows = [
+            StatementLine(user=user, statement=statement, date=d, description=description, amount=amount)
+            for d, description, amount in lines
+        ]
+        _, counts, months = _match(user.pk, account.pk, rows, tolerance_days)
+        StatementLine.objects.bulk_create(rows, batch_size=500)
+
+    bump_months(user.pk, months)
+    return statement, counts
+
+
+def delete_statement(statement):
+    """
+    Delete a statement; its matched transactions become unreconciled.
+    """
+    months = {
+        month_key(d)
+        for d in Transaction.objects.filter(statement_line__statement=statement).values_list("date", flat=True)
+    }
+    statement.delete()
+    bump_months(statement.user_id, months)
+
+
+# ─── Report ───────────────────────────────────────────────────────────────────
+def statement_report(statement, limit=REPORT_ROWS):
+    """
+    Exact / fuzzy matches, unmatched statement lines and the account's
+    unreconciled transactions inside the statement period. Each section:
+    {"count", "rows"} with at most `limit` rows.
+    """
+    lines = StatementLine.objects.filter(statement=statement)
+    matched = lines.filter(transaction__isnull=False).select_related("transaction__category")
+    missing = (
+        Transaction.objects.filter(
+            user_id=statement.user_id,
+            account_id=statement.account_id,
+            date__range=[statement.start, statement.end],
+            statement_line__isnull=True,
+        )
+        .select_related("category")
+        .order_by("date", "id")
+    )
+
+    def section(qs):
+        return {"count": qs.count(), "rows": list(qs[:limit])}
+
+    return {
+        "exact": section(matched.filter(match="exact")),
+        "fuzzy": section(matched.filter(match="fuzzy")),
+        "unmatched_lines": section(lines.filter(transaction__isnull=True)),
+        "unmatched_transactions": section(missing),
+    }
@@ -0,0 +1,16 @@
+# budget_management/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from budget_core.models import Category, CategoryRule
+from budget_management.categorizer import invalidate_rules
+
+
+@receiver(post_save, sender=CategoryRule)
+@receiver(post_delete, sender=CategoryRule)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def rules_changed(sender, instance, **kwargs):
+    # Compiled rule sets depend on the rules and on their categories' type
+    invalidate_rules(instance.user_id)
@@ -1,3 +1,358 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from budget_core.cache_versions import month_key, month_versions
+from budget_core.models import Account, Budget, Category, CategoryRule, ChangeLogEntry, StatementLine, Transaction
+from budget_core.sharding import shard_for_user, use_shard_for
+from budget_core.tags import set_tags
+from budget_dashboard.forecast_service import rebuild_user
+from budget_dashboard.models import BudgetSpend, ForecastState
+from budget_dashboard.snapshot_service import load_snapshot
+from budget_management.categorizer import AmountIndex, KeywordAutomaton, RegexMatcher, _required_literal, categorize, get_rule_set
+from budget_management.batch_service import create_transactions, delete_transactions, update_transactions
+from budget_management.reconcile_service import import_statement, reconcile
+
+
+# Pages render without a collectstatic manifest
+PLAIN_STATIC = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class ManagementTestCase(TestCase):
+    """
+    A user with one account and Food / Salary categories, pinned to their shard.
+    """
+
+    databases = "__all__"  # the user's shard, with DB_SHARDS set
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username="alice", password="p")
+        self.enterContext(use_shard_for(self.user.pk))  # as UserShardMiddleware does
+        self.account = Account.objects.create(user=self.user, name="Cash", balance=Decimal("1000"))
+        self.food = Category.objects.create(user=self.user, name="Food", type="expense")
+        self.salary = Category.objects.create(user=self.user, name="Salary", type="income")
+
+    def add(self, amount, d=None, note="", category=None, tx_type="expense"):
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=category or self.food, type=tx_type,
+            amount=Decimal(amount), date=d or date.today(), note=note,
+        )
+
+    def committed(self):
+        # Run what waits for the shard's commit (the test case never commits)
+        return self.captureOnCommitCallbacks(using=shard_for_user(self.user.pk), execute=True)
+
+
+# ─── Category rules ───────────────────────────────────────────────────────────
+class RuleFormTests(ManagementTestCase):
+    def post_rule(self, **amounts):
+        self.client.force_login(self.user)
+        return self.client.post(reverse("rules"), {"category": self.food.pk, "kind": "amount", **amounts})
+
+    def test_non_finite_amounts_are_rejected(self):
+        for value in ("NaN", "sNaN", "Infinity", "-inf"):
+            response = self.post_rule(min_amount=value, max_amount="10")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Invalid amount format.", [str(m) for m in get_messages(response.wsgi_request)])
+        self.assertFalse(CategoryRule.objects.filter(user=self.user).exists())
+
+    def test_amount_range_rule_is_created(self):
+        response = self.post_rule(min_amount="5", max_amount="10")
+        self.assertRedirects(response, reverse("rules"))
+        rule = CategoryRule.objects.get(user=self.user)
+        self.assertEqual((rule.min_amount, rule.max_amount), (Decimal("5"), Decimal("10")))
+
+
+# ─── Rule matching (categorizer) ──────────────────────────────────────────────
+class MatcherTests(SimpleTestCase):
+    def test_keyword_automaton_finds_overlapping_keywords(self):
+        automaton = KeywordAutomaton([("he", 3), ("she", 1), ("hers", 2), ("his", 4)])
+        self.assertEqual(automaton.all_matches("ushers"), {1, 2, 3})
+        self.assertEqual(automaton.best_match("ushers"), 1)
+        self.assertEqual(automaton.best_match("this"), 4)
+        self.assertIsNone(automaton.best_match("xyz"))
+        self.assertIsNone(KeywordAutomaton([]).best_match("anything"))
+
+    def test_required_literal(self):
+        self.assertEqual(_required_literal(r"GRAB\s*food"), "grab")
+        self.assertEqual(_required_literal(r"\d+ tng ewallet"), " tng ewallet")
+        self.assertEqual(_required_literal(r"uber|lyft"), "")  # top-level alternation
+        self.assertEqual(_required_literal(r"[0-9]+"), "")
+        self.assertEqual(_required_literal("("), "")  # invalid
+
+    def test_regex_prefilter(self):
+        matcher = RegexMatcher([(r"grab\s*food", 2), (r"uber|lyft", 3), (r"^rent \d+$", 1), ("(", 0)])
+        self.assertEqual(matcher.best_match("GRAB Food order"), 2)
+        self.assertEqual(matcher.best_match("Lyft to airport"), 3)  # no literal: always tried
+        self.assertEqual(matcher.best_match("grabfood, then uber"), 2)  # lowest key wins
+        self.assertEqual(matcher.best_match("rent 1200"), 1)
+        self.assertIsNone(matcher.best_match("rent is due"))  # literal present, regex fails
+        self.assertEqual(matcher.prefilter.all_matches("coffee"), set())  # only the literal-free alternation runs
+
+    def test_amount_ranges(self):
+        index = AmountIndex([
+            (Decimal("0"), Decimal("50"), 3),
+            (Decimal("20"), Decimal("100"), 1),
+            (Decimal("100"), Decimal("100"), 2),
+            (Decimal("-Infinity"), Decimal("-10"), 4),
+        ])
+        cases = {"10": 3, "20": 1, "35.5": 1, "100": 1, "100.01": None, "-5": None, "-10": 4, "-9999": 4}
+        for amount, expected in cases.items():
+            self.assertEqual(index.best_match(Decimal(amount)), expected, amount)
+        self.assertIsNone(index.best_match(None))
+        self.assertIsNone(AmountIndex([]).best_match(Decimal("1")))
+
+
+class RuleSetTests(ManagementTestCase):
+    def rule(self, category, kind, priority, pattern="", low=None, high=None):
+        return CategoryRule.objects.create(
+            user=self.user, category=category, kind=kind, priority=priority,
+            pattern=pattern, min_amount=low, max_amount=high,
+        )
+
+    def test_priority_decides_between_kinds(self):
+        drinks = Category.objects.create(user=self.user, name="Drinks", type="expense")
+        treats = Category.objects.create(user=self.user, name="Treats", type="expense")
+        self.rule(drinks, "amount", 10, low=Decimal("0"), high=Decimal("10"))
+        self.rule(self.food, "keyword", 50, pattern="Coffee")
+        self.rule(treats, "regex", 100, pattern=r"star\w+")
+        self.rule(self.salary, "keyword", 1, pattern="coffee")
+
+        def suggest(note, amount, tx_type="expense"):
+            return categorize(self.user, note, Decimal(amount), tx_type)
+
+        self.assertEqual(suggest("Starbucks coffee", "5"), drinks.pk)
+        self.assertEqual(suggest("Starbucks coffee", "20"), self.food.pk)
+        self.assertEqual(suggest("Starbucks", "20"), treats.pk)
+        self.assertIsNone(suggest("bookshop", "20"))
+        # Income rules never categorize an expense; type=None searches every rule
+        self.assertEqual(suggest("coffee", "20", "income"), self.salary.pk)
+        self.assertEqual(suggest("coffee", "20", None), self.salary.pk)
+
+    def test_evicted_version_does_not_revive_a_stale_rule_set(self):
+        cache.clear()  # a fresh cache: a counter would restart at the same value below
+        self.rule(self.food, "keyword", 10, pattern="lunch")
+        first = get_rule_set(self.user)
+        cache.clear()  # version evicted (or cache restarted)
+        self.rule(self.salary, "keyword", 10, pattern="bonus")
+        self.assertIsNot(get_rule_set(self.user), first)
+        self.assertEqual(categorize(self.user, "bonus"), self.salary.pk)
+
+
+# ─── Fragment cache versions ──────────────────────────────────────────────────
+class FragmentCacheTests(ManagementTestCase):
+    def render(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connections[shard_for_user(self.user.pk)]) as ctx:
+            response = self.client.get(reverse("transactions"))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.content
+
+    def fill_months(self, first, last):
+        month = date.today().replace(day=1)
+        with self.committed():
+            for i in range(first, last):
+                d = (month - timedelta(days=31 * i)).replace(day=10)
+                for n in range(3):
+                    self.add("10.00", d, note=f"month {i} row {n}")
+
+    def test_warm_page_does_not_grow_with_history(self):
+        self.fill_months(0, 3)
+        cold, page = self.render()
+        warm, warm_page = self.render()
+        self.assertLess(warm, cold)
+        self.assertEqual(warm_page.count(b"month 2 row"), page.count(b"month 2 row"))
+
+        self.fill_months(3, 12)
+        self.render()
+        self.assertEqual(self.render()[0], warm)
+
+    def test_one_write_rerenders_one_month_group(self):
+        self.fill_months(0, 6)
+        cold, _ = self.render()
+        warm, _ = self.render()
+        with self.committed():
+            self.add("12.34", note="fresh row")
+        after_write, page = self.render()
+        self.assertIn(b"fresh row", page)
+        self.assertLessEqual(after_write - warm, 2)  # that month's rows (and tags)
+        self.assertLess(after_write, cold)
+
+    def test_edit_invalidates_both_months(self):
+        old_month = date.today().replace(day=1) - timedelta(days=40)
+        with self.committed():
+            tx = self.add("10.00", old_month, note="moving row")
+            self.add("5.00", note="staying row")
+        self.render()
+        with self.committed(), CaptureQueriesContext(connections[shard_for_user(self.user.pk)]) as ctx:
+            tx.date = date.today()
+            tx.amount = Decimal("11.00")
+            tx.save()
+        # Every post_save receiver works from one read of the old row
+        reads = [q["sql"] for q in ctx.captured_queries
+                 if q["sql"].startswith("SELECT") and 'FROM "money_transaction"' in q["sql"]]
+        self.assertEqual(len(reads), 1)
+        _, page = self.render()
+        self.assertIn(b"11.00", page)
+        # Gone from the old month's fragment (each row shows up in the table and the mobile list)
+        self.assertEqual(page.count(b"moving row"), page.count(b"staying row"))
+
+    def test_versions_are_replaced_when_the_shard_commits(self):
+        months = [month_key(date.today())]
+        before = month_versions(self.user.pk, months)
+        with self.committed():
+            self.add("1.00")
+            # A render now still reads the old rows: it must not get a new version
+            self.assertEqual(month_versions(self.user.pk, months), before)
+        self.assertNotEqual(month_versions(self.user.pk, months), before)
+
+
+# ─── Batch writes and their signals ───────────────────────────────────────────
+class BatchSignalTests(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        self.enterContext(override_settings(ANALYTICS_SNAPSHOT_DIR=folder))
+        self.groceries = Category.objects.create(user=self.user, name="Groceries", type="expense")
+        self.month = date.today().replace(day=1)
+        self.budget = Budget.objects.create(user=self.user, category=self.food, month=self.month, amount=Decimal("100"))
+
+    def item(self, amount, days_ago=0, **extra):
+        return {"account": self.account.pk, "category": self.food.pk, "type": "expense", "amount": amount,
+                "date": (date.today() - timedelta(days=days_ago)).isoformat(), **extra}
+
+    def test_batch_create_update_delete_keep_derived_state_in_sync(self):
+        results = create_transactions(self.user, [
+            self.item("10.00"), self.item("20.00", 1), self.item("abc"), self.item("30.00", 40),
+            self.item("40.00", 2), self.item("500.00", 3, type="income", category=self.salary.pk),
+        ])
+        self.assertEqual([r["status"] for r in results],
+                         ["created", "created", "error", "created", "created", "created"])
+        ids = [r["id"] for r in results if r["status"] == "created"]
+        self.assertEqual(update_transactions(self.user, ids[:2], category=self.groceries), 2)
+        self.assertEqual(delete_transactions(self.user, [ids[3]]), 1)
+
+        live = list(Transaction.objects.filter(user=self.user).values_list("id", "category_id", "amount"))
+        self.assertEqual(sorted(pk for pk, _, _ in live), sorted([ids[0], ids[1], ids[2], ids[4]]))
+
+        # Budget counter: Food expenses of this month only
+        food_this_month = sum(
+            t.amount for t in Transaction.objects.filter(
+                user=self.user, category=self.food, type="expense", date__gte=self.month)
+        )
+        self.assertEqual(BudgetSpend.objects.get(budget=self.budget).spent, food_this_month)
+
+        # Change log: one entry per row, the deleted one as a delete
+        ops = dict(ChangeLogEntry.objects.filter(user=self.user, model="transaction").values_list("object_id", "op"))
+        self.assertEqual(ops, {**{pk: "upsert" for pk, _, _ in live}, ids[3]: "delete"})
+
+        # Snapshot (refreshed from that log) and forecaster (fed by the bulk signals)
+        snapshot = load_snapshot(self.user)
+        self.assertEqual(
+            sorted(zip(snapshot.id.tolist(), snapshot.category.tolist(), snapshot.cents.tolist())),
+            sorted((pk, category, int(amount * 100)) for pk, category, amount in live),
+        )
+        online = {s.series: s for s in ForecastState.objects.filter(user=self.user)}
+        rebuild_user(self.user.pk, snapshot)
+        for state in ForecastState.objects.filter(user=self.user):
+            np.testing.assert_allclose(online[state.series].xty, state.xty, rtol=1e-9)
+            self.assertEqual(online[state.series].n, state.n)
+
+
+# ─── Statement reconciliation ─────────────────────────────────────────────────
+class ReconcileTests(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = date.today() - timedelta(days=10)
+
+    def matches(self, statement):
+        return {
+            line.description: (line.transaction_id, line.match)
+            for line in StatementLine.objects.filter(statement=statement)
+        }
+
+    def test_lines_match_on_signed_amount_then_date(self):
+        shop = self.add("25.00", self.day)
+        pay = self.add("100.00", self.day, category=self.salary, tx_type="income")
+        cafe = self.add("40.00", self.day - timedelta(days=2))
+        statement, counts = import_statement(self.user, self.account, [
+            (self.day, "shop", Decimal("-25.00")),
+            (self.day, "pay", Decimal("100.00")),
+            (self.day, "cafe", Decimal("-40.00")),
+            (self.day, "refund", Decimal("25.00")),  # a credit: not the 25.00 expense
+        ])
+        self.assertEqual(counts, {"exact": 2, "fuzzy": 1, "unmatched": 1})
+        self.assertEqual(self.matches(statement), {
+            "shop": (shop.pk, "exact"),
+            "pay": (pay.pk, "exact"),
+            "cafe": (cafe.pk, "fuzzy"),
+            "refund": (None, ""),
+        })
+
+    def test_transfers_match_by_direction(self):
+        transfer = Category.objects.create(user=self.user, name="Transfer", type="in-transfer")
+        incoming = self.add("50.00", self.day, category=transfer, tx_type="in-transfer")
+        outgoing = self.add("50.00", self.day, category=transfer, tx_type="out-transfer")
+        statement, counts = import_statement(self.user, self.account, [
+            (self.day, "in", Decimal("50.00")),
+            (self.day, "out", Decimal("-50.00")),
+        ])
+        self.assertEqual(counts, {"exact": 2, "fuzzy": 0, "unmatched": 0})
+        self.assertEqual(self.matches(statement), {"in": (incoming.pk, "exact"), "out": (outgoing.pk, "exact")})
+
+    def test_reconcile_matches_transactions_added_later(self):
+        statement, counts = import_statement(self.user, self.account, [
+            (self.day, "late", Decimal("-12.00")),
+            (self.day, "open", Decimal("-99.00")),
+        ])
+        self.assertEqual(counts, {"exact": 0, "fuzzy": 0, "unmatched": 2})
+        late = self.add("12.00", self.day + timedelta(days=1))
+        self.assertEqual(reconcile(statement), {"exact": 0, "fuzzy": 1, "unmatched": 1})
+        self.assertEqual(self.matches(statement)["late"], (late.pk, "fuzzy"))
+        # Matched transactions are not offered again
+        self.add("12.00", self.day)
+        self.assertEqual(reconcile(statement), {"exact": 0, "fuzzy": 0, "unmatched": 1})
+
+
+# ─── Tag filters (list and CSV export) ────────────────────────────────────────
+class TagFilterViewTests(ManagementTestCase):
+    def setUp(self):
+        super().setUp()
+        for note, tags in (("both-row", ["trip", "work"]), ("trip-row", ["trip"]), ("plain-row", [])):
+            set_tags(self.add("5.00", note=note), tags)
+        self.client.force_login(self.user)
+
+    def exported_notes(self, **params):
+        response = self.client.get(reverse("transaction_export"), params)
+        lines = b"".join(response.streaming_content).decode().splitlines()[1:]
+        return sorted(line.split(",")[5] for line in lines)
+
+    def test_export_filters_on_all_or_any_tag(self):
+        self.assertEqual(self.exported_notes(tags="trip, work"), ["both-row"])
+        self.assertEqual(self.exported_notes(tags="trip, work", match="any"), ["both-row", "trip-row"])
+        self.assertEqual(self.exported_notes(tags="#Trip"), ["both-row", "trip-row"])
+        self.assertEqual(len(self.exported_notes()), 3)
+
+    def test_list_filters_on_tags(self):
+        response = self.client.get(reverse("transactions"), {"tags": "trip, work", "match": "all"})
+        self.assertContains(response, "both-row")
+        self.assertNotContains(response, "trip-row")
+        self.assertNotContains(response, "plain-row")
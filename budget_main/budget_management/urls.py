@@ -8,6 +8,8 @@ urlpatterns = [
     path('Edit-Accounts/<int:pk>/edit/', views.account_edit, name='account_edit'),
     path('Delete-Accounts/<int:pk>/delete/', views.account_delete, name='account_delete'),
     path('Transfer-Accounts/transfer/', views.account_transfer, name='account_transfer'),
+    path('Reconcile-Accounts/', views.statement_list, name='statements'),
+    path('Statements/<int:pk>/', views.statement_detail, name='statement_detail'),
 
 # Budgets
     path('Manage-Budgets/', views.budget_list, name='budgets'),
@@ -21,10 +23,20 @@ urlpatterns = [
     path('Edit-Categories<int:pk>/edit/', views.category_edit, name='category_edit'),
     path('Delete-Categories/<int:pk>/delete/', views.category_delete, name='category_delete'),
 
+# Category rules
+    path('Manage-Rules/', views.rule_list, name='rules'),
+    path('Delete-Rules/<int:pk>/delete/', views.rule_delete, name='rule_delete'),
+
 # Transactions
     path('Manage-Transactions/', views.transaction_list, name='transactions'),
     path('Create-Transactions/', views.transaction_create, name='transaction_create'),
     path('Edit-Transactions/<int:pk>/edit/', views.transaction_edit, name='transaction_edit'),
     path('Delete-Transactions/<int:pk>/delete/', views.transaction_delete, name='transaction_delete'),
+    path('Bulk-Transactions/', views.transaction_bulk, name='transaction_bulk'),
+    path('Export-Transactions/', views.transaction_export, name='transaction_export'),
+
+# JSON API
+    path('api/sync/', views.sync_api, name='sync_api'),
+    path('api/transactions/batch/', views.transaction_batch_api, name='transaction_batch_api'),
 
 ]
\ No newline at end of file
@@ -1,18 +1,47 @@
 from django.shortcuts import render
-from datetime import date
+from datetime import date, datetime
 from calendar import monthrange
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Value, DecimalField
+from django.db.models import Count, Sum, Value, DecimalField
 from decimal import Decimal, InvalidOperation
 from django.contrib import messages
+from django.http import JsonResponse, QueryDict, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 from django.shortcuts import render, redirect, get_object_or_404
-from budget_core.models import Transaction, Category, Account, Budget
+from budget_core.models import Transaction, Category, Account, Budget, CategoryRule, ArchivedTransaction, TransactionMonthSummary, Statement
 from django.db.models.deletion import ProtectedError
-from django.db.models.functions import TruncDate, Coalesce, Cast
+from django.db.models.functions import TruncDate, TruncMonth, Coalesce, Cast
 from django.utils import timezone
-from itertools import groupby
 from django.db.models import Q
+from budget_core.archive import MergedRows, live_balances, transaction_years
+from budget_core.cache_versions import account_versions, month_key, month_versions
+from budget_core.category_tree import tree_order, validate_parent
+from budget_core.changelog import changes_since
+from budget_core.sharding import use_shard_for
+from budget_core.tags import TaggedRows, add_tags, parse_tags, set_tags, tag_filter, tags_by_transaction
+from budget_management.batch_service import (
+    MAX_BATCH,
+    create_transactions,
+    delete_transactions,
+    update_transactions,
+)
+from budget_dashboard.anomaly_service import observe_transaction
+from budget_management.categorizer import categorize
+from budget_management.reconcile_service import (
+    MAX_TOLERANCE,
+    REPORT_ROWS,
+    delete_statement,
+    import_statement,
+    parse_statement,
+    reconcile,
+    statement_report,
+)
+import csv
+import json
+import re
+from itertools import islice
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Management - Accounts
@@ -23,27 +52,11 @@ def account_list(request):
     accounts = Account.objects.filter(user=request.user).order_by('name')
 
     # 2) Compute live balances: opening + income - expense per account
-    tx = Transaction.objects.filter(user=request.user)
-    totals = (
-        tx.values('account_id', 'type')
-          .annotate(total=Sum('amount'))
-    )
-
-    acc_totals = {}
-    for row in totals:
-        aid = row['account_id']
-        typ = row['type']
-        acc_totals.setdefault(aid, {'in': Decimal('0'), 'out': Decimal('0')})
-        if typ == 'income':
-            acc_totals[aid]['in'] += row['total'] or 0
-        else:
-            acc_totals[aid]['out'] += row['total'] or 0
-
+    #    (hot rows + archived month summaries)
+    live_balances(request.user, accounts)
+    versions = account_versions(request.user.pk, [a.id for a in accounts])
     for a in accounts:
-        opening = Decimal(a.balance or 0)
-        in_sum = acc_totals.get(a.id, {}).get('in', Decimal('0'))
-        out_sum = acc_totals.get(a.id, {}).get('out', Decimal('0'))
-        a.live_balance = opening + in_sum - out_sum
+        a.version = versions[a.id]  # cached card key
 
     # 3) Handle manual <input> form submit
     if request.method == 'POST':
@@ -217,6 +230,84 @@ def account_transfer(request):
 
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Management - Statement reconciliation
+# ──────────────────────────────────────────────────────────────────────────────
+@login_required
+def statement_list(request):
+    accounts = Account.objects.filter(user=request.user).order_by("name")
+    statements = (
+        Statement.objects.filter(user=request.user)
+        .select_related("account")
+        .annotate(
+            line_count=Count("lines"),
+            matched_count=Count("lines", filter=Q(lines__transaction__isnull=False)),
+        )
+    )
+
+    if request.method == "POST":
+        account = get_object_or_404(Account, pk=request.POST.get("account") or 0, user=request.user)
+        upload = request.FILES.get("file")
+        try:
+            tolerance = int(request.POST.get("tolerance") or 3)
+        except ValueError:
+            tolerance = -1
+
+        if upload is None:
+            messages.error(request, "Please choose a statement CSV file.")
+        elif not 0 <= tolerance <= MAX_TOLERANCE:
+            messages.error(request, f"Date tolerance must be between 0 and {MAX_TOLERANCE} days.")
+        else:
+            try:
+                lines = parse_statement(upload.read())
+            except ValueError as exc:
+                messages.error(request, str(exc))
+            else:
+                statement, counts = import_statement(
+                    request.user, account, lines, name=upload.name, tolerance_days=tolerance
+                )
+                messages.success(
+                    request,
+                    f"Imported {len(lines)} lines: {counts['exact']} exact, "
+                    f"{counts['fuzzy']} fuzzy, {counts['unmatched']} unmatched.",
+                )
+                return redirect("statement_detail", pk=statement.pk)
+
+    context = {
+        "accounts": accounts,
+        "statements": statements,
+        "max_tolerance": MAX_TOLERANCE,
+    }
+    return render(request, "budget_management/accounts/statement_list.html", context)
+
+
+@login_required
+def statement_detail(request, pk):
+    statement = get_object_or_404(Statement.objects.select_related("account"), pk=pk, user=request.user)
+
+    if request.method == "POST":
+        action = request.POST.get("action")
+        if action == "delete":
+            delete_statement(statement)
+            messages.success(request, "Statement deleted; its transactions are unreconciled again.")
+            return redirect("statements")
+        if action == "rerun":
+            counts = reconcile(statement)
+            messages.success(
+                request,
+                f"Matched {counts['exact']} exact and {counts['fuzzy']} fuzzy; "
+                f"{counts['unmatched']} lines still unmatched.",
+            )
+        return redirect("statement_detail", pk=statement.pk)
+
+    context = {
+        "statement": statement,
+        "report": statement_report(statement),
+        "report_rows": REPORT_ROWS,
+    }
+    return render(request, "budget_management/accounts/statement_detail.html", context)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Management - Budgets
 # ──────────────────────────────────────────────────────────────────────────────
@@ -225,8 +316,8 @@ def budget_list(request):
     # All budgets for this user
     budgets = Budget.objects.filter(user=request.user).order_by("-month")
 
-    # All categories for this user (for the <select>)
-    categories = Category.objects.filter(user=request.user).order_by("name")
+    # All categories for this user (for the <select>, as "Parent › Child")
+    categories = tree_order(list(Category.objects.filter(user=request.user)))
 
     if request.method == "POST":
         category_id = request.POST.get("category")
@@ -277,7 +368,7 @@ def budget_create(request):
 @login_required
 def budget_edit(request, pk):
     budget = get_object_or_404(Budget, pk=pk, user=request.user)
-    categories = Category.objects.filter(user=request.user).order_by("name")
+    categories = tree_order(list(Category.objects.filter(user=request.user)))
 
     if request.method == "POST":
         category_id = request.POST.get("category")
@@ -337,12 +428,13 @@ def budget_delete(request, pk):
 # ──────────────────────────────────────────────────────────────────────────────
 @login_required
 def category_list(request):
-    # List all categories for this user
-    cats = Category.objects.filter(user=request.user).order_by("name")
+    # List all categories for this user, as a tree (parents before their subcategories)
+    cats = tree_order(list(Category.objects.filter(user=request.user)))
 
     if request.method == "POST":
         name = (request.POST.get("name") or "").strip()
         cat_type = (request.POST.get("type") or "").strip()  # e.g. 'income' / 'expense'
+        parent_id = request.POST.get("parent") or None
 
         if not name or not cat_type:
             messages.error(request, "Please fill in both category name and type.")
@@ -354,13 +446,21 @@ def category_list(request):
             # if cat_type_norm not in ("income", "expense"):
             #     messages.error(request, "Type must be 'income' or 'expense'.")
             # else:
-            Category.objects.create(
+            parent = get_object_or_404(Category, pk=parent_id, user=request.user) if parent_id else None
+            category = Category(
                 user=request.user,
                 name=name,
                 type=cat_type_norm,  # or cat_type if you don't want to normalise
+                parent=parent,
             )
-            messages.success(request, "Category created successfully.")
-            return redirect("categories")  # make sure this URL name exists
+            try:
+                validate_parent(category, parent)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                category.save()
+                messages.success(request, "Category created successfully.")
+                return redirect("categories")  # make sure this URL name exists
 
     context = {
         "cats": cats,
@@ -379,23 +479,37 @@ def category_edit(request, pk):
     if request.method == "POST":
         name = (request.POST.get("name") or "").strip()
         cat_type = (request.POST.get("type") or "").strip()
+        parent_id = request.POST.get("parent") or None
 
         if not name or not cat_type:
             messages.error(request, "Please fill in both category name and type.")
         else:
             # Optional: normalise the type
             cat_type_norm = cat_type.lower().strip()
+            parent = get_object_or_404(Category, pk=parent_id, user=request.user) if parent_id else None
 
             category.name = name
             category.type = cat_type_norm   # or just cat_type
-            category.save()
+            category.parent = parent
+            try:
+                validate_parent(category, parent)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                # Moving it re-links its subtree and rebuilds the budgets above it (signals)
+                category.save()
 
-            messages.success(request, "Category updated successfully.")
-            return redirect("categories")
+                messages.success(request, "Category updated successfully.")
+                return redirect("categories")
+
+    # Possible parents: everything outside this category's own subtree
+    subtree = set(category.descendant_links.values_list("descendant_id", flat=True)) | {category.pk}
+    parents = [c for c in tree_order(list(Category.objects.filter(user=request.user))) if c.pk not in subtree]
 
     context = {
         "title": "Edit Category",
         "category": category,
+        "parents": parents,
         "type": "category",
     }
     # Adjust template path if needed
@@ -410,7 +524,10 @@ def category_delete(request, pk):
             obj.delete()
             return redirect('categories')
         except ProtectedError:
-            error = "You can't delete this category because it is used by one or more transactions."
+            if obj.children.exists():
+                error = "You can't delete this category because it has subcategories. Move or delete them first."
+            else:
+                error = "You can't delete this category because it is used by one or more transactions."
         
     context = {
         'obj': obj, 
@@ -421,65 +538,214 @@ def category_delete(request, pk):
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Management - Transactions
+# Management - Category Rules
 # ──────────────────────────────────────────────────────────────────────────────
 @login_required
-def transaction_list(request):
-    q          = (request.GET.get("q") or "").strip()
-    account_id = (request.GET.get("account") or "").strip()
-    year_str   = (request.GET.get("year") or "").strip()  # NEW
+def rule_list(request):
+    # List + create auto-categorization rules for this user
+    rules = CategoryRule.objects.filter(user=request.user).select_related("category")
+    categories = Category.objects.filter(user=request.user).order_by("name")
 
-    # Base queryset for this user
-    base_qs = Transaction.objects.filter(user=request.user)
+    if request.method == "POST":
+        category_id  = request.POST.get("category")
+        kind         = (request.POST.get("kind") or "").strip().lower()
+        pattern      = (request.POST.get("pattern") or "").strip()
+        min_str      = (request.POST.get("min_amount") or "").strip()
+        max_str      = (request.POST.get("max_amount") or "").strip()
+        priority_str = (request.POST.get("priority") or "100").strip()
+
+        error = None
+        min_amount = max_amount = None
+        if not category_id or kind not in ("keyword", "regex", "amount"):
+            error = "Please choose a category and a rule type."
+        elif kind in ("keyword", "regex") and not pattern:
+            error = "Please enter a keyword or pattern."
+        elif kind == "amount" and not (min_str or max_str):
+            error = "Please enter a minimum and/or maximum amount."
+        elif not priority_str.isdigit():
+            error = "Priority must be a whole number."
+
+        if error is None and kind == "regex":
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                error = f"Invalid regex: {e}"
 
-    # Build year options (all years that have transactions for this user)
-    year_qs = base_qs.dates("date", "year", order="DESC")
-    years = [d.year for d in year_qs]
+        if error is None and kind == "amount":
+            try:
+                min_amount = Decimal(min_str) if min_str else None
+                max_amount = Decimal(max_str) if max_str else None
+            except InvalidOperation:
+                error = "Invalid amount format."
+            else:
+                if any(d is not None and not d.is_finite() for d in (min_amount, max_amount)):
+                    error = "Invalid amount format."  # NaN / Infinity parse as Decimals
+                elif min_amount is not None and max_amount is not None and min_amount > max_amount:
+                    error = "Minimum amount cannot be greater than maximum."
+
+        if error:
+            messages.error(request, error)
+        else:
+            category = get_object_or_404(Category, pk=category_id, user=request.user)
+            CategoryRule.objects.create(
+                user=request.user,
+                category=category,
+                kind=kind,
+                pattern=pattern if kind != "amount" else "",
+                min_amount=min_amount,
+                max_amount=max_amount,
+                priority=int(priority_str),
+            )
+            messages.success(request, "Rule created successfully.")
+            return redirect("rules")
+
+    context = {
+        "rules": rules,
+        "categories": categories,
+        "kinds": CategoryRule.KIND_CHOICES,
+    }
+    return render(request, "budget_management/rules/rule_list.html", context)
+
+@login_required
+def rule_delete(request, pk):
+    obj = get_object_or_404(CategoryRule, pk=pk, user=request.user)
+    if request.method == "POST":
+        obj.delete()
+        return redirect("rules")
+
+    context = {
+        "obj": obj,
+    }
+    return render(request, "budget_management/rules/rule_delete.html", context)
 
-    # Apply filters
-    tx = base_qs.select_related("account", "category")
 
-    if q:
-        tx = tx.filter(
-            Q(note__icontains=q) |
-            Q(category__name__icontains=q)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Management - Transactions
+# ──────────────────────────────────────────────────────────────────────────────
+def warn_if_unusual(request, transaction, edited=False):
+    # Score the new/edited row against the category's rolling stats
+    anomaly = observe_transaction(transaction, edited=edited)
+    if anomaly is not None:
+        messages.warning(
+            request,
+            f"Unusual spending: RM {transaction.amount:.2f} in {transaction.category.name} "
+            f"is {anomaly.ratio:.1f}x your typical RM {anomaly.expected:.2f}.",
         )
 
-    if account_id:
-        tx = tx.filter(account_id=account_id)
+def transaction_filters(request):
+    """
+    The transaction list filters from the query string (shared by the list
+    and the CSV export).
+    """
+    filters = {
+        "q": (request.GET.get("q") or "").strip(),
+        "account_id": (request.GET.get("account") or "").strip(),
+        "year": (request.GET.get("year") or "").strip(),
+        "tags_text": (request.GET.get("tags") or "").strip(),
+        "match": "any" if request.GET.get("match") == "any" else "all",
+        "tags": [],
+    }
+    try:
+        filters["tags"] = parse_tags(filters["tags_text"])
+    except ValueError as e:
+        messages.error(request, str(e))
+    return filters
+
+def apply_transaction_filters(qs, user, filters):
+    # Same filters for the hot and the archived rows
+    if filters["q"]:
+        qs = qs.filter(
+            Q(note__icontains=filters["q"]) |
+            Q(category__name__icontains=filters["q"])
+        )
+
+    if filters["account_id"]:
+        qs = qs.filter(account_id=filters["account_id"])
 
-    if year_str:
+    if filters["year"]:
         try:
-            year_int = int(year_str)
-            tx = tx.filter(date__year=year_int)
+            year_int = int(filters["year"])
+            qs = qs.filter(date__year=year_int)
         except ValueError:
             pass  # ignore invalid year
 
-    # Order by date desc for grouping
-    tx = tx.order_by("-date", "-id")
+    if filters["tags"]:
+        # Semi-joins on the (tag, transaction) index, one per tag for "all"
+        qs = qs.filter(tag_filter(user.pk, filters["tags"], filters["match"]))
+    return qs
+
+@login_required
+def transaction_list(request):
+    filters = transaction_filters(request)
+    q = filters["q"]
+    account_id = filters["account_id"]
+    year_str = filters["year"]  # NEW
+
+    # Build year options (all years that have transactions for this user, hot or archived)
+    years = transaction_years(request.user)
+
+    tx = apply_transaction_filters(
+        Transaction.objects.filter(user=request.user).select_related("account", "category", "anomaly", "statement_line"),
+        request.user, filters,
+    )
+    archived = apply_transaction_filters(
+        ArchivedTransaction.objects.filter(user=request.user).select_related("account", "category"),
+        request.user, filters,
+    )
+
+    # Month groups from one grouped query per table (archived months come from
+    # the month summaries unless the note search or a tag filter needs the
+    # rows); each group's rows are lazy, only evaluated when its cached
+    # fragment is missing
+    def month_starts(qs, field="date"):
+        values = qs.annotate(m=TruncMonth(field)).values_list("m", flat=True).distinct().order_by()
+        return {m.date() if isinstance(m, datetime) else m for m in values}
+
+    hot_months = month_starts(tx)
+    if q or filters["tags"]:
+        cold_months = month_starts(archived)
+    else:
+        summaries = TransactionMonthSummary.objects.filter(user=request.user)
+        if account_id:
+            summaries = summaries.filter(account_id=account_id)
+        if year_str.isdigit():
+            summaries = summaries.filter(month__year=int(year_str))
+        cold_months = month_starts(summaries, "month")
+
+    all_months = sorted(hot_months | cold_months, reverse=True)
+    versions = month_versions(request.user.pk, [month_key(m) for m in all_months])
 
-    # Group by month (YYYY-MM)
     months = []
-    for key, group in groupby(tx, key=lambda t: t.date.strftime("%Y-%m")):
-        group_list = list(group)
-        if not group_list:
-            continue
-        label = group_list[0].date.strftime("%B %Y")  # e.g. "January 2025"
+    for start in all_months:
+        end = date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+        key = month_key(start)
+        parts = [
+            qs.filter(date__gte=start, date__lt=end).order_by("-date", "-id")
+            for qs, present in ((tx, hot_months), (archived, cold_months))
+            if start in present
+        ]
         months.append({
             "key": key,
-            "label": label,
-            "tx_list": group_list,
+            "label": start.strftime("%B %Y"),  # e.g. "January 2025"
+            "version": versions[key],
+            "tx_list": TaggedRows(parts[0] if len(parts) == 1 else MergedRows(*parts)),
         })
 
     accounts = Account.objects.filter(user=request.user).order_by("name")
+    categories = Category.objects.filter(user=request.user)  # bulk recategorize
 
     context = {
         "months": months,
         "accounts": accounts,
+        "categories": categories,
+        "filters": request.GET.urlencode(),
         "q": q,
         "account_id": account_id,
         "years": years,        # list of years for dropdown
         "year": year_str,      # currently selected year
+        "tags": ", ".join(filters["tags"]),
+        "match": filters["match"],
     }
     return render(request, "budget_management/transactions/transaction_list.html", context)
 
@@ -496,14 +762,14 @@ def transaction_create(request):
         amount_str  = (request.POST.get("amount") or "").strip()
         date_str    = (request.POST.get("date") or "").strip()
         note        = (request.POST.get("note") or "").strip()
+        tags        = (request.POST.get("tags") or "").strip()
 
-        # Basic required validation
-        if not account_id or not category_id or not tx_type or not amount_str or not date_str:
+        # Basic required validation (empty category = pick one from the user's rules)
+        if not account_id or not tx_type or not amount_str or not date_str:
             messages.error(request, "Please fill in all required fields.")
         else:
-            # Validate account + category belong to current user
+            # Validate account belongs to current user
             account = get_object_or_404(Account, pk=account_id, user=request.user)
-            category = get_object_or_404(Category, pk=category_id, user=request.user)
 
             # Validate type
             if tx_type not in ("income", "expense"):
@@ -515,27 +781,41 @@ def transaction_create(request):
                 except InvalidOperation:
                     messages.error(request, "Invalid amount format.")
                 else:
+                    if not category_id:
+                        category_id = categorize(request.user, note, amount, tx_type)
                     if amount <= 0:
                         messages.error(request, "Amount must be greater than zero.")
+                    elif not category_id:
+                        messages.error(request, "No rule matched this transaction — please pick a category.")
                     else:
+                        # Validate category belongs to current user
+                        category = get_object_or_404(Category, pk=category_id, user=request.user)
+
                         # Parse date from <input type="date">
                         try:
                             tx_date = date.fromisoformat(date_str)
                         except ValueError:
                             messages.error(request, "Invalid date format.")
                         else:
-                            # Create transaction
-                            Transaction.objects.create(
-                                user=request.user,
-                                account=account,
-                                category=category,
-                                type=tx_type,
-                                amount=amount,
-                                date=tx_date,
-                                note=note,
-                            )
-                            messages.success(request, "Transaction added successfully.")
-                            return redirect("transactions")
+                            try:
+                                tag_names = parse_tags(tags)
+                            except ValueError as e:
+                                messages.error(request, str(e))
+                            else:
+                                # Create transaction
+                                transaction = Transaction.objects.create(
+                                    user=request.user,
+                                    account=account,
+                                    category=category,
+                                    type=tx_type,
+                                    amount=amount,
+                                    date=tx_date,
+                                    note=note,
+                                )
+                                set_tags(transaction, tag_names)
+                                messages.success(request, "Transaction added successfully.")
+                                warn_if_unusual(request, transaction)
+                                return redirect("transactions")
 
     # GET or failed POST → show form again
     context = {
@@ -543,6 +823,7 @@ def transaction_create(request):
         "accounts": accounts,
         "categories": categories,
         "transaction": None,  # template can use this for create/edit reuse
+        "tags": request.POST.get("tags", ""),
     }
     return render(request, "budget_management/transactions/transaction_form.html", context)
 
@@ -559,6 +840,7 @@ def transaction_edit(request, pk):
         amount_str  = (request.POST.get("amount") or "").strip()
         date_str    = (request.POST.get("date") or "").strip()
         note        = (request.POST.get("note") or "").strip()
+        tags        = (request.POST.get("tags") or "").strip()
 
         if not account_id or not category_id or not tx_type or not amount_str or not date_str:
             messages.error(request, "Please fill in all required fields.")
@@ -582,23 +864,31 @@ def transaction_edit(request, pk):
                         except ValueError:
                             messages.error(request, "Invalid date format.")
                         else:
-                            # 🔁 Update existing transaction
-                            transaction.account = account
-                            transaction.category = category
-                            transaction.type = tx_type
-                            transaction.amount = amount
-                            transaction.date = tx_date
-                            transaction.note = note
-                            transaction.save()
-
-                            messages.success(request, "Transaction updated successfully.")
-                            return redirect("transactions")
+                            try:
+                                tag_names = parse_tags(tags)
+                            except ValueError as e:
+                                messages.error(request, str(e))
+                            else:
+                                # 🔁 Update existing transaction
+                                transaction.account = account
+                                transaction.category = category
+                                transaction.type = tx_type
+                                transaction.amount = amount
+                                transaction.date = tx_date
+                                transaction.note = note
+                                transaction.save()
+                                set_tags(transaction, tag_names)
+
+                                messages.success(request, "Transaction updated successfully.")
+                                warn_if_unusual(request, transaction, edited=True)
+                                return redirect("transactions")
 
     context = {
         "title": "Edit Transaction",
         "accounts": accounts,
         "categories": categories,
         "transaction": transaction,  # <-- edit mode: existing data passed in
+        "tags": request.POST.get("tags", ", ".join(tags_by_transaction([transaction.pk])[transaction.pk])),
     }
     return render(request, "budget_management/transactions/transaction_form.html", context)
 
@@ -613,4 +903,126 @@ def transaction_delete(request, pk):
     context = {
         "obj": obj,
     }
-    return render(request, "budget_management/transactions/transaction_delete.html", context)
\ No newline at end of file
+    return render(request, "budget_management/transactions/transaction_delete.html", context)
+
+@login_required
+@require_POST
+def transaction_bulk(request):
+    # Multi-select actions from transaction_list: one UPDATE / DELETE for all rows
+    ids = [i for i in request.POST.getlist("ids") if i.isdigit()]
+    action = request.POST.get("action")
+    back = reverse("transactions")
+    filters = request.POST.get("filters") or ""
+    if filters:
+        back += "?" + QueryDict(filters).urlencode()
+
+    if not ids:
+        messages.error(request, "Select at least one transaction.")
+    elif action == "recategorize":
+        category = get_object_or_404(Category, pk=request.POST.get("category") or 0, user=request.user)
+        count = update_transactions(request.user, ids, category=category)
+        skipped = len(ids) - count
+        messages.success(request, f"{count} transaction(s) moved to {category.name}.")
+        if skipped:
+            messages.warning(request, f"{skipped} transaction(s) skipped: not {category.type}.")
+    elif action == "move":
+        account = get_object_or_404(Account, pk=request.POST.get("account") or 0, user=request.user)
+        count = update_transactions(request.user, ids, account=account)
+        messages.success(request, f"{count} transaction(s) moved to {account.name}.")
+    elif action == "tag":
+        try:
+            names = parse_tags(request.POST.get("tags"))
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            if not names:
+                messages.error(request, "Enter at least one tag.")
+            else:
+                count = add_tags(request.user, ids, names)
+                messages.success(request, f"{count} transaction(s) tagged {', '.join(names)}.")
+    elif action == "delete":
+        count = delete_transactions(request.user, ids)
+        messages.success(request, f"{count} transaction(s) deleted.")
+    else:
+        messages.error(request, "Choose an action.")
+    return redirect(back)
+
+class _Echo:
+    # csv.writer target that hands each formatted line back
+    def write(self, value):
+        return value
+
+EXPORT_CHUNK = 2000
+
+@login_required
+def transaction_export(request):
+    """
+    GET: the transaction list filters (q, account, year, tags, match).
+    Streams a CSV of the matching transactions, hot rows then archived ones,
+    newest first; tags are read with one query per chunk of rows.
+    """
+    user = request.user
+    filters = transaction_filters(request)
+    columns = ("id", "date", "type", "amount", "account__name", "category__name", "note")
+    sources = [
+        apply_transaction_filters(model.objects.filter(user=user), user, filters)
+        .order_by("-date", "-id").values_list(*columns)
+        for model in (Transaction, ArchivedTransaction)
+    ]
+
+    def lines():
+        writer = csv.writer(_Echo())
+        # Streamed after the middleware returned: pin the shard here
+        with use_shard_for(user.pk):
+            yield writer.writerow(["date", "type", "amount", "account", "category", "note", "tags", "archived"])
+            for archived, rows in enumerate(sources):
+                rows = rows.iterator(chunk_size=EXPORT_CHUNK)
+                while chunk := list(islice(rows, EXPORT_CHUNK)):
+                    tags = tags_by_transaction([row[0] for row in chunk])
+                    for pk, *values in chunk:
+                        yield writer.writerow([*values, ", ".join(tags.get(pk, [])), "yes" if archived else ""])
+
+    response = StreamingHttpResponse(lines(), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="transactions.csv"'
+    return response
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Management - JSON API (sync / batched writes)
+# ──────────────────────────────────────────────────────────────────────────────
+@login_required
+def sync_api(request):
+    """
+    GET: ?cursor=<seq> (default 0 = everything) &limit=<1..1000, default 500>
+    Returns: { cursor, has_more, changes: [{seq, model, id, op, data?}] } OR { error: "..." }
+    Keep calling with the returned cursor while has_more is true.
+    """
+    cursor = (request.GET.get("cursor") or "0").strip()
+    limit = (request.GET.get("limit") or "500").strip()
+    if not cursor.isdigit() or not limit.isdigit():
+        return JsonResponse({"error": "Cursor and limit must be non-negative integers."}, status=400)
+    return JsonResponse(changes_since(request.user, int(cursor), int(limit)))
+
+
+@login_required
+@require_POST
+def transaction_batch_api(request):
+    """
+    POST (JSON): [{account, category (optional = use my rules), type, amount, date, note}, ...]
+                 or {"transactions": [...]}, at most MAX_BATCH items
+    Returns: { created, failed, results: [{index, status: "created", id, category, unusual}
+                                          | {index, status: "error", error}] } OR { error: "..." }
+    Invalid items are reported and skipped; the valid ones are inserted together.
+    """
+    try:
+        payload = json.loads(request.body or b"null")
+    except ValueError:
+        return JsonResponse({"error": "Body must be JSON."}, status=400)
+    items = payload.get("transactions") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"error": "Send a non-empty list of transactions."}, status=400)
+    if len(items) > MAX_BATCH:
+        return JsonResponse({"error": f"At most {MAX_BATCH} transactions per request."}, status=400)
+
+    results = create_transactions(request.user, items)
+    created = sum(1 for r in results if r["status"] == "created")
+    return JsonResponse({"created": created, "failed": len(results) - created, "results": results})
@@ -0,0 +1,13 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+  // Same setting the Play CDN used to get inline: dark mode via <html class="dark">
+  darkMode: 'class',
+  // Only classes found in templates (incl. class strings built in inline JS) are emitted
+  content: [
+    './*/templates/**/*.html',
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};